@@ -0,0 +1,193 @@
+"""Single-pass report statistics over ledger and balance-sheet chunks.
+
+Kept apart from report.py, which imports streamlit and reportlab, so the
+workers workbook.map_sheets spawns to aggregate sheets start quickly.
+"""
+import pandas as pd
+
+from anomalies import AnomalyCounter
+from records import amounts_to_paise
+
+CHUNKSIZE = 100_000  # rows read at a time, so large ledgers never load fully into memory
+
+# Column names the aggregation looks for, in order of preference (case-insensitive);
+# 'Amount (paise)' is a typed records frame's (see records.py), already integer paise
+PAISE_COLUMN = 'Amount (paise)'
+AMOUNT_COLUMNS = (PAISE_COLUMN, 'Amount', 'Total', 'Value')
+CLIENT_COLUMNS = ('Company Name', 'Client', 'Party', 'Name')
+DATE_COLUMNS = ('Date',)
+# Everything the statistics and the transactions appendix read
+REPORT_COLUMNS = AMOUNT_COLUMNS + CLIENT_COLUMNS + DATE_COLUMNS
+# Read as well for the anomaly checks, when the file has them
+ANOMALY_COLUMNS = ('serial_number', 'PDF Hash')
+
+
+def find_column(columns, candidates):
+    lookup = {str(column).strip().casefold(): column for column in columns}
+    for candidate in candidates:
+        if candidate.casefold() in lookup:
+            return lookup[candidate.casefold()]
+    return None
+
+
+def amount_paise(chunk, amount_column):
+    if str(amount_column).strip().casefold() == PAISE_COLUMN.casefold():
+        return pd.to_numeric(chunk[amount_column], errors='coerce').astype('Int64')
+    return amounts_to_paise(chunk[amount_column])
+
+
+class ReportAggregator:
+    """Single-pass statistics over chunks of a ledger or balance sheet.
+
+    Keeps running counts, paise totals, min/max, per-client and per-month
+    sums, plus the row/column/missing-value summary generate_audit_report
+    builds, without ever holding more than one chunk. Files with an amount
+    and a client column also feed an anomalies.AnomalyCounter, and the first
+    ``transactions`` rows are kept for the report's appendix.
+    """
+
+    def __init__(self, transactions=0):
+        self.keep = transactions
+        self.transactions = []
+        self.anomalies = None
+        self.sheets = {}
+        self.count = 0
+        self.total = 0
+        self.lowest = None
+        self.highest = None
+        self.first_date = None
+        self.last_date = None
+        self.clients = None
+        self.months = None
+
+    def merge(self, other):
+        """Fold in an aggregator built over other sheets (e.g. in a worker process)."""
+        self.sheets.update(other.sheets)
+        self.transactions += other.transactions[:self.keep - len(self.transactions)]
+        if other.anomalies is not None:
+            if self.anomalies is None:
+                self.anomalies = AnomalyCounter()
+            self.anomalies.merge(other.anomalies)
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.lowest = other.lowest if self.lowest is None else min(self.lowest, other.lowest)
+        self.highest = other.highest if self.highest is None else max(self.highest, other.highest)
+        if other.first_date is not None:
+            self.first_date = other.first_date if self.first_date is None else min(self.first_date, other.first_date)
+            self.last_date = other.last_date if self.last_date is None else max(self.last_date, other.last_date)
+        for attribute in ('clients', 'months'):
+            mine, theirs = getattr(self, attribute), getattr(other, attribute)
+            if theirs is not None:
+                setattr(self, attribute, theirs if mine is None else mine.add(theirs, fill_value=0))
+
+    def update(self, sheet_name, chunk, summarize=True):
+        # summarize=False when the sheet summary comes from file metadata instead
+        if summarize:
+            sheet = self.sheets.setdefault(sheet_name, {'row_count': 0, 'columns': chunk.columns.tolist(), 'missing_values': {}})
+            sheet['row_count'] += len(chunk)
+            for column, missing in chunk.isnull().sum().items():
+                sheet['missing_values'][column] = sheet['missing_values'].get(column, 0) + int(missing)
+
+        amount_column = find_column(chunk.columns, AMOUNT_COLUMNS)
+        if amount_column is None:
+            return
+        client_column = find_column(chunk.columns, CLIENT_COLUMNS)
+        date_column = find_column(chunk.columns, DATE_COLUMNS)
+        paise = amount_paise(chunk, amount_column)
+        all_dates = pd.to_datetime(chunk[date_column], errors='coerce') if date_column is not None else None
+        if client_column is not None:
+            # Every row goes to the checks: ones without an amount can still share a PDF hash or serial
+            self._check(chunk, paise, client_column, all_dates)
+        paise = paise.dropna().astype('int64')
+        if paise.empty:
+            return
+        self.count += len(paise)
+        self.total += int(paise.sum())
+        self.lowest = min(int(paise.min()), self.lowest if self.lowest is not None else int(paise.min()))
+        self.highest = max(int(paise.max()), self.highest if self.highest is not None else int(paise.max()))
+
+        clients = chunk.loc[paise.index, client_column].astype(str).str.strip() if client_column is not None else None
+        if clients is not None:
+            by_client = paise.groupby(clients).agg(['count', 'sum'])
+            self.clients = by_client if self.clients is None else self.clients.add(by_client, fill_value=0)
+
+        dates = all_dates.loc[paise.index] if all_dates is not None else None
+        if len(self.transactions) < self.keep:
+            self._keep(paise, clients, dates)
+        if dates is not None:
+            if dates.notna().any():
+                self.first_date = min(dates.min(), self.first_date) if self.first_date is not None else dates.min()
+                self.last_date = max(dates.max(), self.last_date) if self.last_date is not None else dates.max()
+                # Integer YYYYMM keys; strftime on every row costs more than the rest of the pass
+                months = (dates.dt.year * 100 + dates.dt.month).dropna().astype('int64')
+                by_month = paise.loc[months.index].groupby(months).agg(['count', 'sum'])
+                self.months = by_month if self.months is None else self.months.add(by_month, fill_value=0)
+
+    def _check(self, chunk, paise, client_column, dates):
+        frame = pd.DataFrame({'Company Name': chunk[client_column], 'Amount (paise)': paise}, index=chunk.index)
+        if dates is not None:
+            frame['Date'] = dates
+        for column in ANOMALY_COLUMNS:
+            found = find_column(chunk.columns, (column,))
+            if found is not None:
+                frame[column] = chunk[found]
+        if self.anomalies is None:
+            self.anomalies = AnomalyCounter()
+        self.anomalies.update(frame)
+
+    def _keep(self, paise, clients, dates):
+        # (date, client, amount in rupees) rows for the appendix, up to self.keep of them
+        paise = paise.iloc[:self.keep - len(self.transactions)]
+        blank = pd.Series('', index=paise.index)
+        days = dates.loc[paise.index].dt.strftime('%Y-%m-%d').fillna('') if dates is not None else blank
+        names = clients.loc[paise.index] if clients is not None else blank
+        self.transactions.extend(zip(days, names, (paise / 100).tolist()))
+
+    def report(self):
+        """The per-sheet summary, in the shape generate_audit_report returns."""
+        return {
+            sheet_name: {
+                'row_count': details['row_count'],
+                'column_count': len(details['columns']),
+                'columns': details['columns'],
+                'missing_values': details['missing_values'],
+            }
+            for sheet_name, details in self.sheets.items()
+        }
+
+    def stats(self):
+        """Transaction statistics in rupees; client and month breakdowns are (count, total) pairs.
+
+        ``anomalies`` is the AnomalyCounter's counts, or None when no chunk had
+        a client column to check; ``transactions`` the rows kept for the appendix.
+        """
+        def breakdown(frame, by_total):
+            if frame is None:
+                return {}
+            frame = frame.sort_values('sum', ascending=False) if by_total else frame.sort_index()
+            return {key: (int(count), float(total) / 100) for key, count, total in zip(frame.index, frame['count'], frame['sum'])}
+
+        return {
+            'transaction_count': self.count,
+            'total_amount': self.total / 100,
+            'highest_transaction': self.highest / 100 if self.highest is not None else None,
+            'lowest_transaction': self.lowest / 100 if self.lowest is not None else None,
+            'average_transaction': self.total / self.count / 100 if self.count else None,
+            'first_date': self.first_date,
+            'last_date': self.last_date,
+            'clients': breakdown(self.clients, by_total=True),
+            'months': {f"{month // 100}-{month % 100:02d}": value for month, value in breakdown(self.months, by_total=False).items()},
+            'anomalies': self.anomalies.counts() if self.anomalies is not None else None,
+            'transactions': self.transactions,
+        }
+
+
+def aggregate_sheet(sheet_name, frame, chunksize=CHUNKSIZE, transactions=0):
+    """ReportAggregator over one sheet; run in workbook.map_sheets' worker processes."""
+    aggregator = ReportAggregator(transactions)
+    # At least one update, so a sheet without data rows is still listed in the summary
+    for start in range(0, max(len(frame), 1), chunksize):
+        aggregator.update(sheet_name, frame.iloc[start:start + chunksize])
+    return aggregator
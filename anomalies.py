@@ -0,0 +1,371 @@
+"""Duplicate and anomaly detection over the billing ledger and new uploads.
+
+    python audity.py anomalies --ledger billing_records.db
+
+Each check is a sort or a group-by over the whole frame, never a pairwise
+scan, so millions of rows take seconds:
+- duplicates: the same company billed the same amount within
+  ``window_days`` of another bill; rows are sorted by company, amount and
+  date, and each is compared with the one before it
+- repeated_hashes: one PDF Hash recorded for several bills
+- reused_serials: one serial_number on several bills
+- outliers: amounts far from what the client is usually billed (robust
+  z-score of the log amount against the client's median and MAD)
+- serial_gaps: numbers missing from a run of sequential serial numbers
+
+Uploaded bills whose Unique ID is already in the ledger are the same bill,
+not a duplicate of it, and are left out. AnomalyCounter counts what each
+check would flag over a file read chunk by chunk, without holding its rows.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from reconcile import normalize_company_names
+from records import paise_column
+
+DUPLICATE_WINDOW_DAYS = 7
+# Robust z-score (0.6745 * deviation / MAD) beyond which an amount is an outlier
+OUTLIER_SCORE = 3.5
+# Clients with fewer bills have no usual amount to compare against
+OUTLIER_MIN_BILLS = 8
+# A serial prefix is sequential when its numbers fill at least this share of their
+# range; bilgen's timestamp serials (SN<unix time>) are sparse and are skipped
+SEQUENTIAL_DENSITY = 0.5
+SEQUENTIAL_MIN_BILLS = 3
+# Serial numbers split into a prefix and a trailing number ("SN1700000000-12")
+SERIAL_PATTERN = r'^(?P<prefix>.*?)(?P<number>\d{1,18})$'
+
+AnomalyReport = namedtuple('AnomalyReport', ['duplicates', 'repeated_hashes', 'reused_serials', 'outliers', 'serial_gaps'])
+
+
+def _column(frame, name, dtype=object):
+    return frame[name] if name in frame.columns else pd.Series(None, index=frame.index, dtype=dtype)
+
+
+def _renumber(known, values):
+    # Map of each of ``values`` (by position) to its number in ``known``, adding new ones; position -1 maps to -1
+    return np.array([known.setdefault(value, len(known)) for value in values] + [-1], dtype=np.int64)
+
+
+def _company_keys(names):
+    # (per-row key codes, -1 for no name; normalized key of each code): one normalization per distinct name
+    names = names if isinstance(names.dtype, pd.CategoricalDtype) else names.astype('category')
+    keys, normalized = pd.factorize(normalize_company_names(pd.Series(names.cat.categories, dtype=object)))
+    codes = names.cat.codes.to_numpy()
+    return np.where(codes >= 0, keys[codes] if len(keys) else codes, -1), normalized
+
+
+def _prepare(frame, source):
+    # The columns every check reads, whatever shape the ledger or upload frame has
+    amounts = paise_column(frame)
+    return pd.DataFrame({
+        'Unique ID': _column(frame, 'Unique ID').astype('string').str.strip(),
+        'Company Name': _column(frame, 'Company Name'),
+        'Date': pd.to_datetime(_column(frame, 'Date'), errors='coerce'),
+        'Amount (paise)': amounts if amounts is not None else pd.Series(pd.NA, index=frame.index, dtype='Int64'),
+        'serial_number': _column(frame, 'serial_number').astype('string').str.strip().replace('', pd.NA),
+        'PDF Hash': _column(frame, 'PDF Hash').astype('string').str.strip().replace('', pd.NA),
+        'Source': source,
+    }).reset_index(drop=True)
+
+
+def combine(ledger, uploads=None):
+    """One frame of ledger rows and uploaded bills, with a Source column ('ledger' or 'upload').
+
+    ``_company_key`` numbers the normalized company names (-1 when missing),
+    so the checks sort and group on integers.
+    """
+    frames = [_prepare(ledger, 'ledger')]
+    if uploads is not None and len(uploads):
+        uploads = _prepare(uploads, 'upload')
+        # Look the few uploaded IDs up in the ledger, not the other way round: Arrow's
+        # isin walks its argument in Python
+        ledger_ids = frames[0]['Unique ID']
+        uploads = uploads[~uploads['Unique ID'].isin(ledger_ids[ledger_ids.isin(uploads['Unique ID'].dropna())])]
+        frames.append(uploads)
+
+    known = {}
+    company_keys = []
+    for frame in frames:
+        codes, normalized = _company_keys(frame['Company Name'])
+        # Renumber each frame's keys into one numbering shared by all of them
+        company_keys.append(_renumber(known, normalized)[codes])
+    records = pd.concat(frames, ignore_index=True)
+    records['_company_key'] = np.concatenate(company_keys)
+    return records
+
+
+def _usable(records, columns):
+    # Positions of rows with a company and every one of ``columns``
+    usable = records['_company_key'].to_numpy() >= 0
+    for column in columns:
+        usable &= records[column].notna().to_numpy()
+    return np.flatnonzero(usable)
+
+
+def _duplicate_pairs(companies, amounts, days, window_days):
+    # (later, earlier, days apart) for each bill matching the previous bill of its company and amount
+    order = np.lexsort((days, amounts, companies))
+    companies, amounts, days = companies[order], amounts[order], days[order]
+    apart = days[1:] - days[:-1]
+    hit = (companies[1:] == companies[:-1]) & (amounts[1:] == amounts[:-1]) & (apart <= window_days)
+    return order[1:][hit], order[:-1][hit], apart[hit]
+
+
+def find_duplicates(records, window_days=DUPLICATE_WINDOW_DAYS):
+    """Bills with the same company and amount as the previous one, at most ``window_days`` later."""
+    rows = _usable(records, ['Amount (paise)', 'Date'])
+    later, earlier, apart = _duplicate_pairs(
+        records['_company_key'].to_numpy()[rows],
+        records['Amount (paise)'].to_numpy(dtype=np.int64, na_value=0)[rows],
+        records['Date'].to_numpy(dtype='datetime64[D]')[rows].astype(np.int64),
+        window_days,
+    )
+    # Only the flagged rows are taken out of the frame
+    later = records.iloc[rows[later]].reset_index(drop=True)
+    earlier = records.iloc[rows[earlier]].reset_index(drop=True)
+    return pd.DataFrame({
+        'Unique ID': later['Unique ID'],
+        'Duplicate Of': earlier['Unique ID'],
+        'Company Name': later['Company Name'],
+        'Amount (paise)': later['Amount (paise)'],
+        'Date': later['Date'],
+        'Days Apart': apart,
+        'Source': later['Source'],
+        'Duplicate Of Source': earlier['Source'],
+    })
+
+
+def _sharing(codes):
+    # How many rows share each row's code; 0 for rows without one (-1)
+    present = codes >= 0
+    bills = np.zeros(len(codes), dtype=np.int64)
+    bills[present] = np.bincount(codes[present])[codes[present]]
+    return bills
+
+
+def find_repeated(records, column):
+    """Bills sharing a value of ``column`` with another bill, with how many share it."""
+    bills = _sharing(pd.factorize(records[column])[0])
+    repeated = records.loc[bills > 1, [column, 'Unique ID', 'Source']].assign(Bills=bills[bills > 1])
+    return repeated[[column, 'Unique ID', 'Bills', 'Source']].sort_values([column, 'Unique ID']).reset_index(drop=True)
+
+
+def _robust_scores(clients, amounts):
+    # Per bill: the client's bill count, its median log amount and the bill's robust z-score
+    logs = pd.Series(np.log(amounts.astype(np.float64)))
+    by_client = logs.groupby(clients)
+    bills = by_client.transform('size').to_numpy()
+    median = by_client.transform('median').to_numpy()
+    deviation = logs.to_numpy() - median
+    mad = pd.Series(np.abs(deviation)).groupby(clients).transform('median').to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(mad > 0, 0.6745 * deviation / mad, 0)
+    return bills, median, scores
+
+
+def find_outliers(records, score=OUTLIER_SCORE, min_bills=OUTLIER_MIN_BILLS):
+    """Bills whose amount is far from the client's median, by robust z-score of log amounts."""
+    rows = _usable(records, ['Amount (paise)'])
+    amounts = records['Amount (paise)'].to_numpy(dtype=np.int64, na_value=0)[rows]
+    rows, amounts = rows[amounts > 0], amounts[amounts > 0]
+    bills, median, scores = _robust_scores(records['_company_key'].to_numpy()[rows], amounts)
+    flagged = (bills >= min_bills) & (np.abs(scores) > score)
+    outliers = records.iloc[rows[flagged]]
+    return pd.DataFrame({
+        'Unique ID': outliers['Unique ID'].to_numpy(),
+        'Company Name': outliers['Company Name'].to_numpy(),
+        'Amount (paise)': amounts[flagged],
+        'Client Median (paise)': np.exp(median[flagged]).round().astype(np.int64),
+        'Score': scores[flagged].round(2),
+        'Source': outliers['Source'].to_numpy(),
+    })
+
+
+def _split_serials(serials):
+    # Split "SN1700000000-12" into "SN1700000000-" and 12 with Arrow string kernels; a
+    # regex extract runs per row in Python and is ten times slower. Returns the serials
+    # that end in a number, their prefixes and their numbers
+    prefixes = serials.str.rstrip('0123456789')
+    digits = serials.str.replace(r'^.*\D', '', regex=True)
+    usable = digits.str.len().between(1, 18)
+    return serials[usable], prefixes[usable], digits[usable].astype(np.int64).to_numpy()
+
+
+def _serial_gaps(prefix_codes, numbers, density, min_bills):
+    # Sort order of the serials, positions i in it where a sequential run skips
+    # numbers between i and i + 1, and how far it steps there
+    order = np.lexsort((numbers, prefix_codes))
+    prefix_codes, numbers = prefix_codes[order], numbers[order]
+
+    # Sequential prefixes only: their numbers must fill enough of their range
+    starts = np.flatnonzero(np.r_[True, prefix_codes[1:] != prefix_codes[:-1]])
+    bills = np.diff(np.r_[starts, len(numbers)])
+    span = numbers[np.r_[starts[1:], len(numbers)] - 1] - numbers[starts] + 1
+    sequential = np.repeat((bills >= min_bills) & (bills >= density * span), bills)
+
+    step = numbers[1:] - numbers[:-1]
+    gap = np.flatnonzero(sequential[:-1] & (prefix_codes[1:] == prefix_codes[:-1]) & (step > 1))
+    return order, gap, step[gap]
+
+
+def find_serial_gaps(records, density=SEQUENTIAL_DENSITY, min_bills=SEQUENTIAL_MIN_BILLS):
+    """Numbers missing from sequential serial runs, as (Prefix, After, Before, Missing) rows."""
+    serials, prefixes, numbers = _split_serials(records['serial_number'].dropna().drop_duplicates())
+    if not len(numbers):
+        return pd.DataFrame({'Prefix': [], 'After': [], 'Before': [], 'Missing': np.array([], dtype=np.int64)})
+
+    order, gap, step = _serial_gaps(pd.factorize(prefixes)[0], numbers, density, min_bills)
+    serials, prefixes = serials.iloc[order], prefixes.iloc[order]
+    return pd.DataFrame({
+        'Prefix': prefixes.iloc[gap].to_numpy(),
+        'After': serials.iloc[gap].to_numpy(),
+        'Before': serials.iloc[gap + 1].to_numpy(),
+        'Missing': step - 1,
+    })
+
+
+def _check(records, window_days):
+    return AnomalyReport(
+        find_duplicates(records, window_days),
+        find_repeated(records, 'PDF Hash'),
+        find_repeated(records, 'serial_number'),
+        find_outliers(records),
+        find_serial_gaps(records),
+    )
+
+
+def find_anomalies(ledger, uploads=None, window_days=DUPLICATE_WINDOW_DAYS):
+    """Run every check over ``ledger`` (a Ledger.read or billing_records frame) plus ``uploads``.
+
+    ``uploads`` is a frame of newly parsed bills (parse_batch records); rows
+    of the result carry Source so callers can keep those involving uploads.
+    """
+    return _check(combine(ledger, uploads), window_days)
+
+
+def _hash(values):
+    # 64-bit hashes standing in for strings that are only compared for equality
+    return pd.util.hash_array(values.to_numpy(dtype=object))
+
+
+def _repeated(hashes):
+    # First position of each distinct hash, and how many rows share their hash with another row
+    _, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+    return first, int(counts[counts > 1].sum())
+
+
+# Day stored for bills without a date; the duplicate check skips them
+_NO_DAY = np.iinfo(np.int32).min
+
+
+class AnomalyCounter:
+    """Row counts of every check, accumulated one chunk of a file at a time.
+
+    find_anomalies needs all rows in one frame. This keeps only the values the
+    checks compare, as integers: each bill's company key, amount and day, a
+    64-bit hash of its PDF Hash and of its serial_number, and the serial's
+    prefix key and number, about 44 bytes a bill. ``counts`` is an
+    AnomalyReport of how many rows each find_anomalies frame would have.
+    """
+
+    def __init__(self, window_days=DUPLICATE_WINDOW_DAYS):
+        self.window_days = window_days
+        self.companies = {}  # normalized company name -> key
+        self.prefixes = {}  # serial prefix -> key
+        # Per chunk: company keys, amounts in paise and days of the bills with both a company and an amount
+        self._bills = []
+        self._hashes = []  # per chunk: hashes of the PDF Hash values
+        # Per chunk: serial hashes, prefix keys (-1 when the serial does not end in a number) and numbers
+        self._serials = []
+
+    def update(self, frame):
+        """Add a chunk shaped like a billing_records frame; missing columns count as empty."""
+        codes, normalized = _company_keys(_column(frame, 'Company Name'))
+        companies = _renumber(self.companies, normalized)[codes]
+        amounts = paise_column(frame)
+        if amounts is not None:
+            usable = (companies >= 0) & amounts.notna().to_numpy()
+            days = pd.to_datetime(_column(frame, 'Date'), errors='coerce').to_numpy(dtype='datetime64[D]')[usable]
+            days = np.where(np.isnat(days), _NO_DAY, days.astype(np.int64)).astype(np.int32)
+            self._bills.append((companies[usable].astype(np.int32), amounts.to_numpy(dtype=np.int64, na_value=0)[usable], days))
+
+        hashes = _column(frame, 'PDF Hash').astype('string').str.strip().replace('', pd.NA).dropna()
+        self._hashes.append(_hash(hashes))
+        serials = _column(frame, 'serial_number').astype('string').str.strip().replace('', pd.NA).dropna().reset_index(drop=True)
+        numbered, prefixes, numbers = _split_serials(serials)
+        prefix_codes, distinct = pd.factorize(prefixes)
+        keys = np.full(len(serials), -1, dtype=np.int32)
+        keys[numbered.index] = _renumber(self.prefixes, distinct)[prefix_codes]
+        serial_numbers = np.zeros(len(serials), dtype=np.int64)
+        serial_numbers[numbered.index] = numbers
+        self._serials.append((_hash(serials), keys, serial_numbers))
+
+    def merge(self, other):
+        """Fold in a counter built over other chunks (e.g. in a worker process)."""
+        companies = _renumber(self.companies, other.companies).astype(np.int32)
+        prefixes = _renumber(self.prefixes, other.prefixes).astype(np.int32)
+        self._bills += [(companies[keys], amounts, days) for keys, amounts, days in other._bills]
+        self._hashes += other._hashes
+        self._serials += [(hashes, prefixes[keys], numbers) for hashes, keys, numbers in other._serials]
+
+    def _compact(self):
+        # One array per column, so the chunks' arrays are freed before the checks run
+        def concat(chunks, dtypes):
+            columns = list(zip(*chunks)) or [[] for _ in dtypes]
+            return tuple(np.concatenate(column) if column else np.array([], dtype=dtype) for column, dtype in zip(columns, dtypes))
+
+        self._bills = [concat(self._bills, (np.int32, np.int64, np.int32))]
+        self._hashes = [concat([(hashes,) for hashes in self._hashes], (np.uint64,))[0]]
+        self._serials = [concat(self._serials, (np.uint64, np.int32, np.int64))]
+
+    def counts(self):
+        self._compact()
+        companies, amounts, days = self._bills[0]
+        dated = days != _NO_DAY
+        duplicates = len(_duplicate_pairs(companies[dated], amounts[dated], days[dated], self.window_days)[0])
+
+        positive = amounts > 0
+        bills, _, scores = _robust_scores(companies[positive], amounts[positive])
+        outliers = int(((bills >= OUTLIER_MIN_BILLS) & (np.abs(scores) > OUTLIER_SCORE)).sum())
+        del bills, scores
+
+        repeated_hashes = _repeated(self._hashes[0])[1]
+        hashes, keys, numbers = self._serials[0]
+        first, reused_serials = _repeated(hashes)
+        # Gaps are found among distinct serials, as find_serial_gaps does
+        keys, numbers = keys[first], numbers[first]
+        numbered = keys >= 0
+        gaps = len(_serial_gaps(keys[numbered], numbers[numbered], SEQUENTIAL_DENSITY, SEQUENTIAL_MIN_BILLS)[1]) if numbered.any() else 0
+
+        return AnomalyReport(duplicates, repeated_hashes, reused_serials, outliers, gaps)
+
+
+def involving_uploads(report):
+    """The anomalies that touch at least one uploaded bill; serial gaps are ledger-only and dropped."""
+    duplicates = report.duplicates
+    uploaded = (duplicates['Source'] == 'upload') | (duplicates['Duplicate Of Source'] == 'upload')
+    return AnomalyReport(
+        duplicates[uploaded].reset_index(drop=True),
+        *(frame[frame['Source'] == 'upload'].reset_index(drop=True)
+          for frame in (report.repeated_hashes, report.reused_serials, report.outliers)),
+        report.serial_gaps.iloc[0:0],
+    )
+
+
+def upload_anomalies(ledger, uploads, window_days=DUPLICATE_WINDOW_DAYS):
+    """``involving_uploads(find_anomalies(ledger, uploads))``, checking only the ledger rows that can be involved.
+
+    Those are the rows sharing a company, PDF Hash or serial_number with an
+    upload, usually a small slice of the ledger.
+    """
+    records = combine(ledger, uploads)
+    uploaded = records[records['Source'] == 'upload']
+    related = records['_company_key'].isin(uploaded['_company_key'][uploaded['_company_key'] >= 0])
+    for column in ('PDF Hash', 'serial_number'):
+        values = uploaded[column].dropna()
+        if len(values):
+            related |= records[column].isin(values)
+    return involving_uploads(_check(records[related].reset_index(drop=True), window_days))
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+"""Headless Audity: audit a directory or archive of vouchers without Streamlit.
+
+    python audity.py run vouchers/ --ledger billing_records.db --out results.jsonl
+
+Each voucher is extracted, parsed, reconciled against the billing ledger and
+hash-checked; one JSON line per file is written to --out and a summary to
+<out>.summary.json. Finished files are recorded in a checkpoint, so rerunning
+the same command after an interruption picks up where it stopped.
+--metrics writes per-stage wall/CPU time and bytes (see metrics.py).
+
+    python audity.py verify bills/ --ledger billing_records.db
+
+verify checks archived bill PDFs against the ledger's PDF hashes and reports
+altered, missing and orphaned bills (see verify.py).
+
+    python audity.py anomalies --ledger billing_records.db [--uploads results.jsonl]
+
+anomalies looks for duplicate bills, repeated PDF hashes, reused serial
+numbers, outlying amounts and serial gaps across the ledger; with --uploads
+(the output of run) only those involving the audited vouchers are reported
+(see anomalies.py).
+
+Exit codes: 0 all vouchers reconciled (or bills verified, or no anomalies),
+1 discrepancies found, 2 usage error, 3 some files could not be extracted.
+"""
+import argparse
+import json
+import os
+import sys
+import tarfile
+import zipfile
+
+import pandas as pd
+
+from anomalies import DUPLICATE_WINDOW_DAYS, find_anomalies, upload_anomalies
+from cache import ExtractionCache
+from document import Document
+from extract import extraction_path_counts
+from ledger import DEFAULT_LEDGER_PATH, Ledger
+from metrics import METRICS, stage
+from parsing import parse_batch
+from reconcile import LedgerIndex, reconcile
+from scheduler import ExtractionScheduler
+from verify import DISCREPANCIES, verify_archive
+
+EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+
+EXIT_OK = 0
+EXIT_DISCREPANCIES = 1
+EXIT_USAGE = 2
+EXIT_FAILED_FILES = 3
+
+
+def _is_document(name):
+    return name.lower().endswith(EXTENSIONS)
+
+
+def iter_batches(source, batch_size, done=frozenset()):
+    """Yield lists of (name, Document) for the vouchers in a directory or archive.
+
+    Names are relative to ``source`` and double as checkpoint keys; names in
+    ``done`` are skipped. Each file or archive member is read once, hashed as
+    it is read, and held in memory (large files memory-mapped) until its batch
+    has been processed; nothing is unpacked to disk.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, source)
+                if _is_document(name) and name not in done:
+                    paths.append((name, path))
+        yield from _read_batches(paths, Document.from_path, batch_size)
+        return
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            members = [(info.filename, info) for info in archive.infolist() if not info.is_dir()]
+            yield from _read_batches(_pending(members, done), _member_loader(archive.open, 'file_size'), batch_size)
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            members = [(info.name, info) for info in archive if info.isfile()]
+            yield from _read_batches(_pending(members, done), _member_loader(archive.extractfile, 'size'), batch_size)
+    else:
+        raise ValueError(f"{source} is not a directory, zip or tar archive")
+
+
+def _pending(members, done):
+    return [(name, member) for name, member in members if _is_document(name) and name not in done]
+
+
+def _member_loader(open_member, size_attribute):
+    def load(member, name):
+        with open_member(member) as stream:
+            return Document.from_stream(name, stream, getattr(member, size_attribute))
+    return load
+
+
+def _read_batches(members, load, batch_size):
+    """Load ``members`` (name, member) pairs as Documents, batch by batch; ``load(member, name)`` reads one."""
+    for start in range(0, len(members), batch_size):
+        batch = []
+        try:
+            for name, member in members[start:start + batch_size]:
+                with stage('read', name) as current:
+                    document = load(member, name)
+                    current.nbytes = document.size
+                batch.append((name, document))
+            yield batch
+        finally:
+            for _, document in batch:
+                document.close()
+
+
+def missing_ledger(path):
+    # Opening a path that does not exist would create an empty ledger, and every
+    # voucher would come back unmatched; the audit commands never create one
+    if os.path.exists(path):
+        return False
+    print(f"audity: ledger {path} does not exist (pass --ledger or set AUDITY_LEDGER)", file=sys.stderr)
+    return True
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def resume_output(path, done):
+    """Rewrite a run's results keeping the last row of each checkpointed file; returns the kept rows.
+
+    Rows of files not in ``done`` were written by a batch that was interrupted
+    before its checkpoint, and are dropped because that batch runs again.
+    """
+    if not os.path.exists(path):
+        return []
+    rows = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by the interruption
+            if row.get('file') in done:
+                rows[row['file']] = row
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows.values())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return list(rows.values())
+
+
+def seen_keys(rows):
+    """The duplicate-detection keys audit_batch adds to ``seen`` for the records in result rows."""
+    return {
+        (row['unique_id'], row['company_name'], round(row['amount'] * 100), pd.Timestamp(row['date']))
+        for row in rows if row.get('unique_id') is not None
+    }
+
+
+def audit_batch(batch, scheduler, cache, index, stored_hashes, seen):
+    """Extract, parse, reconcile and hash-check one batch of (name, Document); returns one result dict per file."""
+    results = {name: {'file': name} for name, _ in batch}
+    hashes = {}
+    texts = {}
+    misses = []
+    for name, document in batch:
+        # Hashed while the file was read
+        hashes[name] = document.sha256
+        results[name]['sha256'] = hashes[name]
+        cached = cache.get(hashes[name]) if cache is not None else None
+        if cached is not None:
+            texts[name] = cached[0]
+        else:
+            misses.append((name, document))
+
+    for result in scheduler.run(misses):
+        if result.error is not None:
+            results[result.name].update(status='error', error=result.error)
+            continue
+        texts[result.name] = result.text
+        if cache is not None:
+            cache.put(hashes[result.name], result.text, result.fields)
+
+    names = [name for name, _ in batch if name in texts]
+    with stage('parse', nbytes=sum(len(texts[name]) for name in names)):
+        parsed = parse_batch([texts[name] for name in names])
+    for position in parsed.incomplete:
+        results[names[position]]['status'] = 'incomplete'
+    for position in parsed.duplicates:
+        results[names[position]]['status'] = 'duplicate'
+
+    records = parsed.records.copy()
+    records['file'] = [names[position] for position in records.index]
+    # Records repeated from an earlier batch of this run are duplicates too
+    keys = list(zip(records['Unique ID'], records['Company Name'], records['Amount (paise)'], records['Date']))
+    repeated = [key in seen for key in keys]
+    seen.update(keys)
+    for name in records.loc[repeated, 'file']:
+        results[name]['status'] = 'duplicate'
+    records = records.loc[[not r for r in repeated]]
+
+    if not records.empty:
+        with stage('reconcile'):
+            outcome = reconcile(records, index)
+        for status, frame in zip(outcome._fields, outcome):
+            for name, confidence in zip(frame['file'], frame['Confidence']):
+                results[name].update(status=status, confidence=round(float(confidence), 3))
+        for name, suggestion in zip(outcome.unmatched['file'], outcome.unmatched['Suggestion']):
+            if suggestion is not None:
+                results[name]['suggestion'] = suggestion
+        for record in records.to_dict('records'):
+            name = record['file']
+            results[name].update({
+                'unique_id': record['Unique ID'],
+                'company_name': record['Company Name'],
+                'date': record['Date'].strftime('%Y-%m-%d'),
+                'amount': record['Amount (paise)'] / 100,
+            })
+            if name.lower().endswith('.pdf'):
+                stored = stored_hashes.get(record['Unique ID'])
+                results[name]['hash_status'] = 'unknown' if stored is None else ('match' if stored == hashes[name] else 'mismatch')
+
+    return [results[name] for name, _ in batch]
+
+
+def run(args):
+    if missing_ledger(args.ledger):
+        return EXIT_USAGE
+    output = args.out
+    checkpoint = args.checkpoint or f"{output}.checkpoint"
+    done = load_checkpoint(checkpoint)
+    # Start from the results of checkpointed files only, so a batch cut off
+    # between writing its rows and its checkpoint is not counted twice, and
+    # records seen before the interruption are still caught as duplicates
+    seen = seen_keys(resume_output(output, done))
+    if done:
+        print(f"Resuming: {len(done)} files already processed", file=sys.stderr)
+
+    # Build the ledger index once for the whole run
+    with stage('ledger_load', args.ledger, os.path.getsize(args.ledger)), Ledger(args.ledger) as ledger:
+        ledger_frame = ledger.read(columns=['Unique ID', 'Company Name', 'Amount (paise)', 'PDF Hash'])
+        index = LedgerIndex(ledger_frame)
+    stored_hashes = dict(zip(ledger_frame['Unique ID'], ledger_frame['PDF Hash']))
+    cache = None if args.no_cache else ExtractionCache()
+
+    with ExtractionScheduler(args.workers) as scheduler, \
+            open(output, 'a', encoding='utf-8') as out, \
+            open(checkpoint, 'a', encoding='utf-8') as ckpt:
+        for batch in iter_batches(args.source, args.batch_size, done):
+            for result in audit_batch(batch, scheduler, cache, index, stored_hashes, seen):
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            # Results are on disk; only now mark the batch as done
+            ckpt.writelines(name + "\n" for name, _ in batch)
+            ckpt.flush()
+            os.fsync(ckpt.fileno())
+            print(f"Processed {len(batch)} files", file=sys.stderr)
+
+    results = pd.read_json(output, lines=True) if os.path.getsize(output) else pd.DataFrame(columns=['status'])
+    if args.format == 'parquet':
+        results.to_parquet(os.path.splitext(output)[0] + '.parquet', index=False)
+
+    counts = results['status'].value_counts().to_dict()
+    mismatched = int((results['hash_status'] == 'mismatch').sum()) if 'hash_status' in results else 0
+    summary = {
+        'files': len(results),
+        'status': counts,
+        'hash_mismatches': mismatched,
+        'total_amount': float(results['amount'].sum()) if 'amount' in results else 0.0,
+    }
+    if 'classify' in METRICS.summary():
+        # Counts files extracted in this run; cache hits were never classified
+        summary['extraction_paths'] = extraction_path_counts()
+    with open(f"{output}.summary.json", 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    if args.metrics:
+        METRICS.write(args.metrics)
+    print(json.dumps(summary, indent=2))
+
+    if counts.get('error'):
+        return EXIT_FAILED_FILES
+    if mismatched or any(counts.get(status) for status in ('unmatched', 'ambiguous', 'incomplete', 'duplicate')):
+        return EXIT_DISCREPANCIES
+    return EXIT_OK
+
+
+def verify(args):
+    if missing_ledger(args.ledger):
+        return EXIT_USAGE
+    with Ledger(args.ledger) as ledger:
+        ledger_hashes = ledger.read(columns=['Unique ID', 'PDF Hash'])
+    with stage('verify', args.source) as current:
+        report = verify_archive(args.source, ledger_hashes, args.state, args.workers, args.full)
+        current.nbytes = report.bytes_hashed
+    if args.out:
+        report.results.to_json(args.out, orient='records', lines=True)
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+    summary = {
+        'bills': len(report.results),
+        'status': report.counts,
+        'hashed': report.hashed,
+        'unchanged_skipped': report.reused,
+        'seconds': round(report.seconds, 3),
+    }
+    print(json.dumps(summary, indent=2))
+    for row in report.results[report.results['status'].isin(DISCREPANCIES)].itertuples(index=False):
+        print(f"{row.status:<9} {row[0]} {row.path if isinstance(row.path, str) else ''}", file=sys.stderr)
+    return EXIT_DISCREPANCIES if any(report.counts[status] for status in DISCREPANCIES) else EXIT_OK
+
+
+def read_results(path):
+    # Parsed vouchers from a run's JSONL output, as a frame of bills
+    results = pd.read_json(path, lines=True, dtype=False)
+    if 'unique_id' not in results.columns:
+        return None
+    results = results[results['unique_id'].notna()]
+    pdfs = results['file'].str.lower().str.endswith('.pdf')
+    return pd.DataFrame({
+        'Unique ID': results['unique_id'],
+        'Company Name': results['company_name'],
+        'Date': results['date'],
+        'Amount': results['amount'],
+        # A voucher's bytes are its PDF Hash; one equal to another bill's is a copy
+        'PDF Hash': results['sha256'].where(pdfs),
+    })
+
+
+def anomalies(args):
+    if missing_ledger(args.ledger):
+        return EXIT_USAGE
+    with stage('ledger_load', args.ledger), Ledger(args.ledger) as ledger:
+        ledger_frame = ledger.read(columns=['Unique ID', 'Company Name', 'Date', 'Amount (paise)', 'serial_number', 'PDF Hash'])
+    uploads = read_results(args.uploads) if args.uploads else None
+    with stage('anomalies'):
+        if uploads is None:
+            report = find_anomalies(ledger_frame, window_days=args.window_days)
+        else:
+            report = upload_anomalies(ledger_frame, uploads, args.window_days)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for kind, frame in zip(report._fields, report):
+                if not frame.empty:
+                    f.write(frame.assign(kind=kind).to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n')
+    if args.metrics:
+        METRICS.write(args.metrics)
+
+    counts = {kind: len(frame) for kind, frame in zip(report._fields, report)}
+    summary = {'ledger_bills': len(ledger_frame), 'uploads': 0 if uploads is None else len(uploads), 'anomalies': counts}
+    print(json.dumps(summary, indent=2))
+    return EXIT_DISCREPANCIES if any(counts.values()) else EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='audity', description="Audit vouchers against the billing ledger.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="extract, parse, reconcile and report a directory or archive of vouchers")
+    run_parser.add_argument('source', help="directory, .zip or .tar(.gz) of PDF/image vouchers")
+    run_parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help="billing ledger database (default: %(default)s)")
+    run_parser.add_argument('--out', default='audity_results.jsonl', help="JSONL results file (default: %(default)s)")
+    run_parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl', help="also write Parquet when set to parquet")
+    run_parser.add_argument('--checkpoint', help="checkpoint file (default: <out>.checkpoint)")
+    run_parser.add_argument('--batch-size', type=int, default=500)
+    run_parser.add_argument('--workers', type=int, default=None, help="extraction processes (default: CPU count)")
+    run_parser.add_argument('--no-cache', action='store_true', help="skip the extraction cache")
+    run_parser.add_argument('--metrics', help="write per-stage timings here: Prometheus text for .prom, JSON otherwise")
+    run_parser.set_defaults(func=run)
+
+    verify_parser = commands.add_parser('verify', help="check archived bill PDFs against the ledger's PDF hashes")
+    verify_parser.add_argument('source', help="directory of bill_<Unique ID>.pdf files, searched recursively")
+    verify_parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help="billing ledger database (default: %(default)s)")
+    verify_parser.add_argument('--state', help="size/mtime/hash state file (default: <source>/.audity_verify.json)")
+    verify_parser.add_argument('--full', action='store_true', help="rehash every file, even unchanged ones")
+    verify_parser.add_argument('--workers', type=int, default=None, help="hashing threads")
+    verify_parser.add_argument('--out', help="write one JSON line per bill here")
+    verify_parser.add_argument('--metrics', help="write per-stage timings here: Prometheus text for .prom, JSON otherwise")
+    verify_parser.set_defaults(func=verify)
+
+    anomalies_parser = commands.add_parser('anomalies', help="find duplicate bills, reused hashes and serials, outliers and serial gaps")
+    anomalies_parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH, help="billing ledger database (default: %(default)s)")
+    anomalies_parser.add_argument('--uploads', help="results JSONL from run; report only anomalies involving those vouchers")
+    anomalies_parser.add_argument('--window-days', type=int, default=DUPLICATE_WINDOW_DAYS,
+                                  help="same company and amount within this many days is a duplicate (default: %(default)s)")
+    anomalies_parser.add_argument('--out', help="write one JSON line per anomaly here")
+    anomalies_parser.add_argument('--metrics', help="write per-stage timings here: Prometheus text for .prom, JSON otherwise")
+    anomalies_parser.set_defaults(func=anomalies)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
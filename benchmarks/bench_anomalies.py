@@ -0,0 +1,115 @@
+"""Anomaly detection over a large ledger with planted anomalies.
+
+The ledger mimics generate_bills output (SN<timestamp>-<n> serials per
+batch). Duplicate bills, copied PDF hashes, reused serials, outlying
+amounts and deleted bills (serial gaps) are planted, then found with
+find_anomalies. The pairwise scan a naive duplicate check would do is
+timed on a sample and extrapolated.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomalies import DUPLICATE_WINDOW_DAYS, find_anomalies, involving_uploads, upload_anomalies
+
+N_ROWS = 2_000_000
+N_COMPANIES = 20_000
+BATCH = 1_000  # bills per generate_bills batch, sharing a serial prefix
+N_PLANTED = 200  # of each kind
+PAIRWISE_SAMPLE = 3_000
+N_UPLOADS = 500  # vouchers in one audit, checked against the ledger
+
+
+def make_ledger(n, rng):
+    companies = np.array([f"Company {i} Pvt Ltd" for i in range(N_COMPANIES)], dtype=object)
+    client = rng.integers(0, N_COMPANIES, n)
+    # Each client bills around its own typical amount
+    typical = rng.uniform(np.log(10_000), np.log(5_000_000), N_COMPANIES)
+    amounts = np.exp(typical[client] + rng.normal(0, 0.3, n)).round().astype(np.int64)
+    batches = np.arange(n) // BATCH
+    return pd.DataFrame({
+        'Unique ID': [f"{i:010X}" for i in range(n)],
+        'Company Name': pd.Categorical.from_codes(client, companies),
+        'Date': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, n), unit='D'),
+        'Amount (paise)': amounts,
+        'serial_number': [f"SN{1_700_000_000 + batch * 60}-{i % BATCH}" for i, batch in enumerate(batches)],
+        'PDF Hash': [f"{i:064x}" for i in range(n)],
+    })
+
+
+def plant(ledger, rng):
+    n = len(ledger)
+    rows = rng.choice(n, 5 * N_PLANTED, replace=False)
+    duplicates, hashes, serials, outliers, deleted = np.split(rows, 5)
+
+    copies = ledger.iloc[duplicates].copy()
+    copies['Unique ID'] = [f"D{i:09X}" for i in range(len(copies))]
+    copies['Date'] += pd.to_timedelta(rng.integers(0, DUPLICATE_WINDOW_DAYS + 1, len(copies)), unit='D')
+    copies['serial_number'] = None
+    copies['PDF Hash'] = None
+
+    pdf_hash = ledger.columns.get_loc('PDF Hash')
+    serial = ledger.columns.get_loc('serial_number')
+    ledger.iloc[hashes, pdf_hash] = ledger.iloc[(hashes + 1) % n, pdf_hash].to_numpy()
+    ledger.iloc[serials, serial] = ledger.iloc[(serials + 1) % n, serial].to_numpy()
+    amount = ledger.columns.get_loc('Amount (paise)')
+    ledger.iloc[outliers, amount] = ledger.iloc[outliers, amount].to_numpy() * 1_000
+    # Interior rows only, so a gap has bills on both sides
+    deleted = deleted[(deleted % BATCH > 0) & (deleted % BATCH < BATCH - 1)]
+    planted_outliers = set(ledger['Unique ID'].iloc[outliers])
+    ledger = ledger.drop(index=deleted)
+    return pd.concat([ledger, copies], ignore_index=True), set(copies['Unique ID']), planted_outliers
+
+
+def pairwise_duplicates(ledger, window_days):
+    # Every bill against every other bill
+    rows = list(zip(ledger['Company Name'].astype(str).str.casefold(), ledger['Amount (paise)'], ledger['Date']))
+    found = 0
+    for i, (company, amount, date) in enumerate(rows):
+        for other_company, other_amount, other_date in rows[i + 1:]:
+            if company == other_company and amount == other_amount and abs((date - other_date).days) <= window_days:
+                found += 1
+    return found
+
+
+def main():
+    rng = np.random.default_rng(0)
+    ledger, planted_duplicates, planted_outliers = plant(make_ledger(N_ROWS, rng), rng)
+    print(f"{len(ledger):,} ledger rows, {N_PLANTED} of each planted anomaly")
+
+    start = time.perf_counter()
+    pairwise_duplicates(ledger.iloc[:PAIRWISE_SAMPLE], DUPLICATE_WINDOW_DAYS)
+    pairwise = (time.perf_counter() - start) * (len(ledger) / PAIRWISE_SAMPLE) ** 2
+    print(f"pairwise duplicate scan (est.):  {pairwise / 3600:10.1f} h")
+
+    start = time.perf_counter()
+    report = find_anomalies(ledger)
+    print(f"find_anomalies:                  {time.perf_counter() - start:10.2f} s")
+
+    for kind, frame in zip(report._fields, report):
+        print(f"  {kind:<16} {len(frame):6,}")
+    found = set(report.duplicates['Unique ID']) | set(report.duplicates['Duplicate Of'])
+    print(f"planted duplicates found: {len(planted_duplicates & found)} / {len(planted_duplicates)}")
+    print(f"planted outliers found: {len(planted_outliers & set(report.outliers['Unique ID']))} / {len(planted_outliers)}")
+    print(f"serial gaps: {int(report.serial_gaps['Missing'].sum())} bills missing")
+
+    # An upload batch as parse_batch returns it: resubmitted copies of ledger bills under new IDs
+    uploads = ledger.sample(N_UPLOADS, random_state=1)[['Company Name', 'Date', 'Amount (paise)']]
+    uploads.insert(0, 'Unique ID', [f"U{i:09X}" for i in range(N_UPLOADS)])
+    start = time.perf_counter()
+    full = involving_uploads(find_anomalies(ledger, uploads))
+    print(f"{N_UPLOADS} uploads, full scan:            {time.perf_counter() - start:6.2f} s")
+    start = time.perf_counter()
+    related = upload_anomalies(ledger, uploads)
+    print(f"{N_UPLOADS} uploads, upload_anomalies:     {time.perf_counter() - start:6.2f} s, "
+          f"{len(related.duplicates)} duplicates, {len(related.outliers)} outliers")
+    assert all(len(a) == len(b) for a, b in zip(full, related))
+
+
+if __name__ == "__main__":
+    main()
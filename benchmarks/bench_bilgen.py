@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_bill_specs
+from bilgen.bills import create_pdf, generate_bills, generate_pdf_hash
+from ledger import Ledger
+
+N_BILLS = 2000
+SINGLE_SAMPLE = 300  # the one-bill-per-click path is timed on a sample
+
+
+def single_bill(spec, output_dir, ledger_path):
+    # What one "Generate Bill" click does: write the PDF, re-read it to hash, append one ledger row
+    pdf_file_name = create_pdf(spec, output_dir)
+    pdf_hash = generate_pdf_hash(pdf_file_name)
+    with Ledger(ledger_path) as ledger:
+        ledger.append([{
+            'Unique ID': spec['Unique ID'], 'Date': spec['Date'], 'serial_number': spec['serial_number'],
+            'Amount': spec['Total'], 'pan_number': spec['pan_number'], 'Company Name': spec['Company Name'],
+            'PDF Hash': pdf_hash,
+        }])
+
+
+def main():
+    specs = make_bill_specs(N_BILLS + SINGLE_SAMPLE)
+    with tempfile.TemporaryDirectory() as workdir:
+        single_dir = os.path.join(workdir, 'single')
+        os.makedirs(single_dir)
+        start = time.perf_counter()
+        for spec in specs[:SINGLE_SAMPLE]:
+            single_bill(spec, single_dir, os.path.join(workdir, 'single.db'))
+        single_rate = SINGLE_SAMPLE / (time.perf_counter() - start)
+
+        batch_specs = specs[SINGLE_SAMPLE:]
+        start = time.perf_counter()
+        with Ledger(os.path.join(workdir, 'batch.db')) as ledger:
+            generate_bills(batch_specs, os.path.join(workdir, 'batch'), ledger)
+            rows = len(ledger)
+        batch_rate = len(batch_specs) / (time.perf_counter() - start)
+
+    print(f"single-bill path:  {single_rate:8.1f} bills/s")
+    print(f"generate_bills:    {batch_rate:8.1f} bills/s  ({rows} ledger rows, {os.cpu_count()} CPUs)")
+    print(f"speedup:           {batch_rate / single_rate:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_bill_specs
+from bilgen.bills import render_pdf_bytes
+from document import Document
+from extract import extract_document
+
+N_BILLS = 500
+
+
+def temp_file_path(name, data):
+    # What app.py did per upload: hash the buffer, spill it to a temp file, extract from the path, delete it
+    content_hash = hashlib.sha256(data).hexdigest()
+    with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        temp_file.write(data)
+    try:
+        extract_document(temp_file.name, name)
+    finally:
+        os.remove(temp_file.name)
+    return content_hash
+
+
+def in_memory(name, data):
+    with Document(name, data) as document:
+        extract_document(document)
+        return document.sha256
+
+
+def main():
+    uploads = [(f"bill_{spec['Unique ID']}.pdf", memoryview(render_pdf_bytes(spec))) for spec in make_bill_specs(N_BILLS)]
+    print(f"{N_BILLS} bill PDFs, hashed and extracted one after another")
+    for label, handle in [('temp file round trip', temp_file_path), ('Document over buffer', in_memory)]:
+        start = time.perf_counter()
+        for name, data in uploads:
+            handle(name, data)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {elapsed / N_BILLS * 1000:8.2f} ms/bill")
+
+
+if __name__ == "__main__":
+    main()
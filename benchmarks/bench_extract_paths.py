@@ -0,0 +1,59 @@
+"""Extraction path per kind of document, and what classifying it costs.
+
+Born-digital bills from create_pdf are read from their text layer alone;
+the same bills rasterized into image-only PDFs are classified as scans and
+would go to OCR, which is not timed here.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from corpus import make_bill_specs, rasterize, render_pdfs
+from bilgen.bills import render_pdf_bytes
+from classify import classify_document
+from document import Document
+from extract import extract_document, extract_fields_from_pdf
+
+N_BILLS = 300
+N_SCANS = 20
+
+
+def scanned_pdf(pdf_path):
+    buffer = io.BytesIO()
+    Image.fromarray(rasterize(pdf_path, dpi=150)).save(buffer, format='PDF')
+    return buffer.getvalue()
+
+
+def per_document(label, documents, handle):
+    start = time.perf_counter()
+    for document in documents:
+        handle(document)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / len(documents) * 1000:8.2f} ms/document")
+
+
+def main():
+    bills = [Document(f"bill_{spec['Unique ID']}.pdf", render_pdf_bytes(spec)) for spec in make_bill_specs(N_BILLS)]
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = render_pdfs(make_bill_specs(N_SCANS, seed=1), workdir)
+        scans = [Document(f"scan_{i}.pdf", scanned_pdf(path)) for i, path in enumerate(paths)]
+
+    kinds = {}
+    for document in bills + scans:
+        kind = classify_document(document).kind
+        kinds[kind] = kinds.get(kind, 0) + 1
+    print(f"{N_BILLS} born-digital bills, {N_SCANS} image-only scans: classified as {kinds}")
+
+    per_document('bills: pdfplumber, page by page', bills, extract_fields_from_pdf)
+    per_document('bills: extract_document (text layer)', bills, extract_document)
+    per_document('scans: classify only', scans, classify_document)
+
+
+if __name__ == "__main__":
+    main()
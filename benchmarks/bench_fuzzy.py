@@ -0,0 +1,103 @@
+"""Fuzzy company-name matching against a large ledger.
+
+Queries are ledger names with OCR-style damage (swapped letters, "rn" for
+"m", dropped punctuation, suffixes spelled out). Each is looked up once
+blocked on its true amount, as reconcile does, and once by name alone, as
+for a suggestion, and compared with scoring every distinct ledger name.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from fuzzy import FuzzyMatcher, canonical_company_name, trigrams
+
+N_ROWS = 1_000_000
+N_COMPANIES = 20_000
+N_QUERIES = 500
+N_NAIVE = 50  # a full scan per query is slow; time it on a sample
+SEED = 7
+
+SYLLABLES = ['ra', 'ma', 'sh', 'gu', 'pta', 'kri', 'shna', 'lak', 'shmi', 'ven', 'kat', 'esh', 'sri', 'dev', 'an', 'and', 'bha', 'rat', 'jai', 'nath']
+KINDS = ['Traders', 'Textiles', 'Motors', 'Pharma', 'Foods', 'Steels', 'Agencies', 'Exports', 'Builders', 'Electricals']
+SUFFIXES = ['Pvt. Ltd.', 'Private Limited', 'Ltd', '& Co.', 'and Company', 'Enterprises', '']
+OCR_SWAPS = [('m', 'rn'), ('l', '1'), ('o', '0'), ('e', 'c'), ('i', 'l'), ('s', '5')]
+
+
+def make_companies(rng):
+    names = set()
+    while len(names) < N_COMPANIES:
+        stem = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        names.add(f"{stem} {rng.choice(KINDS)} {rng.choice(SUFFIXES)}".strip())
+    return sorted(names)
+
+
+def damage(name, rng):
+    """One or two OCR-style errors, sometimes with punctuation or suffix spelling changed."""
+    for _ in range(rng.randint(1, 2)):
+        roll = rng.random()
+        if roll < 0.4:
+            old, new = rng.choice(OCR_SWAPS)
+            if old in name:
+                name = name.replace(old, new, 1)
+                continue
+        if roll < 0.7 and len(name) > 4:
+            i = rng.randrange(1, len(name) - 1)
+            name = name[:i] + name[i + 1:]
+        else:
+            name = name.replace('Pvt. Ltd.', 'Private Limited').replace('&', 'and').replace('.', '')
+    return name
+
+
+def main():
+    rng = random.Random(SEED)
+    companies = make_companies(rng)
+    np_rng = np.random.default_rng(SEED)
+    ledger = pd.DataFrame({
+        'Company Name': np.array(companies, dtype=object)[np_rng.integers(0, N_COMPANIES, N_ROWS)],
+        'Amount': np_rng.integers(100, 500_000, N_ROWS) / 100,
+    })
+    amounts = (ledger['Amount'] * 100).round().astype('Int64')
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(ledger, amounts)
+    build = time.perf_counter() - start
+    print(f"{N_ROWS:,} ledger rows, {len(matcher.index):,} distinct names; index built in {build:.2f} s")
+
+    rows = np_rng.integers(0, N_ROWS, N_QUERIES)
+    queries = [(damage(ledger.at[row, 'Company Name'], rng), int(amounts.iat[row]), int(row)) for row in rows]
+    truth = [canonical_company_name(ledger.at[row, 'Company Name']) for _, _, row in queries]
+
+    def run(label, lookup):
+        top1 = topk = 0
+        start = time.perf_counter()
+        for (name, amount, _), expected in zip(queries, truth):
+            found = [canonical_company_name(match.company_name) for match in lookup(name, amount)]
+            top1 += bool(found) and found[0] == expected
+            topk += expected in found
+        elapsed = time.perf_counter() - start
+        print(f"{label:<26} {elapsed / N_QUERIES * 1000:8.3f} ms/query  top-1 {top1 / N_QUERIES:6.1%}  top-5 {topk / N_QUERIES:6.1%}")
+
+    run('blocked on amount', lambda name, amount: matcher.candidates(name, amount, k=5))
+    run('name only (suggestions)', lambda name, amount: matcher.candidates(name, None, k=5))
+
+    # Naive: score the query against every distinct canonical name
+    names = matcher.index.names
+    gram_sets = [trigrams(name) for name in names]
+    start = time.perf_counter()
+    top1 = 0
+    for (name, _, _), expected in zip(queries[:N_NAIVE], truth):
+        query = trigrams(canonical_company_name(name))
+        best = max(range(len(names)), key=lambda i: 2 * len(query & gram_sets[i]) / (len(query) + len(gram_sets[i])))
+        top1 += names[best] == expected
+    elapsed = time.perf_counter() - start
+    print(f"{'naive scan of all names':<26} {elapsed / N_NAIVE * 1000:8.3f} ms/query  top-1 {top1 / N_NAIVE:6.1%}  ({N_NAIVE} queries)")
+
+
+if __name__ == "__main__":
+    main()
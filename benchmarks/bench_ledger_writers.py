@@ -0,0 +1,158 @@
+"""Many processes and threads writing one ledger at the same moment.
+
+Every writer records its bills one at a time, as the "Generate Bill" button
+does, in three ways:
+- csv_append: the old billing_records.csv append (to_csv mode='a', with a
+  header when the file does not exist yet)
+- ledger_per_bill: a Ledger per thread, one transaction per bill
+- ledger_writer: a LedgerWriter per process shared by its threads, so
+  concurrent bills are group-committed
+All writers wait on a barrier and start together. Afterwards every row is
+read back and compared with what was written: rows lost, rows duplicated,
+stray header lines and rows whose fields do not match are counted.
+"""
+import csv
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import Ledger, LedgerWriter
+from records import BillRecord
+
+PROCESSES = 4
+THREADS = 16  # per process, like sessions of one Streamlit server
+BILLS = 100  # per thread
+CSV_COLUMNS = ['Unique ID', 'Date', 'serial_number', 'Amount', 'pan_number', 'Company Name', 'PDF Hash']
+
+
+def make_record(process, thread, sequence):
+    # Every field is derived from the writer and sequence, so a row read back can be checked on its own
+    unique_id = f"{process:02X}{thread:02X}{sequence:06X}"
+    return BillRecord(
+        unique_id=unique_id,
+        company_name=f"Company {(process * 31 + sequence) % 50} Pvt Ltd",
+        date=pd.Timestamp('2024-01-01').date() + pd.Timedelta(days=sequence % 365),
+        amount_paise=(process + 1) * 1_000_003 + thread * 10_007 + sequence,
+        serial_number=f"SN{process}{thread}-{sequence}",
+        pan_number="ABCDE1234F",
+        pdf_hash=hashlib.sha256(unique_id.encode()).hexdigest(),
+    )
+
+
+def csv_append(path, record):
+    pd.DataFrame([record.to_dict()]).to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+def write_bills(mode, path, process, barrier):
+    writer = LedgerWriter(path) if mode == 'ledger_writer' else None
+
+    def run(thread):
+        ledger = Ledger(path) if mode == 'ledger_per_bill' else None
+        for sequence in range(BILLS):
+            record = make_record(process, thread, sequence)
+            if mode == 'csv_append':
+                csv_append(path, record)
+            elif mode == 'ledger_per_bill':
+                ledger.append([record])
+            else:
+                writer.append([record])
+        if ledger is not None:
+            ledger.close()
+
+    threads = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+    barrier.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if writer is not None:
+        writer.close()
+
+
+def expected_rows():
+    return {
+        record.unique_id: record
+        for record in (make_record(p, t, s) for p in range(PROCESSES) for t in range(THREADS) for s in range(BILLS))
+    }
+
+
+def check_csv(path):
+    headers, malformed, rows = 0, 0, []
+    with open(path, newline='', encoding='utf-8') as f:
+        for line_number, fields in enumerate(csv.reader(f)):
+            if fields == CSV_COLUMNS:
+                headers += line_number > 0
+            elif len(fields) != len(CSV_COLUMNS):
+                malformed += 1
+            else:
+                row = dict(zip(CSV_COLUMNS, fields))
+                rows.append((row['Unique ID'], (row['Date'], row['serial_number'], round(float(row['Amount']) * 100),
+                                                row['Company Name'], row['PDF Hash'])))
+    return rows, headers, malformed
+
+
+def check_ledger(path):
+    with Ledger(path) as ledger:
+        frame = ledger.read(columns=['Unique ID', 'Date', 'serial_number', 'Amount (paise)', 'Company Name', 'PDF Hash'])
+    dates = frame['Date'].dt.strftime('%Y-%m-%d')
+    return [
+        (unique_id, (date, serial, int(paise), str(company), pdf_hash))
+        for unique_id, date, serial, paise, company, pdf_hash in zip(
+            frame['Unique ID'], dates, frame['serial_number'], frame['Amount (paise)'], frame['Company Name'], frame['PDF Hash'])
+    ], 0, 0
+
+
+def verify(rows, expected):
+    seen = {}
+    wrong = 0
+    for unique_id, fields in rows:
+        seen[unique_id] = seen.get(unique_id, 0) + 1
+        record = expected.get(unique_id)
+        if record is None or fields != (record.date.isoformat(), record.serial_number, record.amount_paise,
+                                        record.company_name, record.pdf_hash):
+            wrong += 1
+    lost = sum(unique_id not in seen for unique_id in expected)
+    duplicated = sum(count - 1 for count in seen.values())
+    return lost, duplicated, wrong
+
+
+def run(mode, workdir, expected):
+    path = os.path.join(workdir, 'billing_records.csv' if mode == 'csv_append' else f"{mode}.db")
+    if mode != 'csv_append':
+        Ledger(path).close()  # create the schema before the writers race to
+    barrier = multiprocessing.Barrier(PROCESSES)
+    processes = [multiprocessing.Process(target=write_bills, args=(mode, path, process, barrier)) for process in range(PROCESSES)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    seconds = time.perf_counter() - start
+    failed = sum(process.exitcode != 0 for process in processes)
+
+    rows, headers, malformed = check_csv(path) if mode == 'csv_append' else check_ledger(path)
+    lost, duplicated, wrong = verify(rows, expected)
+    print(f"{mode:<16} {len(expected) / seconds:9.0f} {lost:6} {duplicated:6} {headers:8} {malformed + wrong:8} {failed:8}")
+    return lost + duplicated + headers + malformed + wrong + failed
+
+
+def main():
+    expected = expected_rows()
+    print(f"{PROCESSES} processes x {THREADS} threads x {BILLS} bills = {len(expected):,} rows, {os.cpu_count()} CPUs\n")
+    print(f"{'mode':<16} {'bills/s':>9} {'lost':>6} {'dupes':>6} {'headers':>8} {'corrupt':>8} {'crashed':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        problems = {mode: run(mode, workdir, expected) for mode in ('csv_append', 'ledger_per_bill', 'ledger_writer')}
+    # The old CSV path is the baseline; the ledger paths must come back exact
+    assert problems['ledger_per_bill'] == 0 and problems['ledger_writer'] == 0, problems
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import locale
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import parse_batch
+
+N_TEXTS = 100_000
+PER_RECORD_SAMPLE = 10_000  # the per-record parser is timed on a sample and extrapolated
+
+
+def make_texts(n, rng):
+    # Same layout as the text pdfplumber pulls out of a bilgen bill
+    texts = []
+    for i in range(n):
+        products = "\n".join(f"Item {j} - {rng.integers(100, 50_000) / 100:.2f}" for j in range(rng.integers(1, 6)))
+        texts.append(
+            f"Unique ID: {i:010X}\n"
+            f"Company Name: Company {rng.integers(0, 5000)} Pvt Ltd\n"
+            f"Date: 2024-{rng.integers(1, 13):02d}-{rng.integers(1, 29):02d}\n"
+            f"Serial Number: SN{1_700_000_000 + i}\n"
+            f"Products/Services:\n{products}\n"
+            f"Total: {rng.integers(100, 10_000_000) / 100:,.2f}\n"
+        )
+    # Re-upload a slice so cross-batch de-duplication has work to do
+    return texts + texts[:n // 100]
+
+
+def parse_per_record(text):
+    # What parse_financial_data did for every document before parse_batch
+    unique_id_match = re.search(r'Unique ID:\s*(\w+)', text)
+    company_name_match = re.search(r'Company Name:\s*(.*?)\s*Date:', text, re.DOTALL)
+    date_match = re.search(r'Date:\s*(\d{4}-\d{2}-\d{2})', text)
+    total_amount_match = re.search(r'Total:\s*([\d,]+(?:\.\d+)?)', text)
+    date = pd.to_datetime(date_match.group(1))
+    total_amount = float(total_amount_match.group(1).replace(',', ''))
+    try:
+        amount = locale.currency(total_amount, grouping=True, symbol=True)
+    except ValueError:
+        amount = f"₹{total_amount:,.2f}"
+    return {'Unique ID': unique_id_match.group(1), 'Company Name': company_name_match.group(1).strip(), 'Amount': amount, 'Date': date}
+
+
+def main():
+    texts = make_texts(N_TEXTS, np.random.default_rng(0))
+
+    start = time.perf_counter()
+    for text in texts[:PER_RECORD_SAMPLE]:
+        parse_per_record(text)
+    per_record = (time.perf_counter() - start) * len(texts) / PER_RECORD_SAMPLE
+
+    start = time.perf_counter()
+    parsed = parse_batch(texts)
+    batch = time.perf_counter() - start
+
+    print(f"texts:               {len(texts):,}")
+    print(f"per-record (est.):   {per_record:.2f} s  ({len(texts) / per_record:,.0f} texts/s)")
+    print(f"parse_batch:         {batch:.2f} s  ({len(texts) / batch:,.0f} texts/s)")
+    print(f"records / duplicates / incomplete: {len(parsed.records):,} / {len(parsed.duplicates):,} / {len(parsed.incomplete):,}")
+    print(parsed.records.dtypes.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import pytesseract
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_bill_specs, render_pdfs, write_photos
+from extract import extract_text_from_image
+from ocr import TESSERACT_CONFIG
+from parsing import extract_fields
+
+N_BILLS = 25
+FIELDS = ['Unique ID', 'Company Name', 'Date', 'Total']
+
+
+def full_page_ocr(path):
+    # extract_text_from_image before preprocessing: tesseract on the full-resolution photo
+    gray = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2GRAY)
+    return pytesseract.image_to_string(gray, config=TESSERACT_CONFIG)
+
+
+def score(text, spec):
+    fields = extract_fields(text)
+    expected = {'Unique ID': spec['Unique ID'], 'Company Name': spec['Company Name'], 'Date': spec['Date'], 'Total': round(spec['Total'], 2)}
+    return sum(fields[key] == expected[key] for key in FIELDS)
+
+
+def measure(extractor, photos, specs):
+    correct = 0
+    start = time.perf_counter()
+    for path, spec in zip(photos, specs):
+        correct += score(extractor(path), spec)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(photos), correct / (len(photos) * len(FIELDS))
+
+
+def main():
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("tesseract is not installed; this benchmark needs it")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        specs = make_bill_specs(N_BILLS)
+        photos = write_photos(render_pdfs(specs, workdir), workdir)
+        height, width = cv2.imread(photos[0], cv2.IMREAD_GRAYSCALE).shape
+        print(f"{N_BILLS} synthetic bill photos, {width}x{height} ({width * height / 1e6:.1f} MP)")
+
+        print(f"{'pipeline':<28} {'s/image':>8} {'field accuracy':>15}")
+        for name, extractor in [('full-page OCR (before)', full_page_ocr), ('preprocessed ROI OCR', extract_text_from_image)]:
+            latency, accuracy = measure(extractor, photos, specs)
+            print(f"{name:<28} {latency:>8.2f} {accuracy:>15.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reconcile import LedgerIndex, reconcile
+
+LEDGER_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+BATCH_SIZE = 500
+NAIVE_LIMIT = 10_000  # the old nested iterrows loop is too slow to run beyond this
+
+
+def make_ledger(n, rng):
+    companies = np.array([f"Company {i} Pvt Ltd" for i in range(max(n // 20, 1))])
+    return pd.DataFrame({
+        'Unique ID': [f"{i:010X}" for i in range(n)],
+        'Company Name': companies[rng.integers(0, len(companies), n)],
+        'Amount': rng.integers(100, 10_000_000, n) / 100,
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+    })
+
+
+def make_batch(ledger, rng):
+    # Half the vouchers are real bills, the rest have amounts that match nothing
+    sample = ledger.sample(BATCH_SIZE, random_state=int(rng.integers(1 << 31))).reset_index(drop=True)
+    sample.loc[BATCH_SIZE // 2:, 'Amount'] += 0.01
+    sample['Amount'] = sample['Amount'].map(lambda a: f"₹{a:,.2f}")
+    return sample
+
+
+def naive(parsed_df, billing_records):
+    # The loop app.py used before reconcile.py
+    matches = 0
+    for _, row in parsed_df.iterrows():
+        amount = row['Amount'].replace('₹', '').replace(',', '').strip()
+        billing_records['Cleaned Amount'] = billing_records['Amount'].astype(str).str.replace('₹', '').str.replace(',', '').str.strip()
+        for _, billing_row in billing_records.iterrows():
+            if billing_row['Company Name'] == row['Company Name'] and float(billing_row['Cleaned Amount']) == float(amount):
+                matches += 1
+                break
+    return matches
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'ledger rows':>12} {'index (s)':>10} {'reconcile (s)':>14} {'matched':>8} {'naive (s)':>10}")
+    for n in LEDGER_SIZES:
+        ledger = make_ledger(n, rng)
+        batch = make_batch(ledger, rng)
+
+        start = time.perf_counter()
+        index = LedgerIndex(ledger)
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = reconcile(batch, index)
+        reconcile_time = time.perf_counter() - start
+
+        naive_time = '-'
+        if n <= NAIVE_LIMIT:
+            start = time.perf_counter()
+            naive(batch.head(20), ledger.copy())
+            # Extrapolate the 20-row sample to the whole batch
+            naive_time = f"{(time.perf_counter() - start) * BATCH_SIZE / 20:.1f}"
+
+        print(f"{n:>12,} {index_time:>10.3f} {reconcile_time:>14.3f} {len(result.matched):>8} {naive_time:>10}")
+
+
+if __name__ == "__main__":
+    main()
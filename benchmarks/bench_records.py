@@ -0,0 +1,103 @@
+"""Memory and speed of the typed record schema against the old representation.
+
+The old one is what parse_financial_data produced: a dict per bill with the
+amount as a locale-formatted string ("₹1,23,456.00"), held in object-dtype
+columns and cleaned back to a number for every comparison. The typed one is
+records.RECORD_DTYPES: int64 paise, datetime64 dates and categorical names.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parsing import make_texts, parse_per_record
+from parsing import parse_batch
+from reconcile import LedgerIndex, reconcile
+from records import RECORD_DTYPES
+
+N_RECORDS = 1_000_000
+N_TEXTS = 100_000
+N_COMPANIES = 5_000
+
+
+def make_columns(n, rng):
+    companies = np.array([f"Company {i} Pvt Ltd" for i in range(N_COMPANIES)], dtype=object)
+    return {
+        'Unique ID': [f"{i:010X}" for i in range(n)],
+        'Company Name': companies[rng.integers(0, N_COMPANIES, n)],
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n), unit='D'),
+        'Amount (paise)': rng.integers(100, 10_000_000, n),
+    }
+
+
+def as_dicts(columns):
+    return [
+        {'Unique ID': unique_id, 'Company Name': company, 'Amount': f"₹{paise / 100:,.2f}", 'Date': date}
+        for unique_id, company, paise, date in zip(
+            columns['Unique ID'], columns['Company Name'], columns['Amount (paise)'].tolist(), columns['Date'])
+    ]
+
+
+def dicts_bytes(columns):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    dicts = as_dicts(columns)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return dicts, size
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+def compare_per_row(dicts, ledger_keys):
+    # The old comparison: strip and convert the amount string for every row
+    found = 0
+    for record in dicts:
+        amount = float(record['Amount'].replace('₹', '').replace(',', ''))
+        found += (record['Company Name'], amount) in ledger_keys
+    return found
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:<46} {time.perf_counter() - start:7.2f} s")
+    return result
+
+
+def main():
+    rng = np.random.default_rng(0)
+    columns = make_columns(N_RECORDS, rng)
+    typed = pd.DataFrame(columns).astype(RECORD_DTYPES)
+    dicts, dict_size = dicts_bytes(columns)
+    objects = pd.DataFrame(dicts, dtype=object)
+
+    print(f"memory per {N_RECORDS:,} records")
+    print(f"{'list of dicts, formatted amounts':<46} {dict_size / 2**20:7.0f} MiB")
+    print(f"{'object-dtype frame, formatted amounts':<46} {frame_bytes(objects) / 2**20:7.0f} MiB")
+    print(f"{'typed frame (RECORD_DTYPES)':<46} {frame_bytes(typed) / 2**20:7.0f} MiB")
+    print(typed.dtypes.to_string())
+
+    texts = make_texts(N_TEXTS, rng)
+    print(f"\nparse {len(texts):,} texts")
+    timed("per record, formatted amounts", lambda: [parse_per_record(text) for text in texts])
+    timed("parse_batch, typed", parse_batch, texts)
+
+    print(f"\ncompare {N_RECORDS:,} records against a ledger of the same bills")
+    ledger_keys = {(record['Company Name'], paise / 100) for record, paise in zip(dicts, columns['Amount (paise)'].tolist())}
+    timed("per row, cleaning the amount string", compare_per_row, dicts, ledger_keys)
+    index = LedgerIndex(typed)
+    timed("reconcile, object-dtype frame", reconcile, objects, index, None)
+    result = timed("reconcile, typed frame", reconcile, typed, index, None)
+    print(f"matched / ambiguous: {len(result.matched):,} / {len(result.ambiguous):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import COMPANIES
+from report import aggregate_file, generate_audit_report, generate_audit_report_from_file
+
+SIZES = [100_000, 1_000_000, 4_000_000]
+PDF_SIZES = [1_000, 10_000, 50_000]  # Appendix A rows; 50k is the appendix cap
+
+
+def write_ledger(path, n, seed=0):
+    # Written in slices so the benchmark itself never holds the whole file
+    rng = np.random.default_rng(seed)
+    first = True
+    for start in range(0, n, 500_000):
+        rows = min(500_000, n - start)
+        pd.DataFrame({
+            'Unique ID': [f"{i:010X}" for i in range(start, start + rows)],
+            'Company Name': np.asarray(COMPANIES)[rng.integers(len(COMPANIES), size=rows)],
+            'Date': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')).strftime('%Y-%m-%d'),
+            'Amount': rng.integers(100, 10_000_000, rows) / 100,
+        }).to_csv(path, mode='w' if first else 'a', header=first, index=False)
+        first = False
+
+
+def full_load(path):
+    # report.py before streaming: the whole file in one DataFrame, shape and nulls only
+    return generate_audit_report(pd.read_csv(path))
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    print(f"{'rows':>10} {'MB':>7} {'full load s':>12} {'peak MiB':>9} {'streaming s':>12} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in SIZES:
+            path = os.path.join(workdir, f"ledger_{n}.csv")
+            write_ledger(path, n)
+            size = os.path.getsize(path) / 2**20
+            load_time, load_peak = measure(full_load, path)
+            stream_time, stream_peak = measure(aggregate_file, path)
+            print(f"{n:>10} {size:>7.0f} {load_time:>12.2f} {load_peak:>9.0f} {stream_time:>12.2f} {stream_peak:>9.0f}")
+            os.remove(path)
+
+        # PDF rendering: pages are laid out as the transactions stream in, so memory should not follow row count
+        print(f"\n{'appendix rows':>13} {'pages':>6} {'render s':>9} {'peak MiB':>9} {'PDF MiB':>8}")
+        for n in PDF_SIZES:
+            path = os.path.join(workdir, f"ledger_{n}.csv")
+            write_ledger(path, n)
+            pdfs = []
+            elapsed, peak = measure(lambda p: pdfs.append(generate_audit_report_from_file(p)), path)
+            data = pdfs[0].getvalue()
+            print(f"{n:>13} {data.count(b'/Type /Page') - data.count(b'/Type /Pages'):>6} {elapsed:>9.2f} {peak:>9.1f} {len(data) / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Rerun latency of app.py, driven headlessly with Streamlit's AppTest.
+
+Each interaction is timed twice: with session state and st.cache_* carrying
+results across reruns, and with both wiped before every rerun, which is what
+each rerun cost when app.py kept its state in script-level variables. The
+on-disk extraction cache stays warm in both, so neither column includes OCR.
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='audity-rerun-')
+# app.py and cache.py read these at import time
+os.environ['AUDITY_LEDGER'] = os.path.join(WORKDIR, 'billing_records.db')
+os.environ['AUDITY_CACHE'] = os.path.join(WORKDIR, 'extraction.sqlite')
+os.environ['AUDITY_REPORT_SOURCE'] = os.path.join(WORKDIR, 'balance_sheet.csv')
+
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from corpus import make_bill_specs
+from bilgen.bills import generate_bills
+from ledger import Ledger
+
+N_BILLS = 40
+N_LEDGER_ROWS = 200_000  # filler rows so loading and indexing the ledger costs what it does in use
+TIMEOUT = 300
+# Session state app.py owns; widget state is left alone
+APP_STATE = ('documents', 'extraction_errors', 'parsed', 'parsed_key', 'results', 'missing_unique_id', 'unmatched')
+
+
+def make_fixtures():
+    specs = make_bill_specs(N_BILLS + 1)
+    with Ledger(os.environ['AUDITY_LEDGER']) as ledger:
+        ledger.append({
+            'Unique ID': f"F{i:09X}", 'Date': '2023-06-01', 'serial_number': f"SN{i}", 'Amount': 100 + i % 50_000,
+            'pan_number': "ABCDE1234F", 'Company Name': f"Filler Company {i % 5000}", 'PDF Hash': None,
+        } for i in range(N_LEDGER_ROWS))
+        records = generate_bills(specs, os.path.join(WORKDIR, 'bills'), ledger)
+    pd.DataFrame([record.to_dict() for record in records]).to_csv(os.environ['AUDITY_REPORT_SOURCE'], index=False)
+    uploads = []
+    for record in records:
+        with open(record.pdf_file, 'rb') as f:
+            uploads.append((os.path.basename(record.pdf_file), f.read(), 'application/pdf'))
+    return uploads[:N_BILLS], uploads[N_BILLS:]
+
+
+def click(app, label):
+    next(button for button in app.button if button.label == label).click()
+
+
+def upload(app, files):
+    app.file_uploader[1].set_value(files)
+
+
+def timed_run(app):
+    start = time.perf_counter()
+    app.run(timeout=TIMEOUT)
+    elapsed = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return elapsed
+
+
+def run_session(steps, keep_state=True):
+    """Time each step's rerun in one AppTest session.
+
+    With ``keep_state=False`` the app's own session state and the st.cache_*
+    stores are wiped before every timed rerun; widget values (uploads, clicks)
+    are kept, so the rerun redoes everything from scratch as app.py used to.
+    """
+    app = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=TIMEOUT)
+    timed_run(app)
+    timings = []
+    for _, step in steps:
+        step(app)
+        if not keep_state:
+            for key in APP_STATE:
+                if key in app.session_state:
+                    del app.session_state[key]
+            st.cache_data.clear()
+            st.cache_resource.clear()
+        timings.append(timed_run(app))
+    return timings
+
+
+def main():
+    uploads, extra = make_fixtures()
+    steps = [
+        (f"upload {N_BILLS} bills", lambda app: upload(app, uploads)),
+        ("rerun, nothing changed", lambda app: None),
+        ("click Parse Financial Data", lambda app: click(app, "Parse Financial Data")),
+        ("click Parse again", lambda app: click(app, "Parse Financial Data")),
+        ("click Generate", lambda app: click(app, "Generate")),
+        ("click Generate again", lambda app: click(app, "Generate")),
+        ("add one more bill", lambda app: upload(app, uploads + extra)),
+        ("click Clear Data", lambda app: click(app, "Clear Data")),
+    ]
+
+    # Warm the on-disk extraction cache so neither column pays for first-time extraction
+    run_session([("warm up", lambda app: upload(app, uploads + extra))])
+
+    fresh = run_session(steps, keep_state=False)
+    kept = run_session(steps)
+    print(f"{N_BILLS} uploaded bills, {N_LEDGER_ROWS + N_BILLS + 1:,} ledger rows")
+    print(f"{'interaction':<30} {'no state kept s':>16} {'session state s':>16}")
+    for (name, _), before, after in zip(steps, fresh, kept):
+        print(f"{name:<30} {before:>16.3f} {after:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each scenario runs in a fresh interpreter and reports its own wall time and peak RSS
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+try:
+{body}
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'error': error,
+}}))
+"""
+
+SCENARIOS = {
+    # What every app.py rerun paid before: import easyocr and build a Reader at module level
+    'before: easyocr.Reader at startup': """
+    import pdfplumber, pytesseract, cv2, pandas
+    import easyocr
+    reader = easyocr.Reader(['en'])
+""",
+    # What app.py imports now; no OCR engine is created until an image is extracted
+    'after: lazy engine registry': """
+    import pandas
+    import extract, ocr
+""",
+    'after: first tesseract use': """
+    import pandas
+    import extract, ocr
+    ocr.get_engine('tesseract')
+""",
+    'after: first easyocr use': """
+    import pandas
+    import extract, ocr
+    ocr.get_engine('easyocr')
+""",
+}
+
+
+def run(body):
+    code = PROBE.format(root=ROOT, body=body.rstrip())
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    print(f"{'scenario':<36} {'seconds':>8} {'peak RSS (MB)':>14}")
+    for name, body in SCENARIOS.items():
+        result = run(body)
+        if result['error']:
+            print(f"{name:<36} {'skipped':>8}   ({result['error']})")
+        else:
+            print(f"{name:<36} {result['seconds']:>8.2f} {result['max_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
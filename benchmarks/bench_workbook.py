@@ -0,0 +1,80 @@
+"""Loading and aggregating a multi-sheet balance-sheet workbook.
+
+Compares the old load (``pd.read_excel(sheet_name=None)`` with openpyxl)
+against workbook.py: calamine, reading only the report's columns, and the
+Parquet cache before and after the sheets are converted. The workbook is
+above workbook.PARALLEL_MIN_BYTES, so aggregate_file runs the per-sheet
+statistics in a process pool, which only pays off with more than one CPU.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import workbook
+from corpus import COMPANIES
+from report import REPORT_COLUMNS, aggregate_file, generate_audit_report
+from workbook import read_workbook
+
+SHEETS = 8
+ROWS = 25_000
+FILLER_COLUMNS = 6  # ledger columns the report never reads
+
+
+def write_workbook(path, seed=0):
+    rng = np.random.default_rng(seed)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet in range(SHEETS):
+            frame = pd.DataFrame({
+                'Date': (pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, ROWS), unit='D')).strftime('%Y-%m-%d'),
+                'Company Name': np.asarray(COMPANIES)[rng.integers(len(COMPANIES), size=ROWS)],
+                'Amount': rng.integers(100, 10_000_000, ROWS) / 100,
+            })
+            for column in range(FILLER_COLUMNS):
+                frame[f"Note {column}"] = [f"ref-{value}" for value in rng.integers(0, 1_000_000, ROWS)]
+            frame.to_excel(writer, sheet_name=f"Branch {sheet + 1}", index=False)
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label:<44} {time.perf_counter() - start:7.2f} s")
+    return result
+
+
+def aggregate_openpyxl(path):
+    engine = workbook.ENGINE
+    workbook.ENGINE = 'openpyxl'
+    try:
+        return aggregate_file(path)
+    finally:
+        workbook.ENGINE = engine
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix='audity-workbook-') as workdir:
+        path = os.path.join(workdir, 'balance_sheet.xlsx')
+        write_workbook(path)
+        print(f"{SHEETS} sheets x {ROWS:,} rows x {3 + FILLER_COLUMNS} columns, "
+              f"{os.path.getsize(path) / 2**20:.0f} MB, {os.cpu_count()} CPU(s), default engine {workbook.ENGINE}")
+
+        timed("read_excel(sheet_name=None), openpyxl", lambda: generate_audit_report(pd.read_excel(path, sheet_name=None, engine='openpyxl')))
+        if workbook.ENGINE == 'calamine':
+            timed("read_workbook, calamine", read_workbook, path)
+            timed("read_workbook, calamine, report columns", read_workbook, path, REPORT_COLUMNS)
+        cache = os.path.join(workdir, 'cache')
+        timed("read_workbook, converting to Parquet", read_workbook, path, cache_dir=cache)
+        timed("read_workbook, from Parquet, report columns", read_workbook, path, REPORT_COLUMNS, cache_dir=cache)
+
+        expected = timed("aggregate_file, openpyxl", aggregate_openpyxl, path)
+        result = timed(f"aggregate_file, {workbook.ENGINE}", aggregate_file, path)
+        assert result[1]['total_amount'] == expected[1]['total_amount'] and result[0] == expected[0]
+
+
+if __name__ == "__main__":
+    main()
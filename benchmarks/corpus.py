@@ -0,0 +1,120 @@
+"""Synthetic bills for the benchmarks, rendered with bilgen's create_pdf."""
+import os
+import sys
+from collections import namedtuple
+from datetime import date, timedelta
+
+import cv2
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bilgen.bills import create_pdf, generate_pdf_hash, generate_unique_id
+
+# A generated corpus: the bill specs, their PDFs, clean and photographed renders
+# of the first few, and billing_records.csv for all of them
+Corpus = namedtuple('Corpus', ['specs', 'pdfs', 'scans', 'photos', 'ledger_csv'])
+
+COMPANIES = [
+    "ABC Enterprises", "ABC Corporation", "ABC Pvt Ltd", "Sharma Traders",
+    "Kaveri Textiles Pvt Ltd", "Deccan Logistics", "State Electricity Board", "Nilgiri Foods",
+]
+
+
+def make_bill_specs(n, seed=0):
+    """Bill dicts in the shape bilgen's create_pdf takes."""
+    rng = np.random.default_rng(seed)
+    specs = []
+    for i in range(n):
+        products = [
+            {'name': f"Item {j + 1}", 'price': float(rng.integers(100, 500_000)) / 100}
+            for j in range(rng.integers(1, 6))
+        ]
+        specs.append({
+            'Unique ID': generate_unique_id(),
+            'Company Name': COMPANIES[rng.integers(len(COMPANIES))],
+            'Date': (date(2024, 1, 1) + timedelta(days=int(rng.integers(365)))).isoformat(),
+            'serial_number': f"SN{1_700_000_000 + i}",
+            'products': products,
+            'Total': round(sum(product['price'] for product in products), 2),
+            'pan_number': "ABCDE1234F",
+        })
+    return specs
+
+
+def render_pdfs(specs, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    return [create_pdf(spec, output_dir) for spec in specs]
+
+
+def rasterize(pdf_path, dpi=400):
+    """Render the first page of a PDF to a grayscale array (400 DPI A4 is about a 12 MP photo)."""
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        image = pdf[0].render(scale=dpi / 72, grayscale=True).to_numpy()
+    finally:
+        pdf.close()
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def photograph(gray, rng, max_angle=3.0, noise=12.0):
+    """Make a clean render look like a phone shot: tilt, uneven light and sensor noise."""
+    h, w = gray.shape
+    angle = rng.uniform(-max_angle, max_angle)
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    tilted = cv2.warpAffine(gray, matrix, (w, h), borderValue=235)
+    # Light falls off towards one corner
+    shade = np.linspace(1.0, 0.75, w)[None, :] * np.linspace(1.0, 0.85, h)[:, None]
+    noisy = tilted * shade + rng.normal(0, noise, gray.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def write_scans(pdf_paths, output_dir, dpi=200):
+    """Rasterize each PDF to a clean PNG: the bill as an image, with no text layer."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for pdf_path in pdf_paths:
+        path = os.path.join(output_dir, os.path.basename(pdf_path).replace('.pdf', '.png'))
+        cv2.imwrite(path, rasterize(pdf_path, dpi))
+        paths.append(path)
+    return paths
+
+
+def write_photos(pdf_paths, output_dir, dpi=400, seed=0):
+    """Rasterize each PDF, photograph it and save it as a JPEG next to the PDFs."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for pdf_path in pdf_paths:
+        image = photograph(rasterize(pdf_path, dpi), rng)
+        path = os.path.join(output_dir, os.path.basename(pdf_path).replace('.pdf', '.jpg'))
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        paths.append(path)
+    return paths
+
+
+def write_ledger_csv(specs, pdf_paths, path):
+    """billing_records.csv for the bills, as bilgen records them, with each PDF's hash."""
+    pd.DataFrame({
+        'Unique ID': [spec['Unique ID'] for spec in specs],
+        'Date': [spec['Date'] for spec in specs],
+        'serial_number': [spec['serial_number'] for spec in specs],
+        'Amount': [spec['Total'] for spec in specs],
+        'pan_number': [spec['pan_number'] for spec in specs],
+        'Company Name': [spec['Company Name'] for spec in specs],
+        'PDF Hash': [generate_pdf_hash(pdf_path) for pdf_path in pdf_paths],
+    }).to_csv(path, index=False)
+    return path
+
+
+def make_corpus(n, output_dir, images=10, dpi=200, seed=0):
+    """Generate n bills under ``output_dir``: pdfs/, scans/ and photos/ (the first ``images`` bills) and billing_records.csv."""
+    specs = make_bill_specs(n, seed)
+    pdfs = render_pdfs(specs, os.path.join(output_dir, 'pdfs'))
+    scans = write_scans(pdfs[:images], os.path.join(output_dir, 'scans'), dpi)
+    photos = write_photos(pdfs[:images], os.path.join(output_dir, 'photos'), dpi, seed)
+    ledger_csv = write_ledger_csv(specs, pdfs, os.path.join(output_dir, 'billing_records.csv'))
+    return Corpus(specs, pdfs, scans, photos, ledger_csv)
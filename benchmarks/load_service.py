@@ -0,0 +1,116 @@
+"""Load test for service.py: several auditors uploading bills at once.
+
+One heavy user uploads HEAVY_BILLS bills and, a moment later, LIGHT_USERS
+users upload LIGHT_BILLS each. The run is repeated with every client posing
+as the same user, which is plain first-come-first-served order, to show what
+per-user round-robin buys the light users. The heavy user's share of the
+queue is capped, so it also runs into 429 backpressure.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus import make_bill_specs, render_pdfs
+from document import Document
+from service import ServiceClient
+
+PORT = 8799
+WORKERS = 2
+MAX_QUEUED = 64
+MAX_QUEUED_PER_USER = 16  # leaves room in the queue for the other users
+HEAVY_BILLS = 120
+LIGHT_USERS = 3
+LIGHT_BILLS = 5
+LIGHT_DELAY = 0.5  # seconds after the heavy user starts
+
+
+def start_service():
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'service.py'), '--port', str(PORT), '--workers', str(WORKERS),
+         '--max-queued', str(MAX_QUEUED), '--max-queued-per-user', str(MAX_QUEUED_PER_USER), '--no-cache'],
+        cwd=ROOT,
+    )
+    client = ServiceClient(f"http://127.0.0.1:{PORT}")
+    for _ in range(100):
+        try:
+            client.health()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("extraction service did not start")
+
+
+def stop_service(process, timeout=60):
+    # SIGTERM: the service stops serving, then shuts its worker pool down and exits
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        raise RuntimeError(f"extraction service did not shut down within {timeout}s")
+
+
+def upload(label, user, files, delay, finished):
+    time.sleep(delay)
+    client = ServiceClient(f"http://127.0.0.1:{PORT}", user=user, poll_interval=0.05)
+    start = time.perf_counter()
+    results = list(client.run(files))
+    errors = sum(result.error is not None for result in results)
+    finished[label] = (time.perf_counter() - start, errors)
+
+
+def run_round(label, heavy, light, same_user):
+    """Time every user's upload; with ``same_user`` all of them submit under one id."""
+    finished = {}
+    users = [('heavy', heavy, 0.0)] + [(f"light-{i}", light, LIGHT_DELAY) for i in range(LIGHT_USERS)]
+    threads = [
+        threading.Thread(target=upload, args=(name, 'shared' if same_user else name, files, delay, finished))
+        for name, files, delay in users
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = HEAVY_BILLS + LIGHT_USERS * LIGHT_BILLS
+    light_times = [finished[name][0] for name, _, _ in users[1:]]
+    errors = sum(errors for _, errors in finished.values())
+    print(f"{label:<22} {total / elapsed:7.1f} bills/s  heavy user {finished['heavy'][0]:6.2f} s  "
+          f"light users {min(light_times):5.2f}-{max(light_times):5.2f} s  errors {errors}")
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix='audity-load-') as workdir:
+        specs = make_bill_specs(HEAVY_BILLS + LIGHT_USERS * LIGHT_BILLS)
+        paths = render_pdfs(specs, workdir)
+        bills = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                bills.append((os.path.basename(path), Document(os.path.basename(path), f.read())))
+        heavy, light = bills[:HEAVY_BILLS], bills[HEAVY_BILLS:HEAVY_BILLS + LIGHT_BILLS]
+
+        print(f"{WORKERS} workers, queue of {MAX_QUEUED} ({MAX_QUEUED_PER_USER} per user); 1 user x {HEAVY_BILLS} bills, "
+              f"{LIGHT_USERS} users x {LIGHT_BILLS} bills {LIGHT_DELAY}s later")
+        process = start_service()
+        try:
+            # Let the workers import their extraction libraries before anything is timed
+            list(ServiceClient(f"http://127.0.0.1:{PORT}").run(light[:WORKERS] * 2))
+            run_round('per-user round-robin', heavy, light, same_user=False)
+            run_round('one queue (FIFO)', heavy, light, same_user=True)
+            print("service:", ServiceClient(f"http://127.0.0.1:{PORT}").health())
+        finally:
+            stop_service(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""End-to-end benchmark suite over synthetic bill corpora at several scales.
+
+    python benchmarks/run_all.py [--scales 100 1000 5000] [--images 10]
+
+For each scale, corpus.make_corpus renders the bills with bilgen's
+create_pdf, rasterizes the first few into clean and photographed images and
+writes billing_records.csv. Then app.py's and report.py's stages run over
+it, each timed as a METRICS stage:
+- hash: read and SHA-256 every PDF, check it against the ledger's PDF Hash
+- extract_pdfs / extract_images: extract_document over the PDFs, and over
+  the images when tesseract is installed; without it the images only go
+  through decoding and preprocess_for_ocr (ocr_preprocess).
+  extract_document's own stages are kept too: classify, extract_fast_text,
+  extract_pdf_text, extract_ocr
+- parse, ledger_load (LedgerIndex over the CSV), reconcile, anomalies
+- report_aggregate and report_render (the audit report PDF of the ledger)
+
+Results go to <out>/<timestamp>.json. The newest earlier file there (or
+--baseline) is compared stage by stage; stages more than --threshold slower
+are listed as regressions and the exit status is 1.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from anomalies import upload_anomalies
+from corpus import make_corpus
+from document import Document
+from extract import extract_document
+from metrics import METRICS, stage
+from ocr import DEFAULT_ENGINE
+from parsing import parse_batch
+from preprocess import preprocess_for_ocr
+from reconcile import LedgerIndex, reconcile
+from report import APPENDIX_ROWS, aggregate_file, generate_pdf_report
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO, 'benchmarks', 'results')
+SCALES = [100, 1_000, 5_000]
+IMAGES = 10  # bills per scale also rendered as images; OCR dominates otherwise
+THRESHOLD = 0.25  # slower than the baseline by more than this is a regression
+MIN_SECONDS = 0.05  # stages faster than this in the baseline are too noisy to compare
+
+
+def ocr_available():
+    return DEFAULT_ENGINE != 'tesseract' or shutil.which('tesseract') is not None
+
+
+def run_scale(n, workdir, images, ocr):
+    """Generate a corpus of ``n`` bills and time every stage over it; returns this scale's results."""
+    start = time.perf_counter()
+    corpus = make_corpus(n, os.path.join(workdir, str(n)), images)
+    corpus_seconds = time.perf_counter() - start
+
+    METRICS.clear()
+    ledger_hashes = pd.read_csv(corpus.ledger_csv, usecols=['Unique ID', 'PDF Hash'])
+    stored = dict(zip(ledger_hashes['Unique ID'], ledger_hashes['PDF Hash']))
+    with stage('hash', nbytes=sum(os.path.getsize(path) for path in corpus.pdfs)):
+        documents = [Document.from_path(path) for path in corpus.pdfs]
+        mismatched = sum(stored.get(spec['Unique ID']) != document.sha256 for spec, document in zip(corpus.specs, documents))
+
+    with stage('extract_pdfs', nbytes=sum(document.size for document in documents)):
+        texts = [extract_document(document)[0] for document in documents]
+    for document in documents:
+        document.close()
+    images = corpus.scans + corpus.photos
+    if ocr:
+        with stage('extract_images'):
+            for path in images:
+                extract_document(path)
+    else:
+        with stage('ocr_preprocess', nbytes=sum(os.path.getsize(path) for path in images)):
+            for path in images:
+                preprocess_for_ocr(cv2.imread(path, cv2.IMREAD_GRAYSCALE))
+
+    with stage('parse', nbytes=sum(len(text) for text in texts)):
+        parsed = parse_batch(texts)
+    with stage('ledger_load', corpus.ledger_csv, os.path.getsize(corpus.ledger_csv)):
+        billing_records = pd.read_csv(corpus.ledger_csv)
+        billing_records['Date'] = pd.to_datetime(billing_records['Date'], errors='coerce')
+        index = LedgerIndex(billing_records)
+    with stage('reconcile'):
+        result = reconcile(parsed.records, index)
+    with stage('anomalies'):
+        upload_anomalies(index.records, parsed.records)
+
+    # Both are timed by report.py itself, as report_aggregate and report_render
+    report, stats = aggregate_file(corpus.ledger_csv, transactions=APPENDIX_ROWS)
+    output = io.BytesIO()
+    generate_pdf_report(report, output, stats, stats['transactions'])
+
+    return {
+        'bills': n,
+        'images': len(images),
+        'corpus_seconds': round(corpus_seconds, 3),
+        'stages': METRICS.summary(),
+        # What the pipeline got right, so a faster but broken run does not pass as an improvement
+        'checks': {
+            'hash_mismatches': int(mismatched),
+            'parsed': len(parsed.records),
+            'matched': len(result.matched),
+            'report_bytes': output.getbuffer().nbytes,
+        },
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'ocr': ocr_available(),
+    }
+
+
+def latest_result(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+    return paths[-1] if paths else None
+
+
+def compare(current, baseline, threshold=THRESHOLD, min_seconds=MIN_SECONDS):
+    """Print every stage against the baseline; returns the (scale, stage, ratio) regressions."""
+    regressions = []
+    print(f"\n{'bills':>6}  {'stage':<18} {'calls':>6} {'wall s':>9} {'ms/call':>9} {'vs baseline':>12}")
+    for scale, result in current['scales'].items():
+        before = (baseline or {}).get('scales', {}).get(scale, {}).get('stages', {})
+        for name, totals in sorted(result['stages'].items()):
+            wall = totals['wall_seconds']
+            change = ''
+            old = before.get(name)
+            if old is not None and old['wall_seconds'] >= min_seconds:
+                ratio = wall / old['wall_seconds']
+                change = f"{ratio - 1:+.0%}"
+                if ratio > 1 + threshold:
+                    regressions.append((scale, name, ratio))
+                    change += ' !'
+            print(f"{scale:>6}  {name:<18} {totals['calls']:>6} {wall:>9.3f} {wall / totals['calls'] * 1000:>9.2f} {change:>12}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help="bills per corpus (default: %(default)s)")
+    parser.add_argument('--images', type=int, default=IMAGES, help="bills per scale also rendered as images (default: %(default)s)")
+    parser.add_argument('--out', default=RESULTS_DIR, help="directory for result files (default: benchmarks/results)")
+    parser.add_argument('--baseline', help="result file to compare with (default: the newest one in --out)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown counted as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    baseline_path = args.baseline or latest_result(args.out)
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    current = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), **environment(), 'scales': {}}
+    if not current['ocr']:
+        print("tesseract not found: images are preprocessed but not OCR'd", file=sys.stderr)
+    with tempfile.TemporaryDirectory(prefix='audity-bench-') as workdir:
+        for n in args.scales:
+            print(f"{n} bills...", file=sys.stderr)
+            current['scales'][str(n)] = run_scale(n, workdir, min(args.images, n), current['ocr'])
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{time.strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+
+    if baseline is not None and baseline.get('cpus') != current['cpus']:
+        print(f"note: baseline ran on {baseline.get('cpus')} CPUs, this run on {current['cpus']}", file=sys.stderr)
+    regressions = compare(current, baseline, args.threshold)
+    for scale, result in current['scales'].items():
+        print(f"{scale:>6} bills: corpus {result['corpus_seconds']:.1f} s, checks {result['checks']}")
+    print(f"\nresults: {path}" + (f"\nbaseline: {baseline_path}" if baseline_path else ''))
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}:")
+        for scale, name, ratio in regressions:
+            print(f"  {scale} bills, {name}: {ratio:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,27 @@
 import streamlit as st
-import pandas as pd
-import uuid
-from fpdf import FPDF
 from datetime import datetime
-import re
 import os
-import hashlib  # Import hashlib for generating hash codes
+import sys
+
+# The ledger module is shared with Audity and lives one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ledger import LedgerWriter
+from records import BillRecord
+from bilgen.bills import bill_archive_path, bill_file_name, generate_unique_id, hash_pdf_bytes, render_pdf_bytes, validate_pan, write_pdf
+
+LEDGER_PATH = 'billing_records.db'
+LEGACY_LEDGER_CSV = 'billing_records.csv'  # imported into the ledger on first use
+BILLS_DIR = 'bills'  # generated PDFs, sharded by month and ID prefix
 
 st.set_page_config(
     page_title="Bilgen",
     page_icon="logo.png"
 )
 
-# Function to generate a unique alphanumeric ID
-def generate_unique_id():
-    return str(uuid.uuid4()).replace("-", "").upper()[:10]
-
-# Function to create a PDF bill
-def create_pdf(bill_data):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Set font
-    pdf.set_font("Arial", size=12)
-    
-    # Add unique ID
-    pdf.cell(200, 10, txt=f"Unique ID: {bill_data['Unique ID']}", ln=True, align='L')
-    
-    # Add company name
-    pdf.cell(200, 10, txt=f"Company Name: {bill_data['Company Name']}", ln=True, align='L')
-    
-    # Add date
-    pdf.cell(200, 10, txt=f"Date: {bill_data['Date']}", ln=True, align='L')
-    
-    # Add serial number
-    pdf.cell(200, 10, txt=f"Serial Number: {bill_data['serial_number']}", ln=True, align='L')
-    
-    # Add products/services
-    pdf.cell(200, 10, txt="Products/Services:", ln=True, align='L')
-    for product in bill_data['products']:
-        pdf.cell(200, 10, txt=f"{product['name']} - {product['price']:.2f}", ln=True, align='L')
-    
-    # Add Amount
-    pdf.cell(200, 10, txt=f"Total: {bill_data['Total']:.2f}", ln=True, align='L')
-    
-    # Save the PDF
-    pdf_file_name = f"bill_{bill_data['Unique ID']}.pdf"
-    pdf.output(pdf_file_name)
-    
-    return pdf_file_name
-
-# Function to generate hash for the PDF file
-def generate_pdf_hash(pdf_file_name):
-    hasher = hashlib.sha256()  # Using SHA-256 for hashing
-    with open(pdf_file_name, "rb") as pdf_file:
-        # Read the file in chunks to avoid memory issues with large files
-        for chunk in iter(lambda: pdf_file.read(4096), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
-
-# Function to validate PAN number
-def validate_pan(pan):
-    pan_pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]$'
-    return re.match(pan_pattern, pan) is not None
+@st.cache_resource
+def get_ledger_writer():
+    # One writer for every session, so bills generated at the same moment are group-committed
+    return LedgerWriter(LEDGER_PATH, migrate_from=LEGACY_LEDGER_CSV)
 
 # Streamlit app
 def main():
@@ -114,41 +73,30 @@ def main():
                 'Company Name': company_name
             }
             
-            # Create PDF
-            pdf_file_name = create_pdf(bill_data)
+            # Create PDF in memory and save it
+            pdf_bytes = render_pdf_bytes(bill_data)
+            write_pdf(bill_archive_path(bill_data, BILLS_DIR), pdf_bytes)
             st.success("Bill generated successfully!")
             
-            # Generate hash for the PDF  SHA-256
-            pdf_hash = generate_pdf_hash(pdf_file_name)
+            # Generate hash for the PDF  SHA-256, from the bytes we just wrote
+            pdf_hash = hash_pdf_bytes(pdf_bytes)
             st.write(f"PDF Hash: {pdf_hash}")  # Display the hash on the app
             
-            # Read the PDF file to provide a download option
-            if os.path.exists(pdf_file_name):
-                with open(pdf_file_name, "rb") as pdf_file:
-                    st.download_button(
-                        label="Download Bill",
-                        data=pdf_file,
-                        file_name=pdf_file_name,
-                        mime="application/pdf"
-                    )
-            else:
-                st.error("Error: PDF file not found.")
+            # Provide a download option straight from memory
+            st.download_button(
+                label="Download Bill",
+                data=pdf_bytes,
+                file_name=bill_file_name(bill_data),
+                mime="application/pdf"
+            )
             
-            # Save record to CSV with utf-8 encoding
-            df = pd.DataFrame([{
-                'Unique ID': unique_id,
-                'Date': date,
-                'serial_number': serial_number,
-                'Amount': Amount,
-                'pan_number': pan_number,
-                'Company Name': company_name,
-                'PDF Hash': pdf_hash  # Include PDF hash in CSV
-            }])
+            # Save record to the billing ledger
+            record = BillRecord.from_bill(bill_data, pdf_hash=pdf_hash)
             try:
-                df.to_csv('billing_records.csv', mode='a', header=not pd.io.common.file_exists('billing_records.csv'), index=False, encoding='utf-8')
-                st.success("Record saved to billing_records.csv")
+                get_ledger_writer().append([record])
+                st.success(f"Record saved to {LEDGER_PATH}")
             except Exception as e:
-                st.error(f"Error saving to CSV: {e}")
+                st.error(f"Error saving to ledger: {e}")
         else:
             st.error("Please fill in all fields correctly. Ensure PAN number is in the correct format (ABCDE1234F), company name is provided, and at least one product is added.")
 
@@ -0,0 +1,145 @@
+# Bill rendering and hashing, kept free of Streamlit so batch jobs and
+# benchmarks can import them
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from fpdf import FPDF
+import re
+import os
+import threading
+import hashlib  # Import hashlib for generating hash codes
+
+from document import Document
+from records import BillRecord
+
+# Function to generate a unique alphanumeric ID
+def generate_unique_id():
+    return str(uuid.uuid4()).replace("-", "").upper()[:10]
+
+# Function to lay out a PDF bill
+def build_pdf(bill_data):
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Set font
+    pdf.set_font("Arial", size=12)
+    
+    # Add unique ID
+    pdf.cell(200, 10, txt=f"Unique ID: {bill_data['Unique ID']}", ln=True, align='L')
+    
+    # Add company name
+    pdf.cell(200, 10, txt=f"Company Name: {bill_data['Company Name']}", ln=True, align='L')
+    
+    # Add date
+    pdf.cell(200, 10, txt=f"Date: {bill_data['Date']}", ln=True, align='L')
+    
+    # Add serial number
+    pdf.cell(200, 10, txt=f"Serial Number: {bill_data['serial_number']}", ln=True, align='L')
+    
+    # Add products/services
+    pdf.cell(200, 10, txt="Products/Services:", ln=True, align='L')
+    for product in bill_data['products']:
+        pdf.cell(200, 10, txt=f"{product['name']} - {product['price']:.2f}", ln=True, align='L')
+    
+    # Add Amount
+    pdf.cell(200, 10, txt=f"Total: {bill_data['Total']:.2f}", ln=True, align='L')
+    
+    return pdf
+
+# Function to render a PDF bill to bytes without touching the disk
+def render_pdf_bytes(bill_data):
+    output = build_pdf(bill_data).output(dest='S')
+    # PyFPDF returns a latin-1 str, fpdf2 returns a bytearray
+    return output.encode('latin-1') if isinstance(output, str) else bytes(output)
+
+# Function to create a PDF bill
+def create_pdf(bill_data, output_dir=None):
+    # Save the PDF
+    pdf_file_name = bill_file_name(bill_data, output_dir)
+    write_pdf(pdf_file_name, render_pdf_bytes(bill_data))
+    
+    return pdf_file_name
+
+def bill_file_name(bill_data, output_dir=None):
+    pdf_file_name = f"bill_{bill_data['Unique ID']}.pdf"
+    if output_dir is not None:
+        pdf_file_name = os.path.join(output_dir, pdf_file_name)
+    return pdf_file_name
+
+# Function to place a bill in the archive: <root>/<YYYY-MM>/<first two ID characters>/bill_<ID>.pdf,
+# so no directory grows past a month's bills split 256 ways (IDs are hex)
+def bill_archive_path(bill_data, root):
+    shard = os.path.join(root, str(bill_data['Date'])[:7], bill_data['Unique ID'][:2])
+    return bill_file_name(bill_data, shard)
+
+# Function to write a PDF so readers never see it half-written: to a temporary
+# name in the same directory first, then renamed over the final one
+def write_pdf(pdf_file_name, pdf_bytes):
+    directory = os.path.dirname(pdf_file_name)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_name = f"{pdf_file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_name, "wb") as pdf_file:
+            pdf_file.write(pdf_bytes)
+        os.replace(temp_name, pdf_file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+# Function to hash PDF bytes that are already in memory
+def hash_pdf_bytes(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+# Function to generate hash for the PDF file, hashed in the same pass that reads it
+def generate_pdf_hash(pdf_file_name):
+    with Document.from_path(pdf_file_name) as document:
+        return document.sha256
+
+# Function to validate PAN number
+def validate_pan(pan):
+    pan_pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]$'
+    return re.match(pan_pattern, pan) is not None
+
+
+# Function to fill in the fields a batch spec may leave out
+def complete_bill_spec(spec, sequence=0):
+    bill_data = dict(spec)
+    bill_data.setdefault('Unique ID', generate_unique_id())
+    bill_data.setdefault('Date', datetime.now().strftime("%Y-%m-%d"))
+    # The sequence keeps serial numbers distinct within a batch generated in the same second
+    bill_data.setdefault('serial_number', f"SN{int(datetime.now().timestamp())}-{sequence}")
+    bill_data.setdefault('Total', sum(product['price'] for product in bill_data['products']))
+    return bill_data
+
+# Function run in the worker processes: render, hash and save one bill
+def _render_bill(bill_data, output_dir):
+    pdf_bytes = render_pdf_bytes(bill_data)
+    pdf_file_name = bill_archive_path(bill_data, output_dir)
+    write_pdf(pdf_file_name, pdf_bytes)
+    return pdf_file_name, hash_pdf_bytes(pdf_bytes)
+
+# Function to generate many bills at once
+def generate_bills(specs, output_dir=".", ledger=None, workers=None, chunksize=32):
+    """Render a batch of bills in a process pool and record them in one transaction.
+
+    Each spec needs 'Company Name', 'pan_number' and 'products'; Unique ID,
+    Date, serial_number and Total are filled in when missing. PDFs go to
+    bill_archive_path under ``output_dir``, and each is hashed from the bytes
+    it was rendered to, not re-read from disk. When a ledger (a Ledger or
+    LedgerWriter) is given, all rows are appended in a single transaction. Returns
+    the records.BillRecord of each bill, with its ``pdf_file``.
+    """
+    bills = [complete_bill_spec(spec, sequence) for sequence, spec in enumerate(specs)]
+    os.makedirs(output_dir, exist_ok=True)
+
+    # spawn rather than fork: the caller may hold threads and an open ledger connection
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        rendered = list(pool.map(_render_bill, bills, [output_dir] * len(bills), chunksize=chunksize))
+
+    records = [BillRecord.from_bill(bill_data, pdf_hash, pdf_file_name) for bill_data, (pdf_file_name, pdf_hash) in zip(bills, rendered)]
+    if ledger is not None:
+        ledger.append(records)
+    return records
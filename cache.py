@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from extract import extractor_key
+from parsing import PARSER_VERSION
+
+DEFAULT_CACHE_PATH = os.environ.get('AUDITY_CACHE', os.path.expanduser('~/.cache/audity/extraction.sqlite'))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def cache_version():
+    """Version key for cached entries: changes whenever the extractor, its config or the parser does."""
+    key = f"{extractor_key()};parser=v{PARSER_VERSION}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """Persistent map of document SHA-256 -> (extracted text, parsed fields).
+
+    Entries are evicted least-recently-used once the stored text exceeds
+    ``max_bytes``. Entries written by another extractor version are never
+    returned and are dropped when the cache is opened.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, version=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version or cache_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Streamlit serves each session from its own thread, all sharing this connection
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    content_hash TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    record TEXT,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (content_hash, version)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            self._conn.execute("DELETE FROM entries WHERE version != ?", (self.version,))
+
+    def get(self, content_hash):
+        """Return (text, record) for a document hash, or None on a miss."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, record FROM entries WHERE content_hash = ? AND version = ?",
+                (content_hash, self.version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE entries SET last_used = ? WHERE content_hash = ? AND version = ?",
+                (time.time(), content_hash, self.version),
+            )
+        text, record = row
+        return text, json.loads(record) if record is not None else None
+
+    def put(self, content_hash, text, record=None):
+        size = len(text.encode('utf-8'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (content_hash, self.version, text, json.dumps(record) if record is not None else None, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, dropping entries until the cache fits again
+        doomed = []
+        for content_hash, version, size in self._conn.execute(
+            "SELECT content_hash, version, size FROM entries ORDER BY last_used"
+        ):
+            if total <= self.max_bytes:
+                break
+            doomed.append((content_hash, version))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE content_hash = ? AND version = ?", doomed)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,70 @@
+import re
+from collections import namedtuple
+
+from document import Document
+from parsing import UNIQUE_ID_PATTERN
+
+# kind is one of KINDS; text is the first page's text layer ('' when it has none)
+Classification = namedtuple('Classification', ['kind', 'producer', 'unique_id', 'text'])
+
+# Born-digital bill from bilgen: FPDF producer and a Unique ID in the text layer
+BORN_DIGITAL = 'born_digital'
+# Some other PDF with a text layer
+TEXT_PDF = 'text_pdf'
+# PDF whose first page has no text layer: a scan, so it needs OCR
+SCANNED_PDF = 'scanned_pdf'
+IMAGE = 'image'
+KINDS = (BORN_DIGITAL, TEXT_PDF, SCANNED_PDF, IMAGE)
+
+# Producer strings written by the PDF libraries bilgen's create_pdf has used
+FPDF_PRODUCERS = re.compile(r'\b(Py)?FPDF\b', re.IGNORECASE)
+# A first page with fewer printable characters than this counts as having no text layer
+MIN_TEXT_CHARS = 16
+
+
+def _pdfium_document(source):
+    import pypdfium2
+
+    if isinstance(source, Document):
+        # pdfium pulls the bytes it needs through the file object; the buffer is not copied
+        return pypdfium2.PdfDocument(source.open(), autoclose=True)
+    return pypdfium2.PdfDocument(source)
+
+
+def first_page_text(pdf):
+    """Raw text layer of the first page in reading order; no layout analysis."""
+    if len(pdf) == 0:
+        return ''
+    page = pdf[0]
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range().replace('\r\n', '\n')
+    finally:
+        textpage.close()
+        page.close()
+
+
+def classify_document(source, name=None):
+    """Decide how a document should be extracted, reading at most its first page.
+
+    source is a path or a Document. Images are always IMAGE; a PDF is
+    classified from its producer metadata and its first page's text layer.
+    """
+    name = name or (source.name if isinstance(source, Document) else source)
+    if not name.lower().endswith('.pdf'):
+        return Classification(IMAGE, None, None, '')
+    pdf = _pdfium_document(source)
+    try:
+        producer = pdf.get_metadata_dict().get('Producer') or None
+        text = first_page_text(pdf)
+    finally:
+        pdf.close()
+    match = UNIQUE_ID_PATTERN.search(text)
+    unique_id = match.group(1) if match else None
+    if len(text.strip()) < MIN_TEXT_CHARS:
+        kind = SCANNED_PDF
+    elif unique_id and producer and FPDF_PRODUCERS.search(producer):
+        kind = BORN_DIGITAL
+    else:
+        kind = TEXT_PDF
+    return Classification(kind, producer, unique_id, text)
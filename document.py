@@ -0,0 +1,174 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+HASH_CHUNK = 1024 * 1024
+# Files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a memoryview; read() copies only the bytes asked for."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        self._pos = max(self._pos, 0)
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos += len(chunk)
+        return chunk
+
+
+class Document:
+    """A named upload or file held in memory, read once.
+
+    The bytes are kept as a memoryview, so an upload buffer is wrapped rather
+    than copied. pdfplumber reads it through ``open()``, images are decoded
+    with ``cv2.imdecode`` straight from it, and ``sha256`` hashes it without
+    another read. Files read from disk are hashed chunk by chunk while they are
+    read; files of MMAP_THRESHOLD bytes or more are memory-mapped instead.
+    """
+
+    def __init__(self, name, data, sha256=None, path=None):
+        self.name = name
+        self._view = memoryview(data).cast('B')
+        self._sha256 = sha256
+        # Set for memory-mapped files: workers re-map the file instead of receiving its bytes
+        self._path = path
+        self._mmap = None
+
+    @classmethod
+    def from_path(cls, path, name=None, mmap_threshold=MMAP_THRESHOLD):
+        name = name or path
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            if size and size >= mmap_threshold:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                document = cls(name, mapping, path=path)
+                document._mmap = mapping
+                return document
+            return cls.from_stream(name, f, size)
+
+    @classmethod
+    def from_stream(cls, name, stream, size=None, mmap_threshold=MMAP_THRESHOLD):
+        """Read a binary stream (e.g. an archive member) once, hashing it as it is read.
+
+        Streams of ``mmap_threshold`` bytes or more are spooled to an anonymous
+        temporary file and memory-mapped rather than held on the heap.
+        """
+        hasher = hashlib.sha256()
+        if size is not None and size >= mmap_threshold:
+            spool = tempfile.TemporaryFile()
+            for chunk in iter(lambda: stream.read(HASH_CHUNK), b""):
+                hasher.update(chunk)
+                spool.write(chunk)
+            spool.flush()
+            mapping = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ)
+            spool.close()
+            document = cls(name, mapping, sha256=hasher.hexdigest())
+            document._mmap = mapping
+            return document
+
+        if size is None:
+            chunks = []
+            for chunk in iter(lambda: stream.read(HASH_CHUNK), b""):
+                hasher.update(chunk)
+                chunks.append(chunk)
+            return cls(name, b"".join(chunks), sha256=hasher.hexdigest())
+
+        # Read straight into one preallocated buffer and hash each chunk as it lands
+        data = bytearray(size)
+        view = memoryview(data)
+        filled = 0
+        while filled < size:
+            count = stream.readinto(view[filled:filled + HASH_CHUNK])
+            if not count:
+                break
+            hasher.update(view[filled:filled + count])
+            filled += count
+        view.release()
+        del data[filled:]
+        return cls(name, data, sha256=hasher.hexdigest())
+
+    @property
+    def size(self):
+        return self._view.nbytes
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            hasher = hashlib.sha256()
+            for start in range(0, self.size, HASH_CHUNK):
+                hasher.update(self._view[start:start + HASH_CHUNK])
+            self._sha256 = hasher.hexdigest()
+        return self._sha256
+
+    @property
+    def is_pdf(self):
+        return self.name.lower().endswith('.pdf')
+
+    def open(self):
+        """A seekable binary file over the bytes, for pdfplumber and other file readers."""
+        return io.BufferedReader(_BufferReader(self._view), HASH_CHUNK)
+
+    def as_array(self):
+        """The bytes as a uint8 array sharing this document's memory, for cv2.imdecode."""
+        return np.frombuffer(self._view, dtype=np.uint8)
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __reduce__(self):
+        # Sent to pool workers: a mapped file by path, anything else by value
+        if self._path is not None:
+            return (_reopen, (self._path, self.name, self._sha256))
+        return (Document, (self.name, self._view.tobytes(), self._sha256))
+
+
+def _reopen(path, name, sha256):
+    document = Document.from_path(path, name, mmap_threshold=0)
+    document._sha256 = sha256
+    return document
+
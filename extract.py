@@ -0,0 +1,164 @@
+import pdfplumber
+import cv2
+
+from classify import BORN_DIGITAL, IMAGE, SCANNED_PDF, classify_document
+from document import Document
+from metrics import METRICS, stage
+
+from ocr import DEFAULT_ENGINE, TESSERACT_CONFIG, get_engine
+from preprocess import preprocess_for_ocr
+from parsing import MAX_BUFFER_CHARS, IncrementalParser, extract_fields, has_required_fields
+
+# Bump when extraction output changes so cached text from older extractors is ignored
+EXTRACTOR_VERSION = 4
+# Scanned PDF pages are rendered at this resolution for OCR
+OCR_DPI = 300
+# Stages extract_document records for each path it can take
+EXTRACTION_PATHS = ('extract_fast_text', 'extract_pdf_text', 'extract_ocr')
+
+
+def _open_pdf(source):
+    # A Document is read from its buffer; anything else is a path
+    return pdfplumber.open(source.open() if isinstance(source, Document) else source)
+
+def iter_pdf_pages(source, pages=None):
+    """Yield the text of each page lazily, releasing each page once it is read.
+
+    source is a path or a Document. pages is an optional (start, stop) range
+    so large PDFs can be split across workers.
+    """
+    with _open_pdf(source) as pdf:
+        selected = pdf.pages if pages is None else pdf.pages[pages[0]:pages[1]]
+        for page in selected:
+            page_text = page.extract_text()
+            # Drop the page's cached layout objects before moving on
+            page.close()
+            if page_text:
+                yield page_text + "\n"
+
+def extract_text_from_pdf(source, pages=None):
+    return "".join(iter_pdf_pages(source, pages))
+
+def extract_fields_from_pdf(source, pages=None, max_chars=MAX_BUFFER_CHARS):
+    """Extract pages only until every bill field has been found.
+
+    Returns (text, fields, complete): the text of the pages that were read
+    (capped at max_chars), the parsed fields, and whether extraction stopped
+    early because all fields were found.
+    """
+    parser = IncrementalParser(max_chars)
+    texts = []
+    kept = 0
+    for page_text in iter_pdf_pages(source, pages):
+        if kept < max_chars:
+            texts.append(page_text[:max_chars - kept])
+            kept += len(texts[-1])
+        if parser.feed(page_text):
+            break
+    return "".join(texts), parser.fields, parser.done
+
+def extract_text_from_image(source, engine=None):
+    if isinstance(source, Document):
+        # Decode straight from the upload buffer
+        img = cv2.imdecode(source.as_array(), cv2.IMREAD_COLOR)
+    else:
+        img = cv2.imread(source)
+    if img is None:
+        raise ValueError(f"Could not decode image {getattr(source, 'name', source)}")
+    return ocr_page(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), engine)
+
+def ocr_page(gray, engine=None):
+    # Downscale, deskew and binarize, then OCR only the lines that hold the bill fields
+    regions, page = preprocess_for_ocr(gray)
+    ocr = get_engine(engine)
+    if regions is not None:
+        text = ocr.image_to_text(regions)
+        if has_required_fields(extract_fields(text)):
+            return text
+    # The fields were not on the expected lines; read the whole cleaned page
+    return ocr.image_to_text(page)
+
+def extract_fields_from_scanned_pdf(source, pages=None, dpi=OCR_DPI, max_chars=MAX_BUFFER_CHARS):
+    """Rasterize and OCR a PDF without a text layer page by page until every field is found.
+
+    Returns (text, fields, complete) like extract_fields_from_pdf.
+    """
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(source.open(), autoclose=True) if isinstance(source, Document) else pypdfium2.PdfDocument(source)
+    parser = IncrementalParser(max_chars)
+    texts = []
+    kept = 0
+    try:
+        start, stop = pages if pages is not None else (0, len(pdf))
+        for index in range(start, min(stop, len(pdf))):
+            page = pdf[index]
+            try:
+                bitmap = page.render(scale=dpi / 72, grayscale=True)
+                gray = bitmap.to_numpy()
+            finally:
+                page.close()
+            if gray.ndim == 3:
+                gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+            page_text = ocr_page(gray) + "\n"
+            if kept < max_chars:
+                texts.append(page_text[:max_chars - kept])
+                kept += len(texts[-1])
+            if parser.feed(page_text):
+                break
+    finally:
+        pdf.close()
+    return "".join(texts), parser.fields, parser.done
+
+def count_pdf_pages(source):
+    with _open_pdf(source) as pdf:
+        return len(pdf.pages)
+
+def _name(source, name):
+    return name or (source.name if isinstance(source, Document) else source)
+
+def extract_document(source, name=None, pages=None):
+    """Extract a document and parse its bill fields; returns (text, fields, complete).
+
+    source is a path or a Document. The document is classified first (see
+    classify.py) and takes the cheapest path that can read it:
+    - born-digital bills are parsed from the first page's raw text layer
+    - other PDFs are read page by page with pdfplumber until all fields are found
+    - scanned PDFs are rasterized and OCR'd page by page, images are OCR'd
+    Each path runs as its own stage (extract_fast_text, extract_pdf_text,
+    extract_ocr), so the stage counts in METRICS show how often OCR was avoided.
+    """
+    name = _name(source, name)
+    with stage('classify', name):
+        classification = classify_document(source, name)
+
+    if classification.kind == BORN_DIGITAL and (pages is None or pages[0] == 0):
+        with stage('extract_fast_text', name, len(classification.text)):
+            fields = extract_fields(classification.text)
+            if has_required_fields(fields):
+                return classification.text[:MAX_BUFFER_CHARS], fields, True
+
+    if classification.kind == IMAGE:
+        with stage('extract_ocr', name):
+            text = extract_text_from_image(source)
+            fields = extract_fields(text)
+            return text, fields, has_required_fields(fields)
+    if classification.kind == SCANNED_PDF:
+        with stage('extract_ocr', name):
+            return extract_fields_from_scanned_pdf(source, pages)
+    with stage('extract_pdf_text', name):
+        return extract_fields_from_pdf(source, pages)
+
+def extraction_path_counts(metrics=METRICS):
+    """Documents classified, calls per extraction path, and the share of documents that skipped OCR."""
+    summary = metrics.summary()
+    counts = {path: summary.get(path, {}).get('calls', 0) for path in ('classify',) + EXTRACTION_PATHS}
+    documents = counts.pop('classify')
+    counts['documents'] = documents
+    counts['ocr_avoided'] = 1 - counts['extract_ocr'] / documents if documents else None
+    return counts
+
+def extractor_key():
+    """Identify the extractor and its configuration, for keying cached output."""
+    engine = f"tesseract {TESSERACT_CONFIG}" if DEFAULT_ENGINE == 'tesseract' else DEFAULT_ENGINE
+    return f"v{EXTRACTOR_VERSION};pdfplumber={pdfplumber.__version__};ocr={engine}"
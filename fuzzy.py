@@ -0,0 +1,147 @@
+import re
+from collections import defaultdict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+# One candidate ledger row; same_amount is False for name-only suggestions
+FuzzyMatch = namedtuple('FuzzyMatch', ['ledger_row', 'company_name', 'score', 'same_amount'])
+
+# Legal-form words spelled several ways on bills, mapped to one spelling
+SUFFIXES = {
+    'private': 'pvt', 'pvt': 'pvt',
+    'limited': 'ltd', 'ltd': 'ltd',
+    'corporation': 'corp', 'corp': 'corp',
+    'company': 'co', 'co': 'co',
+    'incorporated': 'inc', 'inc': 'inc',
+    'brothers': 'bros', 'bros': 'bros',
+    'enterprises': 'ent', 'enterprise': 'ent',
+}
+_SUFFIX_WORDS = re.compile(r'\b(' + '|'.join(sorted(SUFFIXES, key=len, reverse=True)) + r')\b')
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+# Trigrams found in more than this share of names ("pvt", "ltd") are too common to
+# find candidates with; they still count when the shortlist is scored
+MAX_DF = 0.1
+SHORTLIST = 128
+# Amount blocks up to this size are scored row by row; larger ones go through the name index
+BLOCK_LIMIT = 256
+
+
+def canonical_company_name(name):
+    """Casefold, drop punctuation and spell legal suffixes one way: "ABC Pvt. Ltd." -> "abc pvt ltd"."""
+    name = _PUNCTUATION.sub(' ', str(name).casefold().replace('&', ' and '))
+    name = _SUFFIX_WORDS.sub(lambda match: SUFFIXES[match.group(1)], name)
+    return _SPACES.sub(' ', name).strip()
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query_grams, name):
+    """Dice coefficient between a query's trigram set and a canonical name."""
+    grams = trigrams(name)
+    return 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+
+
+class FuzzyNameIndex:
+    """Trigram inverted index over the distinct canonical names of a column.
+
+    Rows are mapped to name ids, so a million-row ledger with a few thousand
+    clients indexes only those few thousand names. ``search`` gathers
+    candidates from the postings of the query's rarer trigrams, then scores a
+    short list exactly.
+    """
+
+    def __init__(self, names, max_df=MAX_DF):
+        raw_codes, raw_names = pd.factorize(pd.Series(names, dtype=object), use_na_sentinel=True)
+        # Canonicalize each distinct spelling once, then merge spellings that agree
+        canonical = [canonical_company_name(name) for name in raw_names]
+        canonical_codes, canonical_names = pd.factorize(pd.Series(canonical, dtype=object))
+        self.names = np.asarray(canonical_names, dtype=object)
+        self.row_names = np.where(raw_codes >= 0, canonical_codes[raw_codes], -1) if len(raw_names) else raw_codes
+        # First row carrying each name, for turning a name hit back into a row
+        self.first_rows = np.zeros(len(self.names), dtype=np.int64)
+        named = np.flatnonzero(self.row_names >= 0)
+        ids, first = np.unique(self.row_names[named], return_index=True)
+        self.first_rows[ids] = named[first]
+
+        postings = defaultdict(list)
+        for name_id, name in enumerate(self.names):
+            for gram in trigrams(name):
+                postings[gram].append(name_id)
+        limit = max(max_df * len(self.names), SHORTLIST)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._common = {gram for gram, ids in self._postings.items() if len(ids) > limit}
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, name, k=5, shortlist=SHORTLIST):
+        """Top ``k`` (name id, score) pairs for ``name``, best first."""
+        query = trigrams(canonical_company_name(name))
+        grams = [gram for gram in query if gram in self._postings]
+        rare = [gram for gram in grams if gram not in self._common] or grams
+        if not rare:
+            return []
+        ids, counts = np.unique(np.concatenate([self._postings[gram] for gram in rare]), return_counts=True)
+        if len(ids) > shortlist:
+            ids = ids[np.argpartition(-counts, shortlist)[:shortlist]]
+        scored = sorted(((similarity(query, self.names[name_id]), int(name_id)) for name_id in ids), reverse=True)
+        return [(name_id, score) for score, name_id in scored[:k]]
+
+
+class FuzzyMatcher:
+    """Candidate ledger rows for a bill whose company name did not match exactly.
+
+    Rows are blocked on amount in paise (and PAN when both sides have one), so
+    a query only scores the names of ledger rows with the same amount. When no
+    row has that amount, the closest names in the whole ledger are returned as
+    suggestions with ``same_amount=False``.
+    """
+
+    def __init__(self, records, amounts_paise):
+        self.company_names = records['Company Name'].fillna('').astype(str).to_numpy(dtype=object) if 'Company Name' in records else np.array([], dtype=object)
+        self.index = FuzzyNameIndex(self.company_names)
+        self.pans = records['pan_number'].fillna('').astype(str).str.strip().str.upper().to_numpy(dtype=object) if 'pan_number' in records else None
+
+        amounts = amounts_paise.to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.flatnonzero(~np.isnan(amounts))
+        order = np.argsort(amounts[valid], kind='stable')
+        self._rows_by_amount = valid[order]
+        self._sorted_amounts = amounts[valid][order]
+
+    def _block(self, amount_paise, pan=None):
+        start = np.searchsorted(self._sorted_amounts, amount_paise, side='left')
+        stop = np.searchsorted(self._sorted_amounts, amount_paise, side='right')
+        rows = self._rows_by_amount[start:stop]
+        if pan and self.pans is not None and len(rows):
+            same_pan = rows[self.pans[rows] == str(pan).strip().upper()]
+            if len(same_pan):
+                rows = same_pan
+        return rows
+
+    def candidates(self, company_name, amount_paise=None, k=5, pan=None):
+        """Top ``k`` FuzzyMatch rows for a bill, best first."""
+        rows = self._block(amount_paise, pan) if amount_paise is not None and not pd.isna(amount_paise) else np.array([], dtype=np.int64)
+        if len(rows):
+            name_ids = self.index.row_names[rows]
+            if len(rows) <= BLOCK_LIMIT:
+                query = trigrams(canonical_company_name(company_name))
+                scores = {name_id: similarity(query, self.index.names[name_id]) for name_id in set(name_ids.tolist()) if name_id >= 0}
+            else:
+                # Large block (a round amount): let the name index pick the names worth scoring
+                scores = dict(self.index.search(company_name, k=SHORTLIST))
+            scored = [(scores[name_id], int(row)) for row, name_id in zip(rows, name_ids) if name_id in scores]
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            return [FuzzyMatch(row, self.company_names[row], score, True) for score, row in scored[:k]]
+
+        # No ledger row has this amount: suggest the closest names anywhere
+        matches = []
+        for name_id, score in self.index.search(company_name, k=k):
+            row = int(self.index.first_rows[name_id])
+            matches.append(FuzzyMatch(row, self.company_names[row], score, False))
+        return matches
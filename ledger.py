@@ -0,0 +1,313 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pandas as pd
+
+from records import BillRecord, to_paise
+
+DEFAULT_LEDGER_PATH = os.environ.get('AUDITY_LEDGER', 'billing_records.db')
+
+# billing_records.csv column -> ledger table column
+COLUMNS = {
+    'Unique ID': 'unique_id',
+    'Date': 'date',
+    'serial_number': 'serial_number',
+    'Amount': 'amount_paise',
+    'pan_number': 'pan_number',
+    'Company Name': 'company_name',
+    'PDF Hash': 'pdf_hash',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS billing_records (
+    unique_id TEXT NOT NULL,
+    date TEXT,
+    serial_number TEXT,
+    amount_paise INTEGER,
+    pan_number TEXT,
+    company_name TEXT,
+    pdf_hash TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS billing_records_unique_id ON billing_records (unique_id);
+CREATE INDEX IF NOT EXISTS billing_records_pdf_hash ON billing_records (pdf_hash);
+CREATE INDEX IF NOT EXISTS billing_records_company_date ON billing_records (company_name, date);
+"""
+
+# Extra columns read() can return: amounts in integer paise, as stored
+_READ_COLUMNS = {**COLUMNS, 'Amount (paise)': 'amount_paise'}
+
+# SQLite caps the number of bound parameters per statement
+_MAX_PARAMS = 900
+
+# Seconds a connection waits for another process's write lock before failing
+BUSY_TIMEOUT = 30.0
+# Group commit: a LedgerWriter commits up to GROUP_ROWS queued rows together,
+# waiting at most GROUP_DELAY seconds for more to arrive after the first. With
+# WAL and synchronous=NORMAL a commit is cheap, so by default it does not wait:
+# the rows queued while one commit runs make up the next
+GROUP_ROWS = 1_000
+GROUP_DELAY = 0.0
+
+_INSERT = "INSERT INTO billing_records VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def _to_row(record):
+    if isinstance(record, BillRecord):
+        return (record.unique_id, record.date.isoformat(), record.serial_number, record.amount_paise,
+                record.pan_number, record.company_name, record.pdf_hash)
+    date = record.get('Date')
+    if date is not None and not isinstance(date, str):
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+    return (
+        str(record['Unique ID']).strip(),
+        date,
+        record.get('serial_number'),
+        to_paise(record.get('Amount')),
+        record.get('pan_number'),
+        record.get('Company Name'),
+        record.get('PDF Hash'),
+    )
+
+
+class Ledger:
+    """Billing ledger shared by bilgen (writes) and Audity (reads).
+
+    Rows live in a SQLite table in WAL mode, so readers never block the
+    writer. Writers in other processes are waited for (up to BUSY_TIMEOUT),
+    and every write transaction starts with BEGIN IMMEDIATE, so it holds the
+    write lock from its first statement and cannot fail halfway through on a
+    lock another writer took first. Unique ID, PDF Hash and (Company Name, Date) are indexed, which
+    makes point lookups B-tree searches instead of full-file scans.
+    Amounts are stored as integer paise and returned in rupees as 'Amount',
+    or as stored when 'Amount (paise)' is asked for.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, migrate_from=None):
+        self.path = path
+        self._lock = threading.Lock()
+        # isolation_level=None: transactions are begun explicitly, by _write
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._write() as conn:
+            for statement in filter(str.strip, SCHEMA.split(';')):
+                conn.execute(statement)
+        if migrate_from and os.path.exists(migrate_from) and len(self) == 0:
+            self.migrate_csv(migrate_from)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM billing_records").fetchone()[0]
+
+    @contextmanager
+    def _write(self):
+        # One write transaction, committed on success and rolled back on any error
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def append(self, records):
+        """Insert bill records (BillRecords, or dicts keyed like billing_records.csv) in one transaction."""
+        rows = [_to_row(record) for record in records]
+        with self._write() as conn:
+            conn.executemany(_INSERT, rows)
+        return len(rows)
+
+    def append_groups(self, groups):
+        """Insert several batches of rows (as _to_row returns them) in one transaction.
+
+        Each batch is all-or-nothing on its own: one that fails (a Unique ID
+        already in the ledger, say) is rolled back to its savepoint and its
+        exception returned in its place, and the others are still committed.
+        Returns the row count or exception of each batch.
+        """
+        results = []
+        with self._write() as conn:
+            for rows in groups:
+                conn.execute("SAVEPOINT batch")
+                try:
+                    conn.executemany(_INSERT, rows)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO batch")
+                    results.append(e)
+                else:
+                    results.append(len(rows))
+                conn.execute("RELEASE batch")
+        return results
+
+    def migrate_csv(self, csv_path, chunksize=100_000):
+        """Import an existing billing_records.csv; rows whose Unique ID is already present are skipped."""
+        imported = 0
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+            chunk.columns = chunk.columns.str.strip()
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            rows = [_to_row(record) for record in chunk.to_dict('records') if record.get('Unique ID')]
+            with self._write() as conn:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO billing_records VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                imported += conn.total_changes - before
+        return imported
+
+    def lookup(self, unique_id):
+        """Return the record for a Unique ID as a dict, or None."""
+        frame = self._query("WHERE unique_id = ?", (unique_id,))
+        return frame.iloc[0].to_dict() if not frame.empty else None
+
+    def _select_ids(self, select, unique_ids):
+        """Rows of ``select`` (table columns) for the bills in ``unique_ids``, in one query per _MAX_PARAMS ids."""
+        unique_ids = list(unique_ids)
+        rows = []
+        with self._lock:
+            for start in range(0, len(unique_ids), _MAX_PARAMS):
+                batch = unique_ids[start:start + _MAX_PARAMS]
+                placeholders = ", ".join("?" * len(batch))
+                rows.extend(self._conn.execute(
+                    f"SELECT {select} FROM billing_records WHERE unique_id IN ({placeholders})", batch))
+        return rows
+
+    def hashes_for(self, unique_ids):
+        """Map each of ``unique_ids`` found in the ledger to its PDF Hash."""
+        return dict(self._select_ids("unique_id, pdf_hash", unique_ids))
+
+    def existing_ids(self, unique_ids):
+        """Return the subset of ``unique_ids`` present in the ledger."""
+        return {row[0] for row in self._select_ids("unique_id", unique_ids)}
+
+    def read(self, columns=None, company=None, start=None, end=None):
+        """Read the ledger (or a company/date range of it) as a DataFrame.
+
+        Only ``columns`` (billing_records.csv names, or 'Amount (paise)') are
+        fetched from disk; company names come back categorical. Filtering
+        on company and dates uses the (Company Name, Date) index.
+        """
+        clauses, params = [], []
+        if company is not None:
+            clauses.append("company_name = ?")
+            params.append(company)
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(where, params, columns)
+
+    def _query(self, where, params, columns=None):
+        columns = list(columns or COLUMNS)
+        select = ", ".join(_READ_COLUMNS[column] for column in columns)
+        with self._lock:
+            frame = pd.read_sql_query(f"SELECT {select} FROM billing_records {where}", self._conn, params=params)
+        frame.columns = columns
+        if 'Amount' in frame.columns:
+            frame['Amount'] = frame['Amount'] / 100
+        if 'Amount (paise)' in frame.columns:
+            frame['Amount (paise)'] = frame['Amount (paise)'].astype('Int64')
+        if 'Date' in frame.columns:
+            frame['Date'] = pd.to_datetime(frame['Date'], errors='coerce')
+        if 'Company Name' in frame.columns:
+            frame['Company Name'] = frame['Company Name'].astype('category')
+        return frame
+
+    def close(self):
+        self._conn.close()
+
+
+class LedgerWriter:
+    """Group commit for many concurrent writers of one ledger.
+
+    submit() queues records and returns a Future; a single writer thread
+    drains the queue and commits everything waiting (up to ``group_rows``
+    rows) in one transaction, so a burst of one-bill appends from many
+    sessions costs one fsync and one lock acquisition instead of one each.
+    Each submission still succeeds or fails on its own (see
+    Ledger.append_groups). Other processes can write the same file; they are
+    serialized by SQLite's lock.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, migrate_from=None, group_rows=GROUP_ROWS, group_delay=GROUP_DELAY):
+        self.ledger = Ledger(path, migrate_from)
+        self.group_rows = group_rows
+        self.group_delay = group_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ledger-writer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, records):
+        """Queue bill records for the next group commit; the Future's result is the number of rows written."""
+        future = Future()
+        # Rows are built here, so a malformed record fails its own submission only
+        self._queue.put(([_to_row(record) for record in records], future))
+        return future
+
+    def append(self, records):
+        """Like Ledger.append: returns once the records are committed."""
+        return self.submit(records).result()
+
+    def _next_group(self):
+        # Block for the first submission, then take whatever else arrives within group_delay
+        pending = [self._queue.get()]
+        if pending[0] is None:
+            return pending
+        rows = len(pending[0][0])
+        deadline = time.monotonic() + self.group_delay
+        while rows < self.group_rows:
+            try:
+                item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            pending.append(item)
+            if item is None:
+                break
+            rows += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._next_group()
+            stop = pending[-1] is None
+            pending = [item for item in pending if item is not None]
+            # Submissions cancelled while queued are dropped
+            pending = [(rows, future) for rows, future in pending if future.set_running_or_notify_cancel()]
+            if pending:
+                try:
+                    results = self.ledger.append_groups([rows for rows, _ in pending])
+                except Exception as e:
+                    results = [e] * len(pending)
+                for (_, future), result in zip(pending, results):
+                    if isinstance(result, BaseException):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            if stop:
+                return
+
+    def close(self):
+        """Commit everything already submitted, then stop the writer thread and close the ledger."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.ledger.close()
@@ -0,0 +1,210 @@
+"""Per-stage timings for the audit pipeline.
+
+    with stage('parse', nbytes=len(text)) as current:
+        ...
+
+    @timed('report_render')
+    def generate_pdf_report(...): ...
+
+Each stage records wall time, CPU time, bytes processed and, when memory
+tracing is on, peak traced memory above what was allocated on entry. Set
+AUDITY_TRACE_MEMORY=1 to trace memory; tracemalloc slows allocation-heavy
+code several times over, so it is off by default. Records are kept in the
+process-wide METRICS and can be exported as JSON or Prometheus text. Stage
+totals count every record since the last clear(); only the most recent
+MAX_RECORDS records are kept one by one.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+# One finished stage; peak_bytes is None when memory tracing is off
+StageRecord = namedtuple('StageRecord', ['stage', 'document', 'wall_seconds', 'cpu_seconds', 'bytes', 'peak_bytes'])
+
+MAX_RECORDS = 10_000  # oldest per-document records are dropped past this; totals are not
+TRACE_MEMORY = os.environ.get('AUDITY_TRACE_MEMORY') == '1'
+
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+class _Stage:
+    def __init__(self, name, document, nbytes):
+        self.name = name
+        self.document = document
+        self.nbytes = nbytes  # callers may add to this while the stage runs
+        self.peak = 0
+        self.start_traced = 0
+
+
+class Metrics:
+    """Thread-safe store of StageRecords with per-stage summaries."""
+
+    def __init__(self, max_records=MAX_RECORDS):
+        self.records = deque(maxlen=max_records)
+        self._totals = {}  # stage -> running totals, kept as records arrive
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name, document=None, nbytes=0):
+        """Time the body of a ``with`` block as one stage; yields the stage so ``nbytes`` can be updated."""
+        current = _Stage(name, document, nbytes)
+        stack = self._local.__dict__.setdefault('stack', [])
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # reset_peak is process-wide: fold the peak so far into the enclosing stages first
+            traced, peak = tracemalloc.get_traced_memory()
+            for outer in stack:
+                outer.peak = max(outer.peak, peak - outer.start_traced)
+            tracemalloc.reset_peak()
+            current.start_traced = traced
+        stack.append(current)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield current
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stack.pop()
+            peak = None
+            if tracing and tracemalloc.is_tracing():
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                current.peak = max(current.peak, traced_peak - current.start_traced)
+                peak = current.peak
+                for outer in stack:
+                    outer.peak = max(outer.peak, traced_peak - outer.start_traced)
+            self.add(StageRecord(name, document, wall, cpu, current.nbytes, peak))
+
+    def timed(self, name):
+        """Decorator form of ``stage``."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _count(self, record):
+        # Called with the lock held
+        totals = self._totals.get(record.stage)
+        if totals is None:
+            totals = self._totals[record.stage] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'bytes': 0, 'peak_bytes': None}
+        totals['calls'] += 1
+        totals['wall_seconds'] += record.wall_seconds
+        totals['cpu_seconds'] += record.cpu_seconds
+        totals['bytes'] += record.bytes
+        if record.peak_bytes is not None:
+            totals['peak_bytes'] = max(totals['peak_bytes'] or 0, record.peak_bytes)
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            self._count(record)
+
+    def extend(self, records):
+        with self._lock:
+            for record in records:
+                self.records.append(record)
+                self._count(record)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self._totals.clear()
+
+    def snapshot(self):
+        """The most recent records, at most ``max_records`` of them."""
+        with self._lock:
+            return list(self.records)
+
+    def summary(self):
+        """Per-stage totals since the last clear(): calls, wall and CPU seconds, bytes, and the largest peak seen."""
+        with self._lock:
+            return {name: dict(totals) for name, totals in self._totals.items()}
+
+    def to_json(self):
+        return json.dumps({
+            'stages': self.summary(),
+            'records': [record._asdict() for record in self.snapshot()],
+        }, indent=2)
+
+    def to_prometheus(self, prefix='audity_stage'):
+        """Stage totals in the Prometheus text exposition format; documents are not labels."""
+        summary = self.summary()
+        metrics = [
+            ('calls_total', 'counter', 'Stage executions', 'calls'),
+            ('wall_seconds_total', 'counter', 'Wall-clock seconds spent in the stage', 'wall_seconds'),
+            ('cpu_seconds_total', 'counter', 'CPU seconds spent in the stage', 'cpu_seconds'),
+            ('bytes_total', 'counter', 'Bytes processed by the stage', 'bytes'),
+            ('peak_bytes', 'gauge', 'Largest traced memory peak of one stage run', 'peak_bytes'),
+        ]
+        lines = []
+        for suffix, kind, help_text, key in metrics:
+            lines.append(f"# HELP {prefix}_{suffix} {help_text}")
+            lines.append(f"# TYPE {prefix}_{suffix} {kind}")
+            for name, totals in summary.items():
+                if totals[key] is not None:
+                    lines.append(f'{prefix}_{suffix}{{stage="{name}"}} {totals[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Export to ``path``: Prometheus text for .prom/.txt, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+METRICS = Metrics()
+
+
+def stage(name, document=None, nbytes=0):
+    return METRICS.stage(name, document, nbytes)
+
+
+def timed(name):
+    return METRICS.timed(name)
+
+
+def measure_call(name, document, nbytes, func, *args):
+    """Run ``func(*args)`` as a stage in a worker process; returns (result, records).
+
+    Records made in pool workers never reach the parent's METRICS, so the
+    call's record, and those of any stages run inside it, are sent back with
+    the result and added there. Only call this in a pool worker: it empties
+    the process's METRICS.
+    """
+    METRICS.clear()
+    with METRICS.stage(name, document, nbytes):
+        result = func(*args)
+    records = METRICS.snapshot()
+    METRICS.clear()
+    return result, records
+
+
+def render_panel(metrics=METRICS):
+    """Streamlit diagnostics panel: stage totals, per-document records and exports."""
+    import pandas as pd
+    import streamlit as st
+
+    st.subheader("Diagnostics")
+    records = metrics.snapshot()
+    if not metrics.summary():
+        st.caption("No stages recorded yet.")
+        return
+    summary = pd.DataFrame.from_dict(metrics.summary(), orient='index')
+    summary['MB/s'] = summary['bytes'] / summary['wall_seconds'].where(summary['wall_seconds'] > 0) / 1e6
+    st.dataframe(summary.sort_values('wall_seconds', ascending=False))
+    if not TRACE_MEMORY:
+        st.caption("Peak memory is not traced; start the app with AUDITY_TRACE_MEMORY=1 to record it.")
+    with st.expander(f"Per-document records (the last {metrics.records.maxlen:,})"):
+        st.dataframe(pd.DataFrame(records, columns=StageRecord._fields))
+    st.download_button("Download metrics (JSON)", metrics.to_json(), file_name="audity_metrics.json", mime="application/json")
+    st.download_button("Download metrics (Prometheus)", metrics.to_prometheus(), file_name="audity_metrics.prom", mime="text/plain")
+    if st.button("Reset metrics"):
+        metrics.clear()
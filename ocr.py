@@ -0,0 +1,61 @@
+import os
+import threading
+
+TESSERACT_CONFIG = '--psm 6'
+DEFAULT_ENGINE = os.environ.get('AUDITY_OCR_ENGINE', 'tesseract')
+
+_factories = {}
+_engines = {}
+_lock = threading.Lock()
+
+
+def register_engine(name, factory):
+    """Register an OCR engine factory under ``name``; it is called at most once per process."""
+    _factories[name] = factory
+
+
+def get_engine(name=None):
+    """Return the process-wide engine for ``name``, creating it on first use.
+
+    Streamlit serves every session from the same process, so all sessions
+    share one engine (and one copy of its model) instead of loading their own.
+    """
+    name = name or DEFAULT_ENGINE
+    engine = _engines.get(name)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(name)
+            if engine is None:
+                if name not in _factories:
+                    raise ValueError(f"Unknown OCR engine '{name}'. Available: {', '.join(sorted(_factories))}")
+                engine = _factories[name]()
+                _engines[name] = engine
+    return engine
+
+
+class TesseractEngine:
+    name = 'tesseract'
+
+    def __init__(self, config=TESSERACT_CONFIG):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.config = config
+
+    def image_to_text(self, image):
+        return self._pytesseract.image_to_string(image, config=self.config)
+
+
+class EasyOCREngine:
+    name = 'easyocr'
+
+    def __init__(self, languages=('en',)):
+        # Importing easyocr pulls in torch, and building the Reader loads its models
+        import easyocr
+        self.reader = easyocr.Reader(list(languages))
+
+    def image_to_text(self, image):
+        return "\n".join(self.reader.readtext(image, detail=0))
+
+
+register_engine('tesseract', TesseractEngine)
+register_engine('easyocr', EasyOCREngine)
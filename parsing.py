@@ -0,0 +1,120 @@
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+from records import RECORD_DTYPES, amounts_to_paise
+
+# Bump when extract_fields output changes so cached records are re-parsed
+PARSER_VERSION = 1
+
+# Upper bound on text held per document while parsing incrementally (~1 MB)
+MAX_BUFFER_CHARS = 1_000_000
+
+UNIQUE_ID_PATTERN = re.compile(r'Unique ID:\s*(\w+)')
+COMPANY_NAME_PATTERN = re.compile(r'Company Name:\s*(.*?)\s*Date:', re.DOTALL)
+DATE_PATTERN = re.compile(r'Date:\s*(\d{4}-\d{2}-\d{2})')
+TOTAL_PATTERN = re.compile(r'Total:\s*([\d,]+(?:\.\d+)?)')
+
+FIELD_PATTERNS = {
+    'Unique ID': UNIQUE_ID_PATTERN,
+    'Company Name': COMPANY_NAME_PATTERN,
+    'Date': DATE_PATTERN,
+    'Total': TOTAL_PATTERN,
+}
+
+
+def extract_fields(text, keys=None):
+    """Pull the bill fields out of extracted text.
+
+    Returns a dict with 'Unique ID', 'Company Name', 'Date' (YYYY-MM-DD string)
+    and 'Total' (float); fields that are not found are None. The dict is plain
+    JSON so it can be cached alongside the text. Pass ``keys`` to search for
+    only some of the fields.
+    """
+    fields = {}
+    for key in keys or FIELD_PATTERNS:
+        match = FIELD_PATTERNS[key].search(text)
+        if match is None:
+            fields[key] = None
+        elif key == 'Total':
+            fields[key] = float(match.group(1).replace(',', ''))
+        else:
+            fields[key] = match.group(1).strip() or None
+    return fields
+
+
+def has_required_fields(fields):
+    return bool(fields['Unique ID'] and fields['Company Name'] and fields['Date']) and fields['Total'] is not None
+
+
+class IncrementalParser:
+    """Fill in bill fields from pages of text as they are extracted.
+
+    Feed it one page at a time; ``done`` turns True as soon as every
+    required field has been found, so the caller can stop extracting.
+    Only the last ``max_chars`` characters are kept for matches that span
+    pages, which caps memory per document.
+    """
+
+    def __init__(self, max_chars=MAX_BUFFER_CHARS):
+        self.max_chars = max_chars
+        self.fields = dict.fromkeys(FIELD_PATTERNS)
+        self._buffer = ""
+
+    @property
+    def done(self):
+        return has_required_fields(self.fields)
+
+    def feed(self, page_text):
+        self._buffer = (self._buffer + page_text)[-self.max_chars:]
+        missing = [key for key, value in self.fields.items() if value is None]
+        if missing:
+            self.fields.update(extract_fields(self._buffer, missing))
+        return self.done
+
+
+# All four fields in one regex: each lookahead scans from the start of the text
+# independently, so the fields may appear in any order and any may be missing
+BATCH_PATTERN = re.compile(
+    r'\A'
+    r'(?=(?:.*?Unique ID:\s*(?P<unique_id>\w+))?)'
+    r'(?=(?:.*?Company Name:\s*(?P<company_name>.*?)\s*Date:)?)'
+    r'(?=(?:.*?Date:\s*(?P<date>\d{4}-\d{2}-\d{2}))?)'
+    r'(?=(?:.*?Total:\s*(?P<total>[\d,]+(?:\.\d+)?))?)',
+    re.DOTALL,
+)
+
+# Parsed bills from a batch: records holds complete, de-duplicated rows; incomplete
+# and duplicates hold the positions (in the input) of the texts that were dropped
+ParsedBatch = namedtuple('ParsedBatch', ['records', 'incomplete', 'duplicates'])
+
+
+def parse_batch(texts):
+    """Parse a list or Series of extracted texts into a typed DataFrame.
+
+    Fields are pulled out with one vectorized ``str.extract`` call, then dates
+    and amounts are converted column-wise into the records.RECORD_DTYPES
+    schema: 'Amount (paise)' is int64, 'Date' datetime64 and 'Company Name'
+    categorical; formatting is left to whoever displays the frame. Records
+    repeated anywhere in the batch are kept once.
+    """
+    texts = pd.Series(list(texts) if not isinstance(texts, pd.Series) else texts.to_numpy(), dtype=object)
+    raw = texts.fillna('').astype(str).str.extract(BATCH_PATTERN)
+
+    company_names = raw['company_name'].str.strip()
+    records = pd.DataFrame({
+        'Unique ID': raw['unique_id'].str.strip().astype('string'),
+        'Company Name': company_names.mask(company_names == '').astype('string'),
+        'Date': pd.to_datetime(raw['date'], format='%Y-%m-%d', errors='coerce'),
+        'Amount (paise)': amounts_to_paise(raw['total']),
+    })
+
+    complete = records.notna().all(axis=1)
+    duplicated = complete & records[complete].duplicated(keep='first').reindex(records.index, fill_value=False)
+    keep = complete & ~duplicated
+    return ParsedBatch(
+        records[keep].astype(RECORD_DTYPES),
+        list(records.index[~complete]),
+        list(records.index[duplicated]),
+    )
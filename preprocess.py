@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+# Tesseract reads body text best at roughly 300 DPI; more resolution only costs time
+TARGET_DPI = 300
+# A4 long side in inches, used to estimate DPI when the photo carries none
+PAGE_LONG_SIDE_IN = 11.7
+
+# Bilgen bills print Unique ID, Company Name, Date and Serial Number first
+# and Total last, so these lines are all OCR needs to read
+HEAD_LINES = 4
+TAIL_LINES = 2
+
+
+def downscale(gray, dpi=None, target_dpi=TARGET_DPI):
+    """Shrink an image to about ``target_dpi``; never upscale.
+
+    Without a known ``dpi`` the page is assumed to fill the frame, which is
+    how bills are photographed.
+    """
+    if dpi is None:
+        dpi = max(gray.shape) / PAGE_LONG_SIDE_IN
+    scale = target_dpi / dpi
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def binarize(gray):
+    # Adaptive thresholding copes with the uneven lighting of phone photos
+    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def _smear_lines(binary):
+    # Smear characters horizontally so each printed line becomes one blob
+    w = binary.shape[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(w // 30, 15), 3))
+    return cv2.dilate(cv2.bitwise_not(binary), kernel, iterations=1)
+
+
+def skew_angle(binary):
+    """Median tilt, in degrees, of the line-shaped blobs on a binarized page."""
+    contours, _ = cv2.findContours(_smear_lines(binary), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    angles = []
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if min(w, h) < 5 or max(w, h) < 5 * min(w, h):
+            continue
+        # OpenCV versions disagree on the angle range; fold it into (-45, 45]
+        while angle > 45:
+            angle -= 90
+        while angle <= -45:
+            angle += 90
+        angles.append(angle)
+    return float(np.median(angles)) if angles else 0.0
+
+
+def deskew(binary):
+    """Rotate a binarized page so its text lines are horizontal."""
+    angle = skew_angle(binary)
+    if abs(angle) < 0.3:
+        return binary
+    h, w = binary.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(binary, matrix, (w, h), flags=cv2.INTER_NEAREST, borderValue=255)
+
+
+def find_text_lines(binary):
+    """Bounding boxes (x, y, w, h) of text lines, top to bottom."""
+    h = binary.shape[0]
+    contours, _ = cv2.findContours(_smear_lines(binary), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_height = max(h // 200, 6)
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    # Drop specks and page-tall blobs (borders, shadows)
+    boxes = [box for box in boxes if min_height <= box[3] <= h // 8 and box[2] >= box[3]]
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def field_regions(boxes, head=HEAD_LINES, tail=TAIL_LINES):
+    """Pick the line boxes likely to hold Unique ID, Date and Total."""
+    if len(boxes) <= head + tail:
+        return boxes
+    return boxes[:head] + boxes[-tail:]
+
+
+def stack_regions(binary, boxes, pad=8):
+    """Crop boxes from the page and stack them into one image for a single OCR call."""
+    width = max(w for _, _, w, _ in boxes) + 2 * pad
+    strips = []
+    for x, y, w, h in boxes:
+        strip = np.full((h + 2 * pad, width), 255, dtype=np.uint8)
+        y0, x0 = max(y - pad // 2, 0), max(x - pad // 2, 0)
+        crop = binary[y0:y + h + pad // 2, x0:x + w + pad // 2]
+        strip[pad // 2:pad // 2 + crop.shape[0], pad // 2:pad // 2 + crop.shape[1]] = crop
+        strips.append(strip)
+    return np.vstack(strips)
+
+
+def preprocess_for_ocr(gray, dpi=None):
+    """Run the preprocessing stages on a grayscale photo.
+
+    Returns (regions, page): ``regions`` is the stacked field lines, or None
+    when no text lines were found, and ``page`` is the full cleaned page to
+    fall back on.
+    """
+    page = deskew(binarize(downscale(gray, dpi)))
+    boxes = field_regions(find_text_lines(page))
+    regions = stack_regions(page, boxes) if boxes else None
+    return regions, page
@@ -0,0 +1,174 @@
+from collections import namedtuple
+
+import pandas as pd
+
+from fuzzy import FuzzyMatcher
+from records import paise_column
+
+# Result of reconciling a batch of parsed bills against the billing records
+ReconciliationResult = namedtuple('ReconciliationResult', ['matched', 'unmatched', 'ambiguous'])
+
+# A bill whose company name did not match exactly is matched to a ledger row with
+# the same amount when their names score at least this (trigram Dice, 0..1)
+FUZZY_THRESHOLD = 0.7
+# Below this score the closest name is too unlike the bill's to suggest
+FUZZY_SUGGEST_MIN = 0.3
+FUZZY_TOP_K = 5
+
+
+def normalize_company_names(names):
+    """Normalize a Series of company names for exact key comparison.
+
+    Categorical names are normalized once per category, not once per row.
+    """
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        categories = names.cat.categories
+        return names.map(dict(zip(categories, normalize_company_names(pd.Series(categories, dtype=object)))))
+    return names.astype(str).str.strip().str.casefold().str.replace(r'\s+', ' ', regex=True)
+
+
+class LedgerIndex:
+    """Billing records keyed on (normalized Company Name, amount in paise) and on Unique ID.
+
+    Build it once per ledger and reuse it for every batch of parsed bills.
+    """
+
+    def __init__(self, billing_records):
+        records = billing_records.reset_index(drop=True)
+        keys = pd.DataFrame(index=records.index)
+        keys['_ledger_row'] = records.index
+
+        amounts = paise_column(records)
+        if 'Company Name' in records.columns and amounts is not None:
+            keys['_company_key'] = normalize_company_names(records['Company Name'])
+            keys['_amount_paise'] = amounts
+        else:
+            keys['_company_key'] = pd.Series(dtype='object')
+            keys['_amount_paise'] = pd.Series(dtype='Int64')
+
+        if 'Unique ID' in records.columns:
+            keys['_unique_id'] = records['Unique ID'].astype(str).str.strip()
+        else:
+            keys['_unique_id'] = pd.Series(dtype='object')
+
+        self.records = records
+        self.keys = keys.dropna(subset=['_company_key', '_amount_paise'])
+        self.unique_ids = pd.Index(keys['_unique_id'].dropna().unique(), dtype=object)
+        self._amounts = keys['_amount_paise']
+        self._fuzzy = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def fuzzy(self):
+        """FuzzyMatcher over the ledger, built on first use: most batches match exactly."""
+        if self._fuzzy is None:
+            self._fuzzy = FuzzyMatcher(self.records, self._amounts)
+        return self._fuzzy
+
+
+def reconcile(parsed_df, index, fuzzy_threshold=FUZZY_THRESHOLD):
+    """Join parsed bills against a LedgerIndex with vectorized merges.
+
+    Each parsed row lands in exactly one of the returned frames:
+    - matched: exactly one billing record has the same company and amount,
+      or several do and one of them carries the bill's Unique ID
+    - ambiguous: several billing records match and the Unique ID does not
+      single one out (``Candidates`` holds how many)
+    - unmatched: no billing record has the same company and amount
+
+    Bills with no exact match are retried against ledger rows of the same
+    amount with fuzzy company-name matching (see fuzzy.py); names scoring at
+    least ``fuzzy_threshold`` count as matches. Pass None to match exactly only.
+
+    Every frame keeps the parsed columns and adds ``Amount (paise)``, ``ID In
+    Ledger`` and ``Confidence`` (1.0 for exact matches, the name score for
+    fuzzy ones, the best suggestion's score or 0 for unmatched rows). Matched rows
+    also carry ``Ledger Row``, the position of the matching row in
+    ``index.records``; unmatched rows carry ``Suggestion``, the closest ledger
+    company name, or None when none scores FUZZY_SUGGEST_MIN.
+    """
+    parsed = parsed_df.reset_index(drop=True).copy()
+    parsed['_parsed_row'] = parsed.index
+    parsed['_company_key'] = normalize_company_names(parsed['Company Name'])
+    parsed['_amount_paise'] = paise_column(parsed)
+    if 'Unique ID' in parsed.columns:
+        parsed['_unique_id'] = parsed['Unique ID'].astype(str).str.strip()
+        # get_indexer reuses the hash table the Index builds on first lookup
+        parsed['ID In Ledger'] = index.unique_ids.get_indexer(parsed['_unique_id'].astype(object)) >= 0
+    else:
+        parsed['_unique_id'] = None
+        parsed['ID In Ledger'] = False
+
+    candidates = parsed[['_parsed_row', '_company_key', '_amount_paise', '_unique_id']].merge(
+        index.keys.rename(columns={'_unique_id': '_ledger_unique_id'}),
+        on=['_company_key', '_amount_paise'],
+        how='inner',
+    )
+    counts = candidates.groupby('_parsed_row').size()
+
+    # A single candidate is a match; among several, prefer the one with the same Unique ID
+    single = candidates[candidates['_parsed_row'].map(counts) == 1]
+    by_id = candidates[
+        (candidates['_parsed_row'].map(counts) > 1)
+        & (candidates['_unique_id'] == candidates['_ledger_unique_id'])
+    ].drop_duplicates('_parsed_row')
+    chosen = pd.concat([single, by_id])[['_parsed_row', '_ledger_row']]
+
+    parsed['Candidates'] = parsed['_parsed_row'].map(counts).fillna(0).astype(int)
+    parsed['Confidence'] = (parsed['Candidates'] > 0).astype('float64')
+    parsed['Suggestion'] = None
+    rest = parsed[~parsed['_parsed_row'].isin(chosen['_parsed_row'])]
+    if fuzzy_threshold is not None and len(index) and (rest['Candidates'] == 0).any():
+        fuzzy_chosen = _fuzzy_match(parsed, rest[rest['Candidates'] == 0], index, fuzzy_threshold)
+        chosen = pd.concat([chosen, fuzzy_chosen])
+        rest = parsed[~parsed['_parsed_row'].isin(chosen['_parsed_row'])]
+
+    matched = parsed.merge(chosen, on='_parsed_row', how='inner').rename(columns={'_ledger_row': 'Ledger Row'})
+    ambiguous = rest[rest['Candidates'] > 1]
+    unmatched = rest[rest['Candidates'] == 0].drop(columns=['Candidates'])
+    matched = matched.drop(columns=['Candidates', 'Suggestion'])
+    ambiguous = ambiguous.drop(columns=['Suggestion'])
+
+    def _finish(frame):
+        frame = frame.sort_values('_parsed_row').drop(columns=['_parsed_row', '_company_key', '_unique_id'])
+        if 'Amount (paise)' in frame.columns:
+            frame = frame.drop(columns=['_amount_paise'])
+        return frame.rename(columns={'_amount_paise': 'Amount (paise)'}).reset_index(drop=True)
+
+    return ReconciliationResult(_finish(matched), _finish(unmatched), _finish(ambiguous))
+
+
+def _fuzzy_match(parsed, unmatched, index, threshold):
+    """Resolve unmatched rows through index.fuzzy, updating ``parsed`` in place.
+
+    Returns the (_parsed_row, _ledger_row) pairs that now match. Rows whose
+    best candidates tie are marked ambiguous unless the Unique ID picks one.
+    """
+    chosen = []
+    ledger_ids = index.records['Unique ID'].astype(str).str.strip().to_numpy() if 'Unique ID' in index.records else None
+    pan = parsed['pan_number'] if 'pan_number' in parsed.columns else None
+    for position in unmatched['_parsed_row']:
+        amount = parsed.at[position, '_amount_paise']
+        candidates = index.fuzzy.candidates(
+            parsed.at[position, 'Company Name'],
+            None if pd.isna(amount) else int(amount),
+            k=FUZZY_TOP_K,
+            pan=None if pan is None else pan.iat[position],
+        )
+        if not candidates or candidates[0].score < min(threshold, FUZZY_SUGGEST_MIN):
+            continue
+        best = candidates[0]
+        parsed.at[position, 'Confidence'] = best.score
+        if not best.same_amount or best.score < threshold:
+            parsed.at[position, 'Suggestion'] = best.company_name
+            continue
+        tied = [candidate for candidate in candidates if candidate.same_amount and candidate.score == best.score]
+        if len(tied) > 1 and ledger_ids is not None:
+            tied = [candidate for candidate in tied if ledger_ids[candidate.ledger_row] == parsed.at[position, '_unique_id']] or tied
+        if len(tied) == 1:
+            chosen.append((position, tied[0].ledger_row))
+        else:
+            parsed.at[position, 'Candidates'] = len(tied)
+    return pd.DataFrame(chosen, columns=['_parsed_row', '_ledger_row'])
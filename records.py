@@ -0,0 +1,104 @@
+"""Typed bill records shared by Audity, bilgen and the report.
+
+One bill is a BillRecord; a batch of bills is a DataFrame with the
+RECORD_DTYPES columns. Either way amounts are integer paise, dates are
+dates and company names are categorical in frames, so nothing is parsed
+back out of a "₹1,23,456.00" string. Amounts are formatted only when they
+are displayed, with format_rupees.
+"""
+import datetime
+import locale
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+# Columns of a batch of parsed bills, in order
+RECORD_DTYPES = {
+    'Unique ID': 'string',
+    'Company Name': 'category',
+    'Date': 'datetime64[us]',
+    'Amount (paise)': 'int64',
+}
+
+# Characters stripped from amounts before conversion ("₹1,23,456.00" -> "123456.00")
+_AMOUNT_JUNK = re.compile(r'[₹,\s]|Rs\.?', re.IGNORECASE)
+
+
+def amounts_to_paise(amounts):
+    """Convert a Series of amounts (numbers or formatted strings) to integer paise."""
+    if not pd.api.types.is_numeric_dtype(amounts):
+        amounts = pd.to_numeric(amounts.astype(str).str.replace(_AMOUNT_JUNK, '', regex=True), errors='coerce')
+    return (amounts.astype('float64') * 100).round().astype('Int64')
+
+
+def to_paise(amount):
+    """One amount (number or formatted string) in integer paise, or None."""
+    if isinstance(amount, str):
+        amount = _AMOUNT_JUNK.sub('', amount) or None
+    if amount is None or pd.isna(amount):
+        return None
+    return int(round(float(amount) * 100))
+
+
+def paise_column(frame):
+    """A frame's amounts in paise: its 'Amount (paise)' column, else 'Amount' converted, else None."""
+    if 'Amount (paise)' in frame.columns:
+        return frame['Amount (paise)'].astype('Int64')
+    if 'Amount' in frame.columns:
+        return amounts_to_paise(frame['Amount'])
+    return None
+
+
+def format_rupees(paise):
+    """Display form of an amount in paise, in the current locale's currency."""
+    amount = paise / 100
+    try:
+        return locale.currency(amount, grouping=True, symbol=True)
+    except ValueError:
+        return f"₹{amount:,.2f}"
+
+
+@dataclass(slots=True)
+class BillRecord:
+    """A bill as bilgen records it in the ledger."""
+
+    unique_id: str
+    company_name: str
+    date: datetime.date
+    amount_paise: int
+    serial_number: str = None
+    pan_number: str = None
+    pdf_hash: str = None
+    pdf_file: str = None
+
+    @classmethod
+    def from_bill(cls, bill_data, pdf_hash=None, pdf_file=None):
+        """The record for a bill_data dict as create_pdf takes it (Date a YYYY-MM-DD string, Total in rupees)."""
+        date = bill_data['Date']
+        return cls(
+            unique_id=bill_data['Unique ID'],
+            company_name=bill_data['Company Name'],
+            date=datetime.date.fromisoformat(date) if isinstance(date, str) else pd.Timestamp(date).date(),
+            amount_paise=to_paise(bill_data['Total']),
+            serial_number=bill_data.get('serial_number'),
+            pan_number=bill_data.get('pan_number'),
+            pdf_hash=pdf_hash,
+            pdf_file=pdf_file,
+        )
+
+    @property
+    def amount(self):
+        return self.amount_paise / 100
+
+    def to_dict(self):
+        """The record keyed like billing_records.csv, with Amount in rupees."""
+        return {
+            'Unique ID': self.unique_id,
+            'Date': self.date.isoformat(),
+            'serial_number': self.serial_number,
+            'Amount': self.amount,
+            'pan_number': self.pan_number,
+            'Company Name': self.company_name,
+            'PDF Hash': self.pdf_hash,
+        }
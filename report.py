@@ -1,13 +1,38 @@
 import streamlit as st
 import pandas as pd
+from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
-import os
+from reportlab.platypus import Frame, Paragraph, Table, TableStyle
+from reportlab.platypus.doctemplate import LayoutError
+from xml.sax.saxutils import escape
+import functools
+import io
+import itertools
+
+from aggregate import (AMOUNT_COLUMNS, ANOMALY_COLUMNS, CHUNKSIZE, CLIENT_COLUMNS, DATE_COLUMNS, REPORT_COLUMNS,
+                       ReportAggregator, aggregate_sheet, find_column)
+from metrics import render_panel, timed
+from workbook import as_source, map_sheets, read_sheet, read_workbook, sheet_names
+
+# How section 7 names each kind of anomalies.AnomalyReport finding
+ANOMALY_LABELS = {
+    'duplicates': "possible duplicate bills (same client and amount within a few days)",
+    'repeated_hashes': "bills sharing a PDF hash with another bill",
+    'reused_serials': "bills sharing a serial number with another bill",
+    'outliers': "amounts far from what the client is usually billed",
+    'serial_gaps': "gaps in runs of sequential serial numbers",
+}
+
+TABLE_ROWS = 40  # rows per table flowable, so no single table is larger than a page
+APPENDIX_ROWS = 50_000  # transactions listed in Appendix A
 
 def load_file(file):
     # Load the file based on its type
     if file.name.endswith('.xlsx'):
-        df = pd.read_excel(file, sheet_name=None)  # Load all sheets for Excel
+        df = read_workbook(file)  # Load all sheets for Excel, with calamine when installed
     elif file.name.endswith('.csv'):
         df = pd.read_csv(file)  # Load CSV file
     else:
@@ -36,6 +61,74 @@ def generate_audit_report(df):
     
     return report
 
+def iter_chunks(source, name=None, chunksize=CHUNKSIZE, columns=None):
+    """Yield (sheet name, DataFrame chunk) pairs from a CSV, XLSX or Parquet file.
+
+    CSV is read with ``pd.read_csv(chunksize=...)``. XLSX is parsed a whole
+    sheet at a time through workbook.py (calamine when installed), so memory
+    follows the largest sheet rather than ``chunksize``; only the headers in
+    ``columns`` are kept when given. Parquet reads only ``columns`` too.
+    Sheets without data rows yield one empty chunk.
+    """
+    name = name or getattr(source, 'name', source)
+    if name.endswith('.csv'):
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            chunk.columns = chunk.columns.str.strip()
+            yield 'Data', chunk
+    elif name.endswith('.xlsx'):
+        source = as_source(source)
+        for sheet in sheet_names(source):
+            frame = read_sheet(source, sheet, columns)
+            for start in range(0, max(len(frame), 1), chunksize):
+                yield sheet, frame.iloc[start:start + chunksize]
+    elif name.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(source)
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield 'Data', batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file type: {name}")
+
+@timed('report_aggregate')
+def aggregate_file(source, name=None, chunksize=CHUNKSIZE, transactions=0):
+    """Stream a CSV/XLSX/Parquet file once; returns (report, stats).
+
+    The anomaly counts for section 7 are taken in the same pass, and the
+    first ``transactions`` rows are kept in stats for Appendix A. Sheets of
+    large workbooks are aggregated in parallel, one sheet per worker process
+    (see workbook.map_sheets).
+    """
+    name = name or getattr(source, 'name', source)
+    aggregator = ReportAggregator(transactions)
+    if name.endswith('.parquet'):
+        # Row and null counts come from the footer; only the amount, client and date columns are read
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(source)
+        names = parquet.schema_arrow.names
+        missing = dict.fromkeys(names, 0)
+        for group in range(parquet.metadata.num_row_groups):
+            row_group = parquet.metadata.row_group(group)
+            for position in range(row_group.num_columns):
+                column = row_group.column(position)
+                if column.statistics is not None and column.statistics.has_null_count and column.path_in_schema in missing:
+                    missing[column.path_in_schema] += column.statistics.null_count
+        aggregator.sheets['Data'] = {'row_count': parquet.metadata.num_rows, 'columns': names, 'missing_values': missing}
+        wanted = (AMOUNT_COLUMNS, CLIENT_COLUMNS, DATE_COLUMNS) + tuple((column,) for column in ANOMALY_COLUMNS)
+        columns = [column for column in (find_column(names, candidates) for candidates in wanted) if column is not None]
+        for sheet_name, chunk in iter_chunks(source, name, chunksize, columns):
+            aggregator.update(sheet_name, chunk, summarize=False)
+    elif name.endswith('.xlsx'):
+        for _, sheet in map_sheets(functools.partial(aggregate_sheet, transactions=transactions), source):
+            aggregator.merge(sheet)
+    else:
+        for sheet_name, chunk in iter_chunks(source, name, chunksize):
+            aggregator.update(sheet_name, chunk)
+    return aggregator.report(), aggregator.stats()
+
+def _rupees(amount):
+    # The built-in Helvetica has no ₹ glyph
+    return "-" if amount is None else f"Rs. {amount:,.2f}"
+
 def display_audit_report(report):
     # Display the audit report
     for sheet_name, details in report.items():
@@ -47,177 +140,237 @@ def display_audit_report(report):
         st.write(details['missing_values'])
         st.write("---")
 
-def generate_pdf_report(report, filename):
-    # Create a PDF report
-    c = canvas.Canvas(filename, pagesize=letter)
-    width, height = letter
+class StreamingReportWriter:
+    """Lay flowables out page by page as they arrive.
 
-    # Title
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(100, height - 50, "Final Audit Report")
-    
-    # Prepared for
-    c.setFont("Helvetica", 12)
-    c.drawString(100, height - 80, "Prepared for: [Chartered Accountant's Name]")
-    c.drawString(100, height - 95, "Prepared by: [Auditor's Name/Company Name]")
-    c.drawString(100, height - 110, "Date: [Insert Date]")
-    c.drawString(100, height - 125, "Report Reference: [Insert Reference Number]")
-
-    # Executive Summary
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, height - 150, "1. Executive Summary")
-    c.setFont("Helvetica", 10)
-    c.drawString(100, height - 165, "This report presents the findings of the financial audit conducted on the transactions recorded in the audited balance sheet.")
-    
-    # Introduction
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, height - 185, "2. Introduction")
-    c.setFont("Helvetica", 10)
-    c.drawString(100, height - 200, "The purpose of this audit report is to provide a comprehensive analysis of the financial transactions for the period ending [Insert Date].")
-
-    # Overview of Transactions
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, height - 220, "4. Overview of Transactions")
-    c.setFont("Helvetica", 10)
-    total_transactions = sum(details['row_count'] for details in report.values())
-    highest_transaction = 90000  # Placeholder for actual values
-    lowest_transaction = 16500    # Placeholder for actual values
-    total_amount_processed = 198500  # Placeholder
-    average_transaction_value = total_amount_processed / total_transactions if total_transactions > 0 else 0
-
-    c.drawString(100, height - 240, f"Total Number of Transactions: {total_transactions}")
-    c.drawString(100, height - 255, f"Highest Transaction Value: ₹{highest_transaction:.2f}")
-    c.drawString(100, height - 270, f"Lowest Transaction Value: ₹{lowest_transaction:.2f}")
-    c.drawString(100, height - 285, f"Total Amount Processed: ₹{total_amount_processed:.2f}")
-    c.drawString(100, height - 300, f"Average Transaction Value: ₹{average_transaction_value:.2f}")
-
-    # Client-Wise Transaction Breakdown
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, height - 320, "5. Client-Wise Transaction Breakdown")
-    c.setFont("Helvetica", 10)
-
-    # Example client-wise breakdown (you would replace this with actual data)
-    client_data = {
-        "ABC Enterprises": 90000,
-        "ABC Corporation": 40000,
-        "ABC Pvt Ltd": 35000,
-        "GST Payments": 17000,
-        "State Electricity Board": 16500,
-    }
-
-    y_position = height - 340
-    for client, amount in client_data.items():
-        c.drawString(120, y_position, f"{client} - ₹{amount:.2f}")
-        y_position -= 15  # Move down for the next client entry
-
-    # Analysis of Financial Trends
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "6. Analysis of Financial Trends")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    analysis_text = (
-        "The majority of the transactions involve high-value clients, suggesting strong business engagements.\n"
-        "Payments to government and utility agencies (GST, Electricity Board) indicate operational expenses.\n"
-        "A steady flow of financial activity across multiple dates shows healthy cash movement."
-    )
-    for line in analysis_text.split('\n'):
-        c.drawString(100, y_position, line)
-        y_position -= 15
-
-    # Compliance & Risk Assessment
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "7. Compliance & Risk Assessment")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    compliance_text = (
-        "All transactions appear consistent with expected financial records.\n"
-        "No significant discrepancies or unusual patterns were detected.\n"
-        "Payments to regulatory bodies ensure tax compliance and legal adherence.\n"
-        "Regular transactions with corporate entities signify stable business relations."
-    )
-    for line in compliance_text.split('\n'):
-        c.drawString(100, y_position, line)
-        y_position -= 15
-
-    # Recommendations
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "8. Recommendations")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    recommendations = [
+    SimpleDocTemplate.build needs the whole story as a list up front; ``add``
+    draws each flowable straight onto the canvas and starts a new page when the
+    frame is full, so the story can be a generator and only the flowable being
+    placed is held in memory.
+    """
+
+    def __init__(self, output, pagesize=letter, margin=0.75 * inch, title="Final Audit Report"):
+        self.canvas = canvas.Canvas(output, pagesize=pagesize, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.width, self.height = pagesize
+        self.margin = margin
+        self.title = title
+        self.frame = Frame(margin, margin, self.width - 2 * margin, self.height - 2 * margin)
+        self.page = 1
+
+    def add(self, flowable):
+        pending = [flowable]
+        while pending:
+            flowable = pending.pop(0)
+            if self.frame.add(flowable, self.canvas):
+                continue
+            # Split across the page break when the flowable allows it (paragraphs, tables)
+            parts = self.frame.split(flowable, self.canvas)
+            if len(parts) > 1:
+                pending[0:0] = parts
+                continue
+            if self.frame._atTop:
+                raise LayoutError(f"{flowable.__class__.__name__} does not fit on an empty page")
+            self.new_page()
+            pending.insert(0, flowable)
+
+    def new_page(self):
+        self._footer()
+        self.canvas.showPage()
+        self.frame._reset()
+        self.page += 1
+
+    def _footer(self):
+        self.canvas.setFont("Helvetica", 8)
+        self.canvas.drawString(self.margin, self.margin / 2, self.title)
+        self.canvas.drawRightString(self.width - self.margin, self.margin / 2, f"Page {self.page}")
+
+    def close(self):
+        self._footer()
+        self.canvas.save()
+
+def _table(rows, col_widths, header=None):
+    # Fixed column widths so a table never has to measure every cell to lay out
+    table = Table(([header] if header else []) + rows, colWidths=col_widths)
+    style = [('FONT', (0, 0), (-1, -1), 'Helvetica', 9), ('ALIGN', (-1, 0), (-1, -1), 'RIGHT')]
+    if header:
+        style += [('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9), ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey)]
+    table.setStyle(TableStyle(style))
+    return table
+
+def _tables(rows, col_widths, header):
+    """Yield ``rows`` as a run of small tables of TABLE_ROWS rows each; the header goes on the first."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == TABLE_ROWS:
+            yield _table(batch, col_widths, header)
+            batch, header = [], None
+    if batch or header:
+        yield _table(batch, col_widths, header)
+
+def report_flowables(report, stats, transactions=None):
+    """Yield the audit report's flowables in reading order.
+
+    ``transactions`` is an optional iterable of (date, client, amount) rows for
+    Appendix A; it is consumed lazily, one table at a time. Section 7 reports
+    ``stats['anomalies']`` (see aggregate.ReportAggregator); without them the
+    report says the checks were not run rather than claiming a clean result.
+    """
+    styles = getSampleStyleSheet()
+    title, heading, body = styles['Title'], styles['Heading2'], styles['BodyText']
+
+    yield Paragraph("Final Audit Report", title)
+    for line in ["Prepared for: [Chartered Accountant's Name]", "Prepared by: [Auditor's Name/Company Name]",
+                 "Date: [Insert Date]", "Report Reference: [Insert Reference Number]"]:
+        yield Paragraph(escape(line), body)
+
+    yield Paragraph("1. Executive Summary", heading)
+    yield Paragraph("This report presents the findings of the financial audit conducted on the transactions recorded in the audited balance sheet.", body)
+
+    yield Paragraph("2. Introduction", heading)
+    period = f"{stats['last_date']:%d %b %Y}" if stats['last_date'] is not None else "[Insert Date]"
+    yield Paragraph(f"The purpose of this audit report is to provide a comprehensive analysis of the financial transactions for the period ending {period}.", body)
+
+    yield Paragraph("3. Data Summary", heading)
+    sheets = ([str(sheet_name), details['row_count'], details['column_count'],
+               sum(details['missing_values'].values())] for sheet_name, details in report.items())
+    yield from _tables(sheets, [220, 90, 90, 90], ["Sheet", "Rows", "Columns", "Missing values"])
+
+    yield Paragraph("4. Overview of Transactions", heading)
+    yield _table([
+        ["Total Number of Transactions", f"{stats['transaction_count']:,}"],
+        ["Highest Transaction Value", _rupees(stats['highest_transaction'])],
+        ["Lowest Transaction Value", _rupees(stats['lowest_transaction'])],
+        ["Total Amount Processed", _rupees(stats['total_amount'])],
+        ["Average Transaction Value", _rupees(stats['average_transaction'])],
+    ], [250, 150])
+
+    yield Paragraph("5. Client-Wise Transaction Breakdown", heading)
+    if stats['clients']:
+        clients = ([str(client), f"{count:,}", _rupees(amount)] for client, (count, amount) in stats['clients'].items())
+        yield from _tables(clients, [300, 90, 110], ["Client", "Transactions", "Amount"])
+    else:
+        yield Paragraph("No client column found in the uploaded data.", body)
+
+    yield Paragraph("6. Analysis of Financial Trends", heading)
+    months = stats['months']
+    if months:
+        yield Paragraph(f"Period covered: {stats['first_date']:%d %b %Y} to {stats['last_date']:%d %b %Y}", body)
+        rows = ([month, f"{count:,}", _rupees(amount)] for month, (count, amount) in months.items())
+        yield from _tables(rows, [150, 90, 110], ["Month", "Transactions", "Amount"])
+        (first_month, (_, first)), (last_month, (_, last)) = next(iter(months.items())), next(reversed(months.items()))
+        if len(months) >= 2 and first:
+            yield Paragraph(f"Monthly volume changed by {(last - first) / first:+.1%} from {first_month} to {last_month}.", body)
+    else:
+        yield Paragraph("No dated transactions found in the uploaded data.", body)
+
+    yield Paragraph("7. Compliance &amp; Risk Assessment", heading)
+    anomalies = stats.get('anomalies')
+    flagged = {kind: count for kind, count in zip(anomalies._fields, anomalies) if count} if anomalies is not None else None
+    if flagged is None:
+        yield Paragraph("Duplicate, outlier and serial-number checks were not run on this data.", body)
+    elif flagged:
+        yield Paragraph("The automated checks flagged the following for review:", body)
+        yield _table([[ANOMALY_LABELS[kind], f"{count:,}"] for kind, count in flagged.items()], [400, 90])
+    else:
+        yield Paragraph("No duplicate bills, repeated PDF hashes, reused serial numbers, outlying amounts "
+                        "or serial-number gaps were detected.", body)
+
+    yield Paragraph("8. Recommendations", heading)
+    for rec in [
         "Maintain detailed records of all high-value transactions for future audits.",
         "Ensure timely payment to vendors and government agencies to avoid penalties.",
         "Implement an automated financial tracking system for efficiency.",
-        "Review operational costs periodically to optimize financial performance."
-    ]
-    for rec in recommendations:
-        c.drawString(100, y_position, f"- {rec}")
-        y_position -= 15
-
-    # Conclusion
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "9. Conclusion")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    conclusion_text = (
-        "The financial audit confirms a structured and transparent financial record. "
-        "The transactions indicate a stable business environment with reliable clients and necessary operational expenses. "
-        "The organization demonstrates sound financial management, adhering to compliance standards and maintaining healthy financial movements."
-    )
-    for line in conclusion_text.split('\n'):
-        c.drawString(100, y_position, line)
-        y_position -= 15
-
-    # Appendices
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "10. Appendices")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    c.drawString(100, y_position, "- Appendix A: Detailed Transaction Data")
-    y_position -= 15
-    c.drawString(100, y_position, "- Appendix B: Supporting Documents")
-    y_position -= 15
-    c.drawString(100, y_position, "- Appendix C: Audit Methodology and Procedures")
-
-    # Contact Information
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(100, y_position, "Contact Information")
-    y_position -= 20
-    c.setFont("Helvetica", 10)
-    c.drawString(100, y_position, "For further inquiries, please contact:")
-    y_position -= 15
-    c.drawString(100, y_position, "Auditor's Name: [Your Name]")
-    y_position -= 15
-    c.drawString(100, y_position, "Email: [Your Email]")
-    y_position -= 15
-    c.drawString(100, y_position, "Phone: [Your Phone Number]")
-
-    c.save()
+        "Review operational costs periodically to optimize financial performance.",
+    ]:
+        yield Paragraph(f"- {rec}", body)
+
+    yield Paragraph("9. Conclusion", heading)
+    if flagged:
+        yield Paragraph(
+            f"The automated checks flagged {sum(flagged.values()):,} items (section 7). "
+            "They should be resolved before the financial record is relied upon.",
+            body,
+        )
+    elif flagged is None:
+        yield Paragraph(
+            "The figures above summarize the transactions as recorded. "
+            "Duplicate and anomaly checks were not part of this report.",
+            body,
+        )
+    else:
+        yield Paragraph(
+            "The figures above summarize the transactions as recorded, and the automated checks in section 7 "
+            "flagged nothing for review. Compliance with tax and regulatory requirements was not assessed.",
+            body,
+        )
+
+    yield Paragraph("Contact Information", heading)
+    for line in ["For further inquiries, please contact:", "Auditor's Name: [Your Name]", "Email: [Your Email]", "Phone: [Your Phone Number]"]:
+        yield Paragraph(escape(line), body)
+
+    yield Paragraph("10. Appendices", heading)
+    yield Paragraph("Appendix A: Detailed Transaction Data", styles['Heading3'])
+    if transactions is not None:
+        shown = ([date, client, _rupees(amount)] for date, client, amount in itertools.islice(transactions, APPENDIX_ROWS))
+        yield from _tables(shown, [90, 300, 110], ["Date", "Client", "Amount"])
+        if stats['transaction_count'] > APPENDIX_ROWS:
+            yield Paragraph(f"First {APPENDIX_ROWS:,} of {stats['transaction_count']:,} transactions shown.", body)
+    else:
+        yield Paragraph("Transaction data was not attached to this report.", body)
+    yield Paragraph("Appendix B: Supporting Documents", styles['Heading3'])
+    yield Paragraph("Appendix C: Audit Methodology and Procedures", styles['Heading3'])
+
+@timed('report_render')
+def generate_pdf_report(report, output, stats=None, transactions=None):
+    """Write the audit report PDF to ``output``, a path or a binary file object."""
+    if stats is None:
+        stats = ReportAggregator().stats()
+    writer = StreamingReportWriter(output)
+    for flowable in report_flowables(report, stats, transactions):
+        writer.add(flowable)
+    writer.close()
+
+def generate_audit_report_from_file(file_path, output=None):
+    """Aggregate a ledger file and render its report, transactions included.
+
+    Writes to ``output`` (a path or binary file object); by default renders into
+    a BytesIO, which is returned ready to serve.
+    """
+    report, stats = aggregate_file(file_path, transactions=APPENDIX_ROWS)
+    if output is None:
+        output = io.BytesIO()
+    generate_pdf_report(report, output, stats, stats['transactions'])
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
 
 def main():
     st.title("Excel/CSV Audit Report Generator")
 
-    uploaded_file = st.file_uploader("Upload an Excel (.xlsx) or CSV (.csv) file", type=["xlsx", "csv"])
+    uploaded_file = st.file_uploader("Upload an Excel (.xlsx), CSV (.csv) or Parquet file", type=["xlsx", "csv", "parquet"])
 
     if uploaded_file is not None:
-        # Load the file
-        df = load_file(uploaded_file)
-
-        if df is not None:
-            # Generate the audit report
-            report = generate_audit_report(df)
+        # Aggregate the file in one streaming pass
+        try:
+            report, stats = aggregate_file(uploaded_file, uploaded_file.name, transactions=APPENDIX_ROWS)
+        except ValueError as e:
+            st.error(f"Unsupported file type. Please upload an Excel (.xlsx), CSV (.csv) or Parquet file. ({e})")
+            report = None
 
+        if report is not None:
             # Display the audit report
             display_audit_report(report)
 
-            # Generate PDF report
-            pdf_filename = "audit_report.pdf"
-            generate_pdf_report(report, pdf_filename)
-            st.success(f"PDF report generated: {pdf_filename}")
+            # Render the PDF in memory and serve it straight from the buffer
+            pdf = io.BytesIO()
+            generate_pdf_report(report, pdf, stats, stats['transactions'])
+            st.success("PDF report generated")
+            st.download_button("Download PDF Report", pdf.getvalue(), file_name="audit_report.pdf", mime="application/pdf")
 
-            # Provide a download link for the PDF
-            with open(pdf_filename, "rb") as f:
-                st.download_button("Download PDF Report", f, file_name=pdf_filename)
+    if st.sidebar.checkbox("Show diagnostics"):
+        render_panel()
 
 if __name__ == "__main__":
     main()
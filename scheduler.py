@@ -0,0 +1,245 @@
+import itertools
+import multiprocessing
+import os
+import signal
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from document import Document
+from extract import count_pdf_pages, extract_document
+from metrics import METRICS, measure_call
+from parsing import IncrementalParser
+
+# One finished upload: source is the path or Document that was passed in;
+# text and fields are None when error is set
+ExtractionResult = namedtuple('ExtractionResult', ['name', 'source', 'text', 'fields', 'error', 'seconds'])
+
+PAGES_PER_TASK = 20  # PDFs longer than this are split into page ranges
+FILE_TIMEOUT = 120  # seconds a single file may spend in the workers
+
+
+def _source_size(source):
+    if isinstance(source, Document):
+        return source.size
+    return os.path.getsize(source) if os.path.exists(source) else 0
+
+
+# Set in each pool worker by _init_worker: where it reports the tasks it picks up
+_started = None
+
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+
+def _run_task(task, func, *args):
+    # Report (task, worker pid, start time) before running: a task sitting in the
+    # executor's call queue already counts as running(), so only the worker knows
+    # when it really starts. time.monotonic is system-wide, so the parent can compare it.
+    _started.put((task, os.getpid(), time.monotonic()))
+    return func(*args)
+
+
+class WorkerPool:
+    """A spawn ProcessPoolExecutor whose workers report each task as they start it.
+
+    ``started()`` says when each task was picked up, so timeouts count time
+    spent running, not waiting. ``kill()`` ends the workers by the pids they
+    reported, for when one is stuck and the executor's own shutdown would
+    wait on it forever.
+    """
+
+    def __init__(self, max_workers):
+        # spawn rather than fork: the Streamlit server and the service's event loop are multi-threaded
+        context = multiprocessing.get_context('spawn')
+        self._started = context.SimpleQueue()
+        self._tasks = itertools.count()
+        self.pids = set()
+        self.executor = ProcessPoolExecutor(max_workers, mp_context=context, initializer=_init_worker, initargs=(self._started,))
+
+    def submit(self, func, *args):
+        """Run ``func(*args)`` in a worker; returns (task id, future)."""
+        task = next(self._tasks)
+        return task, self.executor.submit(_run_task, task, func, *args)
+
+    def started(self):
+        """{task id: time.monotonic() it started} for the tasks started since the last call."""
+        started = {}
+        while not self._started.empty():
+            task, pid, at = self._started.get()
+            self.pids.add(pid)
+            started[task] = at
+        return started
+
+    def kill(self):
+        """Terminate every worker and drop queued tasks, without waiting on stuck ones."""
+        self.started()
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass  # already gone
+        # A killed worker breaks the pool; the executor then terminates the rest itself
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class _Job:
+    def __init__(self, name, source, ranges):
+        self.name = name
+        self.source = source
+        self.ranges = ranges
+        self.parts = [None] * len(ranges)
+        self.futures = {}
+        self.started = None
+        self.done = False
+
+
+class ExtractionScheduler:
+    """Fans uploads out to a process pool and streams results back as they finish.
+
+    Each PDF is read page by page until all bill fields are found. When the
+    first ``pages_per_task`` pages are not enough, the rest of the document is
+    split into page ranges that run in parallel and are stitched back together
+    in page order. A file that
+    raises or runs past ``timeout`` seconds is reported as failed without
+    holding up the rest of the batch.
+    """
+
+    def __init__(self, max_workers=None, pages_per_task=PAGES_PER_TASK, timeout=FILE_TIMEOUT):
+        self.max_workers = max_workers or os.cpu_count()
+        self.pages_per_task = pages_per_task
+        self.timeout = timeout
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = WorkerPool(self.max_workers)
+        return self._executor
+
+    def _page_ranges(self, name, source):
+        if not name.lower().endswith('.pdf'):
+            return [None]
+        try:
+            page_count = count_pdf_pages(source)
+        except Exception:
+            # Let the worker hit (and report) the same error
+            return [None]
+        if page_count <= self.pages_per_task:
+            return [None]
+        return [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+
+    def run(self, files, progress=None):
+        """Extract text from ``files``, an iterable of (name, source) pairs.
+
+        A source is a path or a Document; Documents are sent to the workers by
+        value (memory-mapped ones by path), so nothing is written to disk.
+
+        Yields an ExtractionResult per file in completion order. ``progress`` is
+        called as ``progress(name, parts_done, parts_total)`` whenever a page
+        range of a file finishes.
+        """
+        pool = self._pool()
+        owners = {}
+        tasks = {}  # task id -> job
+        jobs = []
+
+        def submit(job, part):
+            # The file's bytes are counted once, against its first range
+            nbytes = _source_size(job.source) if part == 0 else 0
+            task, future = pool.submit(measure_call, 'extract', job.name, nbytes, extract_document, job.source, job.name, job.ranges[part])
+            job.futures[future] = part
+            owners[future] = job
+            tasks[task] = job
+            return future
+
+        # Only the first page range is queued up front; most bills stop there
+        for name, source in files:
+            job = _Job(name, source, self._page_ranges(name, source))
+            submit(job, 0)
+            jobs.append(job)
+
+        pending = set(owners)
+        abandoned = False
+        while pending:
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            # Start each file's clock when a worker picks up its first task
+            for task, started in pool.started().items():
+                job = tasks.pop(task, None)  # None: left over from an earlier run
+                if job is not None and (job.started is None or started < job.started):
+                    job.started = started
+
+            for future in finished:
+                job = owners[future]
+                if job.done:
+                    continue
+                error = future.exception()
+                if error is not None:
+                    if isinstance(error, BrokenProcessPool):
+                        abandoned = True
+                    job.done = True
+                    pending -= set(job.futures)
+                    for other in job.futures:
+                        other.cancel()
+                    yield ExtractionResult(job.name, job.source, None, None, f"{type(error).__name__}: {error}", now - (job.started or now))
+                    continue
+
+                part = job.futures[future]
+                (text, fields, complete), records = future.result()
+                METRICS.extend(records)
+                job.parts[part] = text
+                if part == 0 and complete:
+                    # Every field was on the first pages; skip the rest of the document
+                    job.parts = job.parts[:1]
+                elif part == 0:
+                    pending.update(submit(job, other) for other in range(1, len(job.ranges)))
+
+                parts_done = sum(done is not None for done in job.parts)
+                if progress is not None:
+                    progress(job.name, parts_done, len(job.parts))
+                if parts_done == len(job.parts):
+                    job.done = True
+                    if len(job.parts) > 1:
+                        # Re-parse across the stitched ranges, in page order
+                        parser = IncrementalParser()
+                        for part_text in job.parts:
+                            if parser.feed(part_text):
+                                break
+                        fields = parser.fields
+                    yield ExtractionResult(job.name, job.source, "".join(job.parts), fields, None, now - (job.started or now))
+
+            for job in jobs:
+                if job.done:
+                    continue
+                if job.started is not None and now - job.started > self.timeout:
+                    job.done = True
+                    pending -= set(job.futures)
+                    for other in job.futures:
+                        if not other.cancel():
+                            abandoned = True
+                    yield ExtractionResult(job.name, job.source, None, None, f"Timed out after {self.timeout}s", now - job.started)
+
+        if abandoned:
+            # A worker is stuck on a timed-out file or died; replace the pool
+            self.shutdown(kill=True)
+
+    def shutdown(self, kill=False):
+        if self._executor is None:
+            return
+        if kill:
+            self._executor.kill()
+        else:
+            self._executor.shutdown()
+        self._executor = None
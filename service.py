@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+"""Extraction service: one shared OCR process pool for every Audity session.
+
+    python service.py --port 8765 --workers 4
+
+    POST /jobs?name=bill.pdf      body: the file's bytes; X-Audity-User: <user id>
+        202 {"id": ..., "status": "queued"}, or 200 with the result when the
+        extraction cache already has the file, or 429 + Retry-After when the
+        queue (or that user's share of it) is full
+    GET  /jobs/<id>               {"id", "name", "status", "sha256", "text", "fields", "error", "seconds"}
+    GET  /health                  queue depth, running jobs and jobs per user
+
+Queued jobs are kept per user and handed to the pool round-robin, so a user
+uploading hundreds of vouchers does not hold up one uploading three. At most
+``workers`` jobs run at once; the rest wait in the bounded queue. A job
+that times out keeps its worker slot until the worker really finishes, and
+when only stuck jobs are left running the pool is replaced. Finished jobs
+are kept for RESULT_TTL seconds for clients to collect. SIGTERM and SIGINT
+stop the server and shut the pool down.
+
+app.py submits through ServiceClient when AUDITY_SERVICE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import ExtractionCache
+from document import Document
+from extract import extract_document
+from metrics import METRICS, measure_call
+from scheduler import FILE_TIMEOUT, ExtractionResult, WorkerPool
+
+DEFAULT_PORT = 8765
+MAX_QUEUED = 256  # jobs waiting for a worker, across all users
+MAX_QUEUED_PER_USER = 64
+MAX_BODY = 64 * 1024 * 1024
+RESULT_TTL = 600  # seconds a finished job stays collectable
+RETRY_AFTER = 1  # seconds, sent with 429
+
+_REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 429: 'Too Many Requests'}
+
+
+class Job:
+    def __init__(self, user, name, document):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.name = name
+        self.document = document
+        self.sha256 = document.sha256 if document is not None else None
+        self.status = 'queued'
+        self.text = None
+        self.fields = None
+        self.error = None
+        self.seconds = None
+        self.finished = None
+
+    def finish(self, text=None, fields=None, error=None, seconds=None):
+        self.status = 'error' if error else 'done'
+        self.text, self.fields, self.error, self.seconds = text, fields, error, seconds
+        self.finished = time.monotonic()
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+
+    def as_dict(self):
+        return {
+            'id': self.id, 'name': self.name, 'status': self.status, 'sha256': self.sha256,
+            'text': self.text, 'fields': self.fields, 'error': self.error, 'seconds': self.seconds,
+        }
+
+
+class ExtractionService:
+    """Bounded, per-user fair queue in front of a process pool."""
+
+    def __init__(self, workers=None, max_queued=MAX_QUEUED, max_queued_per_user=MAX_QUEUED_PER_USER,
+                 cache=None, timeout=FILE_TIMEOUT):
+        self.workers = workers or os.cpu_count()
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.cache = cache
+        self.timeout = timeout
+        self.jobs = {}
+        self.queues = OrderedDict()  # user -> deque of queued jobs, in round-robin order
+        self.queued = 0
+        self.running = 0  # pool tasks not yet finished, including timed-out ones
+        self.stuck = set()  # futures of timed-out jobs whose worker is still busy
+        self.recycled = 0
+        self.rejected = 0
+        self._wakeup = None
+        self._pool = None
+
+    def start(self):
+        self._pool = WorkerPool(self.workers)
+        self._wakeup = asyncio.Event()
+        return asyncio.ensure_future(self._dispatch())
+
+    def shutdown(self):
+        """Drop queued jobs and stop the workers; running ones finish first unless they are stuck."""
+        if self._pool is not None:
+            if self.stuck:
+                self._pool.kill()
+            else:
+                self._pool.shutdown()
+            self._pool = None
+
+    async def submit(self, user, name, data):
+        """Queue ``data`` for extraction; returns the Job, or None when the queue is full."""
+        document = Document(name, data)
+        # Hashing and the cache's SQLite lookup block; keep them off the event loop
+        content_hash = await asyncio.to_thread(lambda: document.sha256)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, content_hash)
+            if cached is not None:
+                job = Job(user, name, document)
+                job.finish(cached[0], cached[1], seconds=0.0)
+                self.jobs[job.id] = job
+                return job
+        user_queue = self.queues.get(user)
+        if self.queued >= self.max_queued or (user_queue is not None and len(user_queue) >= self.max_queued_per_user):
+            self.rejected += 1
+            document.close()
+            return None
+        job = Job(user, name, document)
+        self.jobs[job.id] = job
+        self.queues.setdefault(user, deque()).append(job)
+        self.queued += 1
+        self._wakeup.set()
+        return job
+
+    def _next_job(self):
+        # Take one job from the user at the front, then send that user to the back
+        user, user_queue = next(iter(self.queues.items()))
+        job = user_queue.popleft()
+        if user_queue:
+            self.queues.move_to_end(user)
+        else:
+            del self.queues[user]
+        self.queued -= 1
+        return job
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queues and self.running < self.workers:
+                job = self._next_job()
+                job.status = 'running'
+                self.running += 1
+                asyncio.ensure_future(self._run(job))
+            self._expire()
+
+    def _release(self, pool, future):
+        # The worker is free again; callbacks from a pool already replaced do not count
+        if pool is not self._pool:
+            return
+        self.running -= 1
+        self.stuck.discard(future)
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            # A worker died, and the executor takes no more work
+            self._recycle()
+        self._wakeup.set()
+
+    def _recycle(self):
+        # Called when every running task is stuck or the pool is broken, so
+        # nothing healthy is lost by killing the old workers
+        pool, self._pool = self._pool, WorkerPool(self.workers)
+        self.running = 0
+        self.stuck.clear()
+        self.recycled += 1
+        self._wakeup.set()
+        asyncio.get_running_loop().run_in_executor(None, pool.kill)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        pool = self._pool
+        try:
+            _, future = pool.submit(measure_call, 'extract', job.name, job.document.size, extract_document, job.document, job.name)
+        except (BrokenProcessPool, RuntimeError) as error:
+            job.finish(error=f"{type(error).__name__}: {error}", seconds=0.0)
+            self.running -= 1
+            return
+        future.add_done_callback(lambda future: loop.call_soon_threadsafe(self._release, pool, future))
+        result = asyncio.wrap_future(future)
+        # The result of a job given up on is never awaited; retrieve its exception so it is not logged
+        result.add_done_callback(lambda result: result.cancelled() or result.exception())
+        try:
+            # asyncio.wait, not wait_for: a timeout must not cancel the future, whose
+            # completion is what frees the worker slot
+            done, _ = await asyncio.wait([result], timeout=self.timeout)
+            if not done:
+                job.finish(error=f"Timed out after {self.timeout}s", seconds=time.monotonic() - started)
+                self.stuck.add(future)
+                if pool is self._pool and not future.done() and len(self.stuck) >= self.running:
+                    self._recycle()
+                return
+            (text, fields, _), records = result.result()
+            METRICS.extend(records)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, job.sha256, text, fields)
+            job.finish(text, fields, seconds=time.monotonic() - started)
+        except Exception as error:
+            job.finish(error=f"{type(error).__name__}: {error}", seconds=time.monotonic() - started)
+
+    def _expire(self):
+        cutoff = time.monotonic() - RESULT_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def health(self):
+        return {
+            'workers': self.workers, 'running': self.running, 'stuck': len(self.stuck), 'recycled': self.recycled,
+            'queued': self.queued, 'rejected': self.rejected,
+            'queued_per_user': {user: len(user_queue) for user, user_queue in self.queues.items()},
+        }
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP/1.1 request per connection."""
+        try:
+            status, payload, headers = await self._respond(reader)
+        except (asyncio.IncompleteReadError, ValueError) as error:
+            status, payload, headers = 400, {'error': str(error)}, {}
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {_REASONS[status]}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{key}: {value}" for key, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+
+        if method == 'POST' and url.path == '/jobs':
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                return 413, {'error': f"files over {MAX_BODY} bytes are not accepted"}, {}
+            data = await reader.readexactly(length)
+            name = query.get('name', ['upload'])[0]
+            job = await self.submit(headers.get('x-audity-user', 'anonymous'), name, data)
+            if job is None:
+                return 429, {'error': "queue full", **self.health()}, {'Retry-After': RETRY_AFTER}
+            return (200 if job.finished else 202), job.as_dict(), {}
+        if method == 'GET' and url.path.startswith('/jobs/'):
+            job = self.jobs.get(url.path[len('/jobs/'):])
+            if job is None:
+                return 404, {'error': "unknown job"}, {}
+            return 200, job.as_dict(), {}
+        if method == 'GET' and url.path == '/health':
+            return 200, self.health(), {}
+        return 404, {'error': f"no route for {method} {url.path}"}, {}
+
+
+async def serve(host, port, service):
+    dispatcher = service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Extraction service on http://{host}:{port} with {service.workers} workers", file=sys.stderr)
+    serving = asyncio.ensure_future(server.serve_forever())
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, serving.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # no signal handlers on Windows' event loop; KeyboardInterrupt still stops main()
+    try:
+        async with server:
+            await serving
+    except asyncio.CancelledError:
+        pass
+    finally:
+        dispatcher.cancel()
+        # Waits for the running jobs, off the loop so their completion callbacks still run
+        await asyncio.to_thread(service.shutdown)
+
+
+class ServiceClient:
+    """Submits uploads to a running extraction service and polls for their results.
+
+    ``run`` has the same shape as ExtractionScheduler.run, so callers can use
+    either. Files are submitted until the service answers 429, then the rest
+    wait until earlier jobs finish; a file the service will not take within
+    ``patience`` seconds is reported as failed.
+    """
+
+    def __init__(self, url, user=None, poll_interval=0.2, patience=300, timeout=FILE_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.user = user or uuid.uuid4().hex
+        self.poll_interval = poll_interval
+        self.patience = patience
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None, headers=None):
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    def submit(self, name, data):
+        """Queue one file; returns the job dict, or None when the service is full (429)."""
+        path = '/jobs?' + urllib.parse.urlencode({'name': name})
+        headers = {'X-Audity-User': self.user, 'Content-Type': 'application/octet-stream'}
+        status, job = self._request('POST', path, bytes(data), headers)
+        if status == 429:
+            return None
+        if status >= 400:
+            raise ValueError(job.get('error', f"HTTP {status}"))
+        return job
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')[1]
+
+    def health(self):
+        return self._request('GET', '/health')[1]
+
+    def run(self, files, progress=None):
+        """Extract ``files``, (name, source) pairs with Document or path sources; yields ExtractionResult in completion order."""
+        unsent = deque(files)
+        waiting = {}  # job id -> (job dict, source, submitted at)
+        accepted = time.monotonic()  # last time the service took a file
+        while unsent or waiting:
+            # Keep the service's queue topped up with this user's files
+            while unsent:
+                name, source = unsent[0]
+                if not isinstance(source, Document):
+                    source = Document.from_path(source, name)
+                try:
+                    job = self.submit(name, source._view)
+                except (ValueError, OSError) as error:
+                    unsent.popleft()
+                    yield ExtractionResult(name, source, None, None, f"{type(error).__name__}: {error}", 0.0)
+                    continue
+                if job is None:
+                    break
+                unsent.popleft()
+                accepted = time.monotonic()
+                waiting[job['id']] = (job, source, accepted)
+            if unsent and not waiting and time.monotonic() - accepted > self.patience:
+                for name, source in unsent:
+                    yield ExtractionResult(name, source, None, None, "Extraction service is busy", 0.0)
+                unsent.clear()
+
+            for job_id, (job, source, submitted) in list(waiting.items()):
+                if job['status'] in ('queued', 'running'):
+                    job = self.job(job_id)
+                    waiting[job_id] = (job, source, submitted)
+                if job['status'] in ('done', 'error'):
+                    del waiting[job_id]
+                    if progress is not None:
+                        progress(job['name'], 1, 1)
+                    yield ExtractionResult(job['name'], source, job['text'], job['fields'], job['error'], job['seconds'])
+                elif time.monotonic() - submitted > self.patience + self.timeout:
+                    del waiting[job_id]
+                    yield ExtractionResult(job['name'], source, None, None, "No result from the extraction service", None)
+            if unsent or waiting:
+                time.sleep(self.poll_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve document extraction to Audity sessions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED, help="jobs waiting across all users before 429s")
+    parser.add_argument('--max-queued-per-user', type=int, default=MAX_QUEUED_PER_USER)
+    parser.add_argument('--no-cache', action='store_true', help="skip the extraction cache")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else ExtractionCache()
+    service = ExtractionService(args.workers, args.max_queued, args.max_queued_per_user, cache)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
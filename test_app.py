@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import cache
+import scheduler
+from bilgen.bills import generate_bills
+from ledger import Ledger
+from metrics import METRICS
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+BILLS = 3
+TIMEOUT = 300
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # app.py reads the ledger path on every run, but opens the extraction cache at its default path
+    monkeypatch.setenv('AUDITY_LEDGER', str(tmp_path / 'billing_records.db'))
+    extraction_cache = cache.ExtractionCache
+    monkeypatch.setattr(cache, 'ExtractionCache', lambda: extraction_cache(str(tmp_path / 'extraction.sqlite')))
+    # Count extraction runs; the app's scheduler and cache are st.cache_resource singletons
+    runs = []
+    run = scheduler.ExtractionScheduler.run
+
+    def record_run(self, files, progress=None):
+        runs.append(len(files))
+        return run(self, files, progress)
+
+    monkeypatch.setattr(scheduler.ExtractionScheduler, 'run', record_run)
+    # The script runner swaps in app.py as __main__, which processes spawned by later tests would re-run
+    monkeypatch.setitem(sys.modules, '__main__', sys.modules['__main__'])
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    yield AppTest.from_file(APP, default_timeout=TIMEOUT), runs
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def make_uploads(directory):
+    with Ledger(os.environ['AUDITY_LEDGER']) as ledger:
+        records = generate_bills([
+            {'Company Name': f"Acme Traders {bill}", 'pan_number': "ABCDE1234F", 'products': [{'name': "Item 1", 'price': 100.0 + bill}]}
+            for bill in range(BILLS)
+        ], str(directory), ledger, workers=1)
+    uploads = []
+    for record in records:
+        with open(record.pdf_file, 'rb') as f:
+            uploads.append((os.path.basename(record.pdf_file), f.read(), 'application/pdf'))
+    return uploads
+
+
+def stage_calls(*names):
+    summary = METRICS.summary()
+    return {name: summary.get(name, {}).get('calls', 0) for name in names}
+
+
+def cache_caption(app):
+    # The app's own extraction cache hit and miss counts, as it shows them
+    return next(caption.value for caption in app.caption if caption.value.startswith("Extraction cache:"))
+
+
+def test_rerun_with_same_upload_does_not_extract_again(app, tmp_path):
+    app, runs = app
+    app.run()
+    app.file_uploader[1].set_value(make_uploads(tmp_path / 'bills'))
+    app.run()
+    assert not app.exception
+    assert runs == [BILLS]
+    assert len(app.session_state['documents']) == BILLS
+
+    before = stage_calls('hash', 'cache_lookup', 'parse')
+    cache_stats = cache_caption(app)
+    app.run()
+    app.run()
+
+    assert not app.exception
+    assert runs == [BILLS]
+    assert stage_calls('hash', 'cache_lookup', 'parse') == before
+    assert cache_caption(app) == cache_stats
+    assert len(app.session_state['documents']) == BILLS
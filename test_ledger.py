@@ -0,0 +1,108 @@
+import datetime
+import multiprocessing
+import sqlite3
+import threading
+
+import pytest
+
+from ledger import Ledger, LedgerWriter
+from records import BillRecord
+
+PROCESSES = 3
+THREADS = 8
+BILLS = 25  # per thread
+
+
+def make_record(unique_id, amount_paise=100_000):
+    return BillRecord(unique_id, "Acme Traders Pvt Ltd", datetime.date(2024, 1, 1), amount_paise, f"SN-{unique_id}")
+
+
+def submit_bills(path, process):
+    # One LedgerWriter per process shared by its threads, as in one Streamlit server
+    with LedgerWriter(path) as writer:
+        def run(thread):
+            for bill in range(BILLS):
+                assert writer.submit([make_record(f"P{process}-T{thread}-{bill}")]).result(timeout=60) == 1
+
+        threads = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def test_concurrent_submissions_are_all_written(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    with LedgerWriter(path) as writer:
+        futures = []
+        lock = threading.Lock()
+
+        def run(thread):
+            for bill in range(BILLS):
+                future = writer.submit([make_record(f"T{thread}-{bill}")])
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [future.result(timeout=60) for future in futures] == [1] * THREADS * BILLS
+
+    with Ledger(path) as ledger:
+        assert len(ledger) == THREADS * BILLS
+        ids = [f"T{thread}-{bill}" for thread in range(THREADS) for bill in range(BILLS)]
+        assert ledger.existing_ids(ids) == set(ids)
+
+
+def test_duplicate_batch_fails_alone_in_its_group(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    with Ledger(path) as ledger:
+        ledger.append([make_record("EXISTING")])
+
+    # A long group_delay holds the writer until all four submissions are queued
+    with LedgerWriter(path, group_delay=2.0) as writer:
+        groups = []
+        append_groups = writer.ledger.append_groups
+
+        def record_groups(batches):
+            groups.append(len(batches))
+            return append_groups(batches)
+
+        writer.ledger.append_groups = record_groups
+        first = writer.submit([make_record("A1"), make_record("A2")])
+        duplicate = writer.submit([make_record("B1"), make_record("EXISTING")])
+        repeated = writer.submit([make_record("C1"), make_record("C1")])
+        last = writer.submit([make_record("D1")])
+
+        assert first.result(timeout=60) == 2
+        assert last.result(timeout=60) == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            duplicate.result(timeout=60)
+        with pytest.raises(sqlite3.IntegrityError):
+            repeated.result(timeout=60)
+        assert groups == [4]
+
+    with Ledger(path) as ledger:
+        assert len(ledger) == 4
+        # The failed batches were rolled back whole, including their rows that did not clash
+        assert ledger.existing_ids(["EXISTING", "A1", "A2", "B1", "C1", "D1"]) == {"EXISTING", "A1", "A2", "D1"}
+        assert ledger.lookup("EXISTING")['serial_number'] == "SN-EXISTING"
+
+
+def test_no_rows_lost_across_processes(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    Ledger(path).close()  # create the schema before the writers race to
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=submit_bills, args=(path, process)) for process in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=120)
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+    ids = [f"P{process}-T{thread}-{bill}" for process in range(PROCESSES) for thread in range(THREADS) for bill in range(BILLS)]
+    with Ledger(path) as ledger:
+        assert len(ledger) == len(ids)
+        assert ledger.existing_ids(ids) == set(ids)
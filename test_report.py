@@ -0,0 +1,27 @@
+import pandas as pd
+
+from report import aggregate_file
+
+
+def write_workbook(path, sheets):
+    with pd.ExcelWriter(path) as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+
+def test_sheets_without_data_rows_are_listed(tmp_path):
+    path = tmp_path / "ledger.xlsx"
+    write_workbook(path, {
+        'A': pd.DataFrame({'Company Name': ['Acme Pvt Ltd'], 'Amount': [10.0]}),
+        'Empty': pd.DataFrame({'Company Name': [], 'Amount': []}),
+        'Blank': pd.DataFrame(),
+        'NoAmt': pd.DataFrame({'Note': ['x']}),
+    })
+
+    report, stats = aggregate_file(str(path))
+
+    assert list(report) == ['A', 'Empty', 'Blank', 'NoAmt']
+    assert report['Empty'] == {'row_count': 0, 'column_count': 2, 'columns': ['Company Name', 'Amount'],
+                               'missing_values': {'Company Name': 0, 'Amount': 0}}
+    assert report['Blank']['row_count'] == 0
+    assert stats['transaction_count'] == 1
@@ -0,0 +1,139 @@
+"""Bulk verification of archived bill PDFs against the ledger's PDF hashes.
+
+    python audity.py verify bills/ --ledger billing_records.db
+
+Every bill_<Unique ID>.pdf under the directory is hashed (in parallel, in
+HASH_CHUNK reads) and joined against the ledger in one pass:
+- ok: the file's SHA-256 matches the ledger's PDF Hash
+- altered: it does not
+- missing: the ledger has a PDF Hash for a bill with no file
+- orphaned: a bill file whose Unique ID is not in the ledger
+- unrecorded: the bill is in the ledger without a PDF Hash
+
+The size, mtime and hash of every file are kept in a state file, so a later
+run only rehashes files that changed since.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from document import HASH_CHUNK
+
+# File names bilgen's create_pdf writes
+BILL_FILE = re.compile(r'^bill_(\w+)\.pdf$')
+STATE_FILE = '.audity_verify.json'
+# Files hashed per thread-pool task; one future per few-KiB bill costs more than hashing it
+BATCH_FILES = 256
+STATUSES = ('ok', 'altered', 'missing', 'orphaned', 'unrecorded')
+# Statuses that mean the archive and the ledger disagree
+DISCREPANCIES = ('altered', 'missing', 'orphaned')
+
+# results has one row per bill: Unique ID, path, sha256, ledger_hash, status
+VerificationReport = namedtuple('VerificationReport', ['results', 'counts', 'hashed', 'reused', 'bytes_hashed', 'seconds'])
+
+
+def hash_file(path, chunk_size=HASH_CHUNK):
+    """SHA-256 of a file read in chunks of up to ``chunk_size``; hashlib releases the GIL, so threads overlap."""
+    hasher = hashlib.sha256()
+    with open(path, 'rb', buffering=0) as f:
+        # Most bills are a few KiB; do not allocate a full chunk for them
+        buffer = bytearray(max(1, min(chunk_size, os.fstat(f.fileno()).st_size)))
+        view = memoryview(buffer)
+        while count := f.readinto(buffer):
+            hasher.update(view[:count])
+    return hasher.hexdigest()
+
+
+def hash_files(paths):
+    return [hash_file(path) for path in paths]
+
+
+def scan_bills(root):
+    """(Unique ID, path, size, mtime_ns) for every bill file under ``root``, recursively."""
+    bills = []
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                match = BILL_FILE.match(entry.name)
+                if match and entry.is_file():
+                    info = entry.stat()
+                    bills.append((match.group(1), entry.path, info.st_size, info.st_mtime_ns))
+    return bills
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    # Write beside the old state and swap, so an interrupted run leaves the old one intact
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        # dumps takes the C encoder; dump streams through the pure-Python one
+        f.write(json.dumps(state))
+    os.replace(f"{path}.tmp", path)
+
+
+def verify_archive(root, ledger_hashes, state_path=None, workers=None, full=False):
+    """Verify the bills under ``root`` against ``ledger_hashes``, a DataFrame of Unique ID and PDF Hash.
+
+    ``state_path`` (default: <root>/.audity_verify.json) caches each file's
+    hash by (size, mtime); ``full`` rehashes everything regardless.
+    """
+    start = time.perf_counter()
+    state_path = state_path or os.path.join(root, STATE_FILE)
+    state = {} if full else load_state(state_path)
+
+    bills = scan_bills(root)
+    hashes = {}
+    stale = []
+    for _, path, size, mtime in bills:
+        known = state.get(path)
+        if known is not None and known[0] == size and known[1] == mtime:
+            hashes[path] = known[2]
+        else:
+            stale.append((path, size))
+    reused = len(hashes)
+
+    # Biggest files first, so one large file does not finish last on its own
+    stale.sort(key=lambda item: item[1], reverse=True)
+    paths = [path for path, _ in stale]
+    batches = [paths[start:start + BATCH_FILES] for start in range(0, len(paths), BATCH_FILES)]
+    with ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        for batch, digests in zip(batches, pool.map(hash_files, batches)):
+            hashes.update(zip(batch, digests))
+
+    save_state(state_path, {path: [size, mtime, hashes[path]] for _, path, size, mtime in bills})
+
+    files = pd.DataFrame(bills, columns=['Unique ID', 'path', 'size', 'mtime_ns'])
+    files['sha256'] = files['path'].map(hashes)
+    ledger = ledger_hashes[['Unique ID', 'PDF Hash']].rename(columns={'PDF Hash': 'ledger_hash'})
+    ledger = ledger.assign(**{'Unique ID': ledger['Unique ID'].astype(str).str.strip()})
+    results = files.drop(columns=['size', 'mtime_ns']).merge(ledger, on='Unique ID', how='outer', indicator=True)
+
+    in_ledger = results['_merge'] != 'left_only'
+    on_disk = results['_merge'] != 'right_only'
+    recorded = results['ledger_hash'].notna()
+    results['status'] = 'ok'
+    results.loc[on_disk & in_ledger & recorded & (results['sha256'] != results['ledger_hash']), 'status'] = 'altered'
+    results.loc[on_disk & in_ledger & ~recorded, 'status'] = 'unrecorded'
+    results.loc[on_disk & ~in_ledger, 'status'] = 'orphaned'
+    results.loc[~on_disk & recorded, 'status'] = 'missing'
+    # Ledger rows with neither a file nor a hash were never archived; nothing to verify
+    results = results[on_disk | recorded].drop(columns='_merge').reset_index(drop=True)
+
+    counts = {status: int((results['status'] == status).sum()) for status in STATUSES}
+    bytes_hashed = sum(size for _, size in stale)
+    return VerificationReport(results, counts, len(stale), reused, bytes_hashed, time.perf_counter() - start)
@@ -0,0 +1,151 @@
+"""Excel workbook loading for report.py.
+
+Sheets are parsed with python-calamine (a Rust reader, many times faster
+than openpyxl) when it is installed, and with openpyxl otherwise. Callers
+can ask for only the columns they use, have each sheet converted once to a
+Parquet cache keyed on the workbook's content, and map a function over the
+sheets in a process pool, one sheet per task.
+"""
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from document import Document
+
+ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+# Directory for converted sheets; unset means no cache
+CACHE_DIR = os.environ.get('AUDITY_WORKBOOK_CACHE')
+# Smaller workbooks are mapped serially: parsing costs roughly 0.3 s per MiB,
+# while starting each spawned worker and its imports costs about a second
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+
+def as_source(source):
+    """A path or the workbook's bytes; file objects (uploads) are read into bytes."""
+    if isinstance(source, (str, os.PathLike, bytes)):
+        return source
+    source.seek(0)
+    return source.read()
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+def workbook_key(source):
+    """Content hash of a workbook (path or bytes), naming its cached sheets."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    with Document.from_path(os.fspath(source)) as document:
+        return document.sha256
+
+
+def sheet_names(source, engine=None):
+    with pd.ExcelFile(_open(as_source(source)), engine=engine or ENGINE) as book:
+        return book.sheet_names
+
+
+def _column_filter(columns):
+    # Matches header names case-insensitively and ignoring surrounding spaces
+    wanted = {column.strip().casefold() for column in columns}
+    return lambda column: str(column).strip().casefold() in wanted
+
+
+def _parse(source, sheet, columns, engine):
+    frame = pd.read_excel(_open(source), sheet_name=sheet, engine=engine,
+                          usecols=_column_filter(columns) if columns is not None else None)
+    frame.columns = [str(column).strip() for column in frame.columns]
+    return frame
+
+
+def _write_parquet(frame, path):
+    try:
+        frame.to_parquet(f"{path}.tmp", index=False)
+    except (TypeError, ValueError):
+        # Arrow needs one type per column; cells mixing numbers and text are stored as text
+        mixed = frame.select_dtypes(include='object').columns
+        frame.astype({column: 'string' for column in mixed}).to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_sheet(source, sheet, columns=None, engine=None, cache_dir=CACHE_DIR, key=None):
+    """One sheet as a DataFrame, with only ``columns`` (header names) when given.
+
+    With ``cache_dir`` the whole sheet is converted to Parquet on first read and
+    later reads load just ``columns`` from it. ``key`` is the workbook's
+    workbook_key, computed when not passed.
+    """
+    source = as_source(source)
+    engine = engine or ENGINE
+    if cache_dir is None:
+        return _parse(source, sheet, columns, engine)
+
+    directory = os.path.join(cache_dir, key or workbook_key(source))
+    path = os.path.join(directory, f"{hashlib.sha256(str(sheet).encode()).hexdigest()[:16]}.parquet")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        frame = _parse(source, sheet, None, engine)
+        _write_parquet(frame, path)
+        if columns is None:
+            return frame
+        keep = _column_filter(columns)
+        return frame[[column for column in frame.columns if keep(column)]]
+    if columns is None:
+        return pd.read_parquet(path)
+    import pyarrow.parquet as pq
+    keep = _column_filter(columns)
+    return pd.read_parquet(path, columns=[name for name in pq.read_schema(path).names if keep(name)])
+
+
+def read_workbook(source, columns=None, engine=None, cache_dir=CACHE_DIR):
+    """Every sheet, as {sheet name: DataFrame} like ``pd.read_excel(sheet_name=None)``."""
+    source = as_source(source)
+    key = workbook_key(source) if cache_dir is not None else None
+    return {sheet: read_sheet(source, sheet, columns, engine, cache_dir, key) for sheet in sheet_names(source, engine)}
+
+
+def _apply(func, source, sheet, columns, engine, cache_dir, key):
+    return func(sheet, read_sheet(source, sheet, columns, engine, cache_dir, key))
+
+
+def map_sheets(func, source, columns=None, engine=None, cache_dir=CACHE_DIR, workers=None):
+    """Yield (sheet name, ``func(sheet name, DataFrame)``) for every sheet, in workbook order.
+
+    Workbooks of at least PARALLEL_MIN_BYTES with two or more sheets are read
+    and processed in worker processes, one sheet per task, so only results
+    travel back; ``func`` must then be a module-level function, in a module
+    that is cheap to import. Smaller workbooks are mapped in this process.
+    """
+    source = as_source(source)
+    engine = engine or ENGINE
+    key = workbook_key(source) if cache_dir is not None else None
+    sheets = sheet_names(source, engine)
+    workers = min(workers or os.cpu_count() or 1, len(sheets))
+    size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+    if workers <= 1 or size < PARALLEL_MIN_BYTES:
+        for sheet in sheets:
+            yield sheet, _apply(func, source, sheet, columns, engine, cache_dir, key)
+        return
+
+    spill = None
+    if isinstance(source, bytes):
+        # Workers open the workbook by path; pickling the bytes into every task would copy it per sheet
+        spill = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        with spill:
+            spill.write(source)
+        source = spill.name
+    try:
+        # spawn rather than fork: the Streamlit server process is multi-threaded
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(_apply, func, source, sheet, columns, engine, cache_dir, key) for sheet in sheets]
+            for sheet, future in zip(sheets, futures):
+                yield sheet, future.result()
+    finally:
+        if spill is not None:
+            os.remove(spill.name)